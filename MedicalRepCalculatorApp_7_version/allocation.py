@@ -0,0 +1,127 @@
+"""
+Распределение общей численности медпредов между проектами (город x специализация):
+нагрузка проектов считается как в пакетном расчёте портфеля, по таблицам
+укомплектования из scenario_engine медпреды раздаются по одному жадно через кучу -
+каждый следующий достаётся проекту, где он даёт наибольший выигрыш по цели.
+"""
+
+import heapq
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+from portfolio import PORTFOLIO_METHODS, density_load, prepare_portfolio, read_portfolio, simple_load, valid_projects
+from scenario_engine import staffing_table
+
+# Цели: наименьший наибольший перерасход срока, % или наименьшее суммарное недовыполнение, ч
+ALLOCATION_OBJECTIVES = ('max_overrun', 'shortfall')
+
+
+def greedy_allocation(values, total_reps, objective='max_overrun', priority=None):
+    """
+    Численности проектов по таблице цели values (проекты x численности 0..K).
+    max_overrun - медпред достаётся проекту с наибольшим текущим перерасходом,
+    shortfall - проекту с наибольшим снижением недовыполнения. Перерасход убывает
+    по численности, а снижение недовыполнения не растёт, поэтому жадный выбор оптимален.
+    priority - порядок при равенстве (больше - раньше), по умолчанию номер строки
+    """
+    projects, columns = values.shape
+    reps = np.zeros(projects, dtype=np.int64)
+    priority = np.zeros(projects) if priority is None else np.asarray(priority, dtype=float)
+
+    def gain(project):
+        current = values[project, reps[project]]
+        if objective == 'max_overrun':
+            return current
+        return current - values[project, reps[project] + 1]
+
+    heap = [(-gain(project), -priority[project], project) for project in range(projects) if columns > 1]
+    heap = [item for item in heap if item[0] < 0]
+    heapq.heapify(heap)
+    left = int(total_reps)
+    while left > 0 and heap:
+        _, rank, project = heapq.heappop(heap)
+        reps[project] += 1
+        left -= 1
+        if reps[project] < columns - 1:
+            value = gain(project)
+            if value > 0:
+                heapq.heappush(heap, (-value, rank, project))
+    return reps
+
+
+def allocate_reps(calculator, source, total_reps, objective='max_overrun', method='simple', random_seed=0,
+                  workers=1):
+    """
+    Распределение total_reps медпредов между проектами: source - путь к CSV / Parquet,
+    DataFrame или список словарей со столбцами портфеля (см. PORTFOLIO_COLUMNS).
+    Нагрузка - упрощённым методом или с плотностью (method, как calculate_portfolio).
+    Возвращает (таблица с численностью, загрузкой, перерасходом и недовыполнением, итоги)
+    """
+    if objective not in ALLOCATION_OBJECTIVES:
+        raise ValueError(f"Неизвестная цель распределения: {objective}")
+    if method not in PORTFOLIO_METHODS:
+        raise ValueError(f"Неизвестный метод расчёта портфеля: {method}")
+    if total_reps < 0:
+        raise ValueError("Численность медпредов не может быть отрицательной")
+
+    started = time.perf_counter()
+    if isinstance(source, (list, tuple)):
+        source = pd.DataFrame(list(source))
+    frame = prepare_portfolio(source) if isinstance(source, pd.DataFrame) else read_portfolio(source)
+    if method == 'density':
+        load = density_load(frame, calculator.cities_data, random_seed, workers)
+    else:
+        load = simple_load(frame)
+    valid = valid_projects(frame, load)
+    if load.get('errors') is not None:
+        valid &= np.array([error is None for error in load['errors']])
+
+    total_hours = np.where(valid, load['total_time_all_doctors_hours'], 0.0)
+    available_hours = np.where(valid, load['available_hours'], 1.0)
+    # Сверх численности, закрывающей проект в срок, медпред ничего не даёт
+    needed = np.where(valid, load['min_reps_needed'], 0).astype(np.int64)
+    max_reps = int(min(int(total_reps), needed.max(initial=0)))
+    table = staffing_table(total_hours, available_hours, np.arange(max_reps + 1))
+    values = table['overrun'] if objective == 'max_overrun' else table['shortfall_hours']
+    reps = greedy_allocation(values, total_reps, objective, priority=total_hours)
+
+    rows = np.arange(len(frame))
+    rep_utilization = table['rep_utilization'][rows, reps]
+    overrun = table['overrun'][rows, reps]
+    shortfall = table['shortfall_hours'][rows, reps]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shortfall_visits = np.where(total_hours > 0, shortfall / total_hours, 0) * \
+            frame['total_visits_needed'].fillna(0).to_numpy(dtype=float)
+
+    result = frame.copy()
+    result['min_reps_needed'] = pd.Series(needed, index=result.index).where(valid).astype('Int64')
+    result['allocated_reps'] = reps
+    result['rep_utilization'] = pd.Series(rep_utilization, index=result.index).where(valid & (reps > 0)).round(1)
+    result['overrun'] = pd.Series(overrun, index=result.index).where(valid & (reps > 0)).round(1)
+    result['shortfall_hours'] = pd.Series(shortfall, index=result.index).where(valid).round(1)
+    result['shortfall_visits'] = pd.Series(np.ceil(shortfall_visits), index=result.index).where(valid).astype('Int64')
+    errors = load.get('errors') or [None] * len(frame)
+    result['error'] = [error if error is not None else (None if ok else "Некорректные параметры проекта")
+                       for error, ok in zip(errors, valid)]
+
+    allocated = int(reps.sum())
+    unstaffed = int(np.sum(valid & (reps == 0) & (total_hours > 0)))
+    summary = {
+        'objective': objective,
+        'method': method,
+        'projects': int(valid.sum()),
+        'errors': int((~valid).sum()),
+        'total_reps': int(total_reps),
+        'allocated_reps': allocated,
+        'unused_reps': int(total_reps) - allocated,
+        'reps_to_finish_all': int(needed.sum()),
+        'unstaffed_projects': unstaffed,
+        'max_overrun': math.inf if unstaffed else float(overrun[valid].max(initial=0)),
+        'shortfall_hours': float(shortfall[valid].sum()),
+        'shortfall_share': float(shortfall[valid].sum() / total_hours.sum() * 100) if total_hours.sum() > 0 else 0.0,
+        'elapsed': time.perf_counter() - started
+    }
+    return result, summary
@@ -11,15 +11,34 @@ import folium
 from folium.plugins import MarkerCluster
 import networkx as nx
 from geopy.distance import geodesic
-import random
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
 import warnings
+import copy
 import io
 import math
+from statistics import NormalDist
 from PySide6.QtGui import QPixmap
 from PySide6.QtCore import QBuffer
+from allocation import allocate_reps
 from density_logic import DensityCalculator
+from mc_engine import (COMPARISON_FIELDS, COMPLETION_MODELS, COMPLETION_PERCENTILES, DEADLINE_CHUNK_SIZE,
+                       DEFAULT_CHUNK_SIZE, TIME_BUDGET_MAX_ITERATIONS, MCRunState, TimeBudget, calendar_work_days,
+                       comparison_chunk, comparison_key, completion_chunk, daily_chunk, daily_kernel_params,
+                       deadline_reps_search, density_analysis_chunk, density_chunk, difference_key,
+                       expected_daily_hours, extend_run, is_pool, max_daily_hours, overload_is_chunk, overload_tilt,
+                       resolve_workers, run_adaptive, run_batches, run_chunked, run_shared_state, sweep_chunk,
+                       work_day_calendar)
+from mc_cache import LRUCache, freeze
+from mc_checkpoint import MCCheckpoint
+from mc_grid import DEFAULT_GRID_PATH, MCGridCache, decode_raw, params_fingerprint, precompute_grid
+from mc_sensitivity import SENSITIVITY_MODELS, default_parameters, resolve_parameters, run_sensitivity
+from mc_stats import MCAccumulator, wilson_interval
+from portfolio import calculate_portfolio
+from rng_streams import make_rng, root_sequence, stream_seed
+from scenario_engine import (LEGACY_RULES, LEGACY_SCENARIO_RULES, PROJECT_RULES, SIMPLE_CITY_FACTORS,
+                             SIMPLE_EFFICIENCY, SIMPLE_OPTIMAL_LOAD, SIMPLE_RULES, SIMPLE_SUFFIXES,
+                             SIMPLE_VISIT_HOURS, project_status, scenario_range, scenario_rows, scenario_table)
 
 warnings.filterwarnings('ignore')
 
@@ -34,6 +53,7 @@ class MedicalRepCalculatorGUI:
         self.current_result = None
         self.current_map_html = None
         self.current_project_result = None
+        self.current_mc_results = None
 
         # Атрибуты для совместимости (должны быть ДО setup_demo_data)
         self.specialization_names = {
@@ -165,75 +185,684 @@ class MedicalRepCalculatorGUI:
             # 'admin_time_range': (50, 70)
         }
 
+        # Предрассчитанная сетка Монте-Карло (load_mc_grid / precompute_mc_grid):
+        # загружается при старте, если файл есть и рассчитан для текущих параметров
+        self.mc_grid = None
+        self.load_mc_grid()
+
+        # LRU-кэш детерминированных результатов (Монте-Карло с seed, расчёты проекта)
+        self.result_cache = LRUCache(maxsize=64)
+
     def monte_carlo_daily_simulation(self, city, specialization, num_visits,
-                                         transport_type, iterations=1000):
+                                         transport_type, iterations=1000, random_seed=None, rng=None,
+                                         workers=1, chunk_size=DEFAULT_CHUNK_SIZE, keep_raw=False,
+                                         adaptive=False, tolerances=None, confidence=0.95, sampler='random',
+                                         antithetic=False, control_variate=False, previous=None,
+                                         checkpoint=None, time_budget=None, use_grid=True):
         """
         Симуляция Монте-Карло для одного рабочего дня.
         Возвращает статистику по всем итерациям.
+        random_seed / rng - собственный поток случайных чисел расчёта
+        (глобальное состояние random / np.random не меняется).
+        workers > 1 - чанки считаются в пуле процессов, workers=MCCoordinator -
+        на исполнителях других машин (mc_distributed); результат не зависит
+        от числа workers (None - все ядра).
+        keep_raw=True - дополнительно вернуть все итерации (raw_results) для графиков;
+        по умолчанию статистика считается потоково, память не растёт с числом итераций.
+        adaptive=True - iterations становится верхней границей: чанки считаются,
+        пока полуширина доверительного интервала целевых показателей
+        (tolerances, по умолчанию DEFAULT_TOLERANCES) не станет меньше допуска;
+        достигнутая точность возвращается в 'convergence'.
+        sampler - 'random' (псевдослучайные числа), 'sobol' или 'lhs' (квазислучайные
+        точки через те же распределения: та же точность средних за меньшее число итераций).
+        antithetic=True - итерации идут зеркальными парами; control_variate=True - средние
+        корректируются по total_hours, точное ожидание которого известно в замкнутой форме.
+        Оценки и достигнутое снижение дисперсии - в statistics['variance_reduction'],
+        адаптивный режим использует их доверительные интервалы.
+        previous - прошлый результат (или его 'run_state'): к нему добавляются ещё
+        iterations итераций из продолжения того же потока; статистика совпадает
+        с одним прогоном на суммарное число итераций.
+        checkpoint - путь к файлу контрольной точки: состояние периодически сохраняется,
+        после сбоя расчёт продолжается через resume_mc_job(checkpoint).
+        time_budget - бюджет времени в секундах: считается столько порций чанков,
+        сколько укладывается в бюджет (iterations - верхняя граница, None -
+        TIME_BUDGET_MAX_ITERATIONS). Текущие оценки и их стандартные ошибки - в
+        'time_budget'; уточнить результат позже можно через previous.
+        use_grid=True - обычный запуск без seed (и без режимов выше) на столько же
+        итераций, сколько в сетке, берётся из предрассчитанной сетки вместе с сырыми
+        итерациями (input_params['cached'], random_seed - seed ячейки); если ячейки нет
+        или сетка устарела - считается заново. previous=результат из сетки продолжает
+        поток ячейки.
+        """
+        if use_grid and not (antithetic or control_variate):
+            grid_result = self._grid_result('daily', city, specialization, num_visits, transport_type, iterations,
+                                            random_seed, rng, keep_raw, adaptive, sampler, previous, checkpoint,
+                                            time_budget)
+            if grid_result is not None:
+                return grid_result
+
+        seed_seq = root_sequence(random_seed, rng)
+
+        # ★ ВЕКТОРИЗОВАННАЯ СИМУЛЯЦИЯ ПО ЧАНКАМ С НЕЗАВИСИМЫМИ ПОТОКАМИ ★
+        day_params = self._daily_kernel_params(city, specialization, num_visits, transport_type)
+        day_params['sampler'] = sampler
+        day_params['antithetic'] = antithetic
+
+        accumulator_options = {'antithetic': antithetic}
+        if control_variate:
+            accumulator_options['control'] = ('total_hours', expected_daily_hours(day_params))
+
+        return self._run_mc(daily_chunk, day_params, iterations, seed_seq, {
+            'city': city,
+            'specialization': specialization,
+            'num_visits': num_visits,
+            'transport_type': transport_type,
+            'sampler': sampler,
+            'antithetic': antithetic,
+            'control_variate': control_variate,
+            'random_seed': random_seed if random_seed is not None else seed_seq.entropy
+        }, workers, chunk_size, keep_raw, adaptive, tolerances, confidence, accumulator_options,
+            cacheable=rng is None, previous=previous,
+            checkpoint=self._mc_checkpoint(checkpoint, 'monte_carlo_daily_simulation', {
+                'city': city, 'specialization': specialization, 'num_visits': num_visits,
+                'transport_type': transport_type, 'chunk_size': chunk_size, 'keep_raw': keep_raw,
+                'adaptive': adaptive, 'tolerances': tolerances, 'confidence': confidence, 'sampler': sampler,
+                'antithetic': antithetic, 'control_variate': control_variate, 'time_budget': time_budget}),
+            time_budget=time_budget)
+
+    def monte_carlo_density_simulation(self, city, specialization, num_visits,
+                                       transport_type, iterations=1000, random_seed=None, rng=None,
+                                       workers=1, chunk_size=DEFAULT_CHUNK_SIZE, keep_raw=False,
+                                       adaptive=False, tolerances=None, confidence=0.95, sampler='random',
+                                       previous=None, checkpoint=None, time_budget=None, use_grid=True):
+        """
+        Монте-Карло с учётом плотности
+        (previous, checkpoint, time_budget, use_grid - см. monte_carlo_daily_simulation)
         """
-        results = {
-            'total_hours': [],
-            'productive_hours': [],
-            'travel_hours': [],
-            'efficiency': [],
-            'successful_visits': [],  # Успешные визиты (врач доступен)
-            'is_overloaded': [],  # Перегрузка (>8 часов)
-            'is_optimal': []  # Оптимальный день (6-8 часов, 6-8 визитов)
+        if use_grid:
+            grid_result = self._grid_result('density', city, specialization, num_visits, transport_type,
+                                            iterations, random_seed, rng, keep_raw, adaptive, sampler, previous,
+                                            checkpoint, time_budget)
+            if grid_result is not None:
+                return grid_result
+
+        if hasattr(self, 'density_calculator'):
+            seed_seq = root_sequence(random_seed, rng)
+            return self._run_mc(density_chunk, self._density_task_args(city, specialization, num_visits,
+                                                                       transport_type, sampler),
+                                iterations, seed_seq, {
+                                    'city': city,
+                                    'specialization': specialization,
+                                    'num_visits': num_visits,
+                                    'transport_type': transport_type,
+                                    'sampler': sampler,
+                                    'calculation_type': 'density_mc',
+                                    'random_seed': random_seed if random_seed is not None else seed_seq.entropy
+                                }, workers, chunk_size, keep_raw, adaptive, tolerances, confidence,
+                                cacheable=rng is None, previous=previous,
+                                checkpoint=self._mc_checkpoint(checkpoint, 'monte_carlo_density_simulation', {
+                                    'city': city, 'specialization': specialization, 'num_visits': num_visits,
+                                    'transport_type': transport_type, 'chunk_size': chunk_size,
+                                    'keep_raw': keep_raw, 'adaptive': adaptive, 'tolerances': tolerances,
+                                    'confidence': confidence, 'sampler': sampler, 'time_budget': time_budget}),
+                                time_budget=time_budget)
+        else:
+            return self.monte_carlo_daily_simulation(city, specialization, num_visits,
+                                                     transport_type, iterations, random_seed=random_seed,
+                                                     rng=rng, workers=workers, chunk_size=chunk_size, keep_raw=keep_raw,
+                                                     adaptive=adaptive, tolerances=tolerances,
+                                                     confidence=confidence, sampler=sampler, previous=previous,
+                                                     checkpoint=checkpoint, time_budget=time_budget,
+                                                     use_grid=use_grid)
+
+    def _density_task_args(self, city, specialization, num_visits, transport_type, sampler='random'):
+        """Аргументы задач mc_engine для дней с учётом плотности"""
+        return {
+            'cities_data': self.density_calculator.cities_data,
+            'city': city,
+            'specialization': specialization,
+            'num_visits': num_visits,
+            'transport_type': transport_type,
+            'max_work_hours': self.UNIFIED_PARAMS['max_work_hours_per_day'],
+            'sampler': sampler
         }
 
-        for _ in range(iterations):
-            # ★ СЛУЧАЙНЫЕ ПАРАМЕТРЫ ДЛЯ ЭТОЙ ИТЕРАЦИИ ★
-            day_result = self._simulate_single_random_day(
-                city, specialization, num_visits, transport_type
-            )
+    def _run_mc(self, task, task_args, iterations, seed_seq, input_params, workers=1,
+                chunk_size=DEFAULT_CHUNK_SIZE, keep_raw=False, adaptive=False, tolerances=None,
+                confidence=0.95, accumulator_options=None, cacheable=False, previous=None, checkpoint=None,
+                time_budget=None):
+        """
+        Запуск задачи mc_engine (фиксированное число итераций или до сходимости)
+        и сборка результата: статистика, состояние прогона 'run_state'
+        и (опционально) сырые итерации.
+        cacheable=True (без rng) - результат берётся из / кладётся в result_cache; ключ
+        содержит фактический seed, так что повтор с input_params['random_seed']
+        прогона без seed тоже берётся из кэша.
+        previous - результат или MCRunState прошлого прогона: поток, размер чанка
+        и параметры накопителя берутся из него, добавляется iterations итераций.
+        checkpoint - MCCheckpoint (см. _mc_checkpoint).
+        time_budget - секунды; результат зависит от скорости машины и не кэшируется
+        """
+        if time_budget is not None:
+            cacheable = False
+            if iterations is None:
+                iterations = TIME_BUDGET_MAX_ITERATIONS
+
+        state = None
+        if previous is not None:
+            state = self._previous_state(previous, task, task_args, accumulator_options, keep_raw, workers)
+            input_params = dict(input_params, random_seed=state.root.entropy)
+            cacheable = False
+
+        cache_key = None
+        if cacheable:
+            cache_key = self._result_cache_key(task.__name__, (
+                input_params, iterations, chunk_size, keep_raw, adaptive, tolerances, confidence,
+                accumulator_options))
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        if state is None and keep_raw and not adaptive and checkpoint is None and time_budget is None and \
+                not is_pool(workers) and resolve_workers(workers) > 1:
+            return self._run_shared_mc(task, task_args, iterations, seed_seq, input_params, workers, chunk_size,
+                                       accumulator_options, cache_key)
+
+        if state is None:
+            state = MCRunState(task, task_args, seed_seq, chunk_size, keep_raw, accumulator_options)
+        previous_iterations = state.iterations
+
+        convergence = None
+        if checkpoint is not None:
+            checkpoint.job['target'] = previous_iterations + iterations
+        budget = TimeBudget(time_budget, on_batch=checkpoint) if time_budget is not None else None
+        on_batch = budget if budget is not None else checkpoint
+        if adaptive:
+            state, convergence = run_adaptive(task, task_args, iterations, workers=workers,
+                                              tolerances=tolerances, confidence=confidence, state=state,
+                                              on_batch=on_batch)
+        else:
+            self._extend_state(state, task, task_args, iterations, workers, on_batch)
+        if checkpoint is not None:
+            checkpoint.remove()
+        accumulator = state.accumulator()
+
+        input_params = dict(input_params, iterations=accumulator.count)
+        if adaptive:
+            input_params['max_iterations'] = previous_iterations + iterations
+        if previous_iterations:
+            input_params['previous_iterations'] = previous_iterations
+
+        mc_result = {
+            'statistics': accumulator.statistics(),  # Статистика (среднее, медиана, процентили)
+            'input_params': input_params,
+            'run_state': state  # Для продолжения (previous=...)
+        }
+        if accumulator.keep_raw:
+            mc_result['raw_results'] = accumulator.raw_results()  # Все итерации (для графиков)
+        if convergence is not None:
+            mc_result['convergence'] = convergence  # Достигнутая точность
+        if budget is not None:
+            # Затраченное время и текущие оценки со стандартными ошибками
+            mc_result['time_budget'] = dict(budget.report(), estimates=accumulator.estimates())
+
+        self.result_cache.put(cache_key, mc_result)
+        return mc_result
+
+    def _run_shared_mc(self, task, task_args, iterations, seed_seq, input_params, workers, chunk_size,
+                       accumulator_options, cache_key):
+        """
+        Прогон с сырыми итерациями в общей памяти (keep_raw в пуле процессов этой машины):
+        raw_results и run_state - представления сегментов 'shared_memory', их освобождает
+        release_mc_result. В result_cache кладётся обычная копия
+        """
+        accumulator, buffers, state = run_shared_state(task, task_args, iterations, seed_seq, workers, chunk_size,
+                                                       accumulator_options)
+        mc_result = {
+            'statistics': accumulator.statistics(),
+            'input_params': dict(input_params, iterations=accumulator.count),
+            'run_state': state,
+            'raw_results': dict(buffers.arrays)
+        }
+        self.result_cache.put(cache_key, mc_result)
+        mc_result['shared_memory'] = buffers
+        return mc_result
 
-            # Собираем статистику
-            for key in results.keys():
-                if key in day_result:
-                    results[key].append(day_result[key])
+    def release_mc_result(self, mc_result):
+        """
+        Освобождение общей памяти результата Монте-Карло (keep_raw при workers > 1),
+        когда он больше не нужен - например, заменён новым: raw_results и run_state
+        из результата удаляются. Для остальных результатов ничего не делает
+        """
+        buffers = mc_result.pop('shared_memory', None) if mc_result else None
+        if buffers is not None:
+            mc_result.pop('raw_results', None)
+            mc_result.pop('run_state', None)
+            buffers.close()
+
+    def _previous_state(self, previous, task, task_args, accumulator_options=None, keep_raw=False, workers=1):
+        """
+        Копия состояния прошлого прогона (прошлый результат не меняется).
+        У результата из сетки состояния нет: оно восстанавливается пересчётом
+        потока ячейки на её число итераций (тот же результат, что в сетке)
+        """
+        state = previous if isinstance(previous, MCRunState) else previous.get('run_state')
+        if state is None and previous.get('input_params', {}).get('cached'):
+            params = previous['input_params']
+            state = MCRunState(task, task_args, params['random_seed'], params['chunk_size'], keep_raw,
+                               accumulator_options)
+            return extend_run(state, task, task_args, params['iterations'], workers)
+        if state is None:
+            raise ValueError("В прошлом результате нет состояния прогона (run_state)")
+        state = copy.deepcopy(state)
+        state.check(task, task_args, accumulator_options)
+        return state
+
+    def _extend_state(self, state, task, task_args, iterations, workers=1, on_batch=None):
+        """
+        Дозапуск итераций; с обработчиком порций (контрольная точка, бюджет времени) -
+        порциями чанков с вызовом on_batch между ними
+        """
+        if on_batch is None:
+            return extend_run(state, task, task_args, iterations, workers)
+        return run_batches(state, task, task_args, iterations, workers, on_batch=on_batch)
+
+    def _mc_checkpoint(self, path, method, kwargs):
+        """Контрольная точка расчёта method(**kwargs) или None (path не задан)"""
+        if path is None:
+            return None
+        return MCCheckpoint(path, {
+            'method': method,
+            'kwargs': kwargs,
+            'fingerprint': self.mc_params_fingerprint()
+        })
+
+    def resume_mc_job(self, path, workers=1):
+        """
+        Продолжение расчёта с контрольной точки path с того места, где он прервался:
+        результат совпадает с непрерывным прогоном. None - возобновлять нечего
+        (файла нет, он повреждён или параметры модели с тех пор изменились)
+        """
+        loaded = MCCheckpoint.load(path)
+        if loaded is None:
+            return None
+        job, state = loaded
+        if job['fingerprint'] != self.mc_params_fingerprint():
+            print("Контрольная точка рассчитана для других параметров модели")
+            return None
+
+        method = getattr(self, job['method'])
+        return method(iterations=max(0, job['target'] - state.iterations), previous=state,
+                      workers=workers, checkpoint=path, **job['kwargs'])
+
+    def _result_cache_key(self, method, args):
+        """Ключ result_cache: метод, аргументы и отпечаток параметров модели"""
+        return (method, freeze(args), self.mc_params_fingerprint())
+
+    def compare_configurations(self, configurations, iterations=1000, random_seed=None, rng=None,
+                               workers=1, chunk_size=DEFAULT_CHUNK_SIZE, confidence=0.95, sampler='random'):
+        """
+        Сравнение конфигураций дня на ОБЩИХ случайных числах (CRN).
+        configurations - список словарей city, specialization, num_visits, transport_type;
+        первая конфигурация - базовая. Возвращает статистику каждой конфигурации
+        и парные разности с базовой с доверительными интервалами
+        (variance_reduction - выигрыш против двух независимых прогонов).
+        """
+        if len(configurations) < 2:
+            raise ValueError("Для сравнения нужно минимум две конфигурации")
+
+        seed_seq = root_sequence(random_seed, rng)
+        configs = [self._daily_kernel_params(c['city'], c['specialization'], c['num_visits'],
+                                             c['transport_type'])
+                   for c in configurations]
+        accumulator = run_chunked(comparison_chunk, {'configs': configs, 'sampler': sampler},
+                                  iterations, seed_seq, workers, chunk_size)
+
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        count = accumulator.count
+        stats = accumulator.statistics()
+
+        results = []
+        for index, config in enumerate(configurations):
+            config_stats = {field: stats[comparison_key(field, index)]
+                            for field in COMPARISON_FIELDS if field != 'is_overloaded'}
+            overload_prob = stats[comparison_key('is_overloaded', index)]['mean'] * 100
+            config_stats['overload_probability'] = {
+                'value': overload_prob,
+                'description': f"Вероятность переработки (>8 часов): {overload_prob:.1f}%"
+            }
+            results.append({'configuration': dict(config), 'statistics': config_stats})
+
+        differences = []
+        for index in range(1, len(configurations)):
+            metrics = {}
+            for field in COMPARISON_FIELDS:
+                scale = 100 if field == 'is_overloaded' else 1  # Вероятность - в п.п.
+                paired = accumulator.moments[difference_key(field, index)]
+                base = accumulator.moments[comparison_key(field, 0)]
+                other = accumulator.moments[comparison_key(field, index)]
+
+                paired_var = paired.variance / count if count else 0.0
+                independent_var = (base.variance + other.variance) / count if count else 0.0
+                half_width = z * math.sqrt(paired_var) * scale
+                mean_difference = paired.mean * scale
+
+                metrics['overload_probability' if field == 'is_overloaded' else field] = {
+                    'mean_difference': mean_difference,
+                    'half_width': half_width,
+                    'ci': (mean_difference - half_width, mean_difference + half_width),
+                    'independent_half_width': z * math.sqrt(independent_var) * scale,
+                    'variance_reduction': (independent_var / paired_var if paired_var > 0
+                                           else 1.0 if independent_var == 0 else math.inf),
+                    'significant': abs(mean_difference) > half_width
+                }
+            differences.append({'configuration': index, 'baseline': 0, 'metrics': metrics})
+
+        return {
+            'results': results,
+            'differences': differences,
+            'input_params': {
+                'configurations': [dict(c) for c in configurations],
+                'iterations': count,
+                'confidence': confidence,
+                'sampler': sampler,
+                'random_seed': random_seed if random_seed is not None else seed_seq.entropy
+            }
+        }
+
+    def visit_count_sweep(self, city, specialization, transport_type, max_visits=15, iterations=1000,
+                          random_seed=None, rng=None, workers=1, chunk_size=DEFAULT_CHUNK_SIZE,
+                          sampler='random', max_overload_probability=10.0, previous=None, checkpoint=None):
+        """
+        Кривая "число визитов -> время, переработка, эффективность" для 1..max_visits
+        за один прогон Монте-Карло (день с k визитами - префикс дня с k + 1).
+        Рекомендуемое число визитов - наибольшее k, при котором вероятность
+        переработки не выше max_overload_probability (%).
+        previous / checkpoint - продолжение прошлого результата и контрольная точка,
+        как в monte_carlo_daily_simulation.
+        """
+        seed_seq = root_sequence(random_seed, rng)
+        max_visits = max(1, int(max_visits))
+        sweep_args = {
+            'day_params': self._daily_kernel_params(city, specialization, max_visits, transport_type),
+            'max_visits': max_visits,
+            'sampler': sampler
+        }
+        if previous is not None:
+            state = self._previous_state(previous, sweep_chunk, sweep_args)
+            seed_seq = state.root
+        else:
+            state = MCRunState(sweep_chunk, sweep_args, seed_seq, chunk_size)
+
+        checkpoint = self._mc_checkpoint(checkpoint, 'visit_count_sweep', {
+            'city': city, 'specialization': specialization, 'transport_type': transport_type,
+            'max_visits': max_visits, 'chunk_size': chunk_size, 'sampler': sampler,
+            'max_overload_probability': max_overload_probability})
+        if checkpoint is not None:
+            checkpoint.job['target'] = state.iterations + iterations
+        self._extend_state(state, sweep_chunk, sweep_args, iterations, workers, checkpoint)
+        if checkpoint is not None:
+            checkpoint.remove()
+        accumulator = state.accumulator()
+        stats = accumulator.statistics()
+
+        curve = []
+        for k in range(1, max_visits + 1):
+            overload_prob = stats[comparison_key('is_overloaded', k)]['mean'] * 100
+            curve.append({
+                'num_visits': k,
+                'total_hours': stats[comparison_key('total_hours', k)],
+                'efficiency': stats[comparison_key('efficiency', k)],
+                'successful_visits': stats[comparison_key('successful_visits', k)],
+                'overload_probability': overload_prob
+            })
 
-        # ★ СТАТИСТИЧЕСКИЙ АНАЛИЗ РЕЗУЛЬТАТОВ ★
-        stats = self._calculate_mc_statistics(results)
+        acceptable = [point['num_visits'] for point in curve
+                      if point['overload_probability'] <= max_overload_probability]
 
         return {
-            'raw_results': results,  # Все итерации (для графиков)
-            'statistics': stats,  # Статистика (среднее, медиана, процентили)
+            'curve': curve,
+            'recommended_visits': max(acceptable) if acceptable else 1,
+            'max_efficiency_visits': max(curve, key=lambda point: point['efficiency']['mean'])['num_visits'],
+            'input_params': {
+                'city': city,
+                'specialization': specialization,
+                'transport_type': transport_type,
+                'max_visits': max_visits,
+                'iterations': accumulator.count,
+                'sampler': sampler,
+                'max_overload_probability': max_overload_probability,
+                'random_seed': random_seed if random_seed is not None and previous is None else seed_seq.entropy
+            },
+            'run_state': state  # Для продолжения (previous=...)
+        }
+
+    def overload_probability_is(self, city, specialization, num_visits, transport_type, iterations=10000,
+                                random_seed=None, rng=None, workers=1, chunk_size=DEFAULT_CHUNK_SIZE,
+                                sampler='random', threshold=None, confidence=0.95):
+        """
+        Вероятность переработки дневной модели выборкой по значимости: шум визитов
+        и вариации пути наклоняются в сторону длинного дня (overload_tilt подбирает
+        наклон на пробной выборке), итерации перевзвешиваются. Даёт устойчивую
+        оценку редких вероятностей (< 1%) там, где обычная частота равна нулю.
+        threshold - порог, ч (по умолчанию max_work_hours_per_day).
+        Вероятности и ошибки - в процентах; effective_sample_size - эффективное
+        число итераций с переработкой по их весам (Kish).
+        """
+        seed_seq = root_sequence(random_seed, rng)
+        cache_key = None
+        if random_seed is not None and rng is None:
+            cache_key = self._result_cache_key('overload_probability_is', (
+                city, specialization, num_visits, transport_type, iterations, random_seed, chunk_size,
+                sampler, threshold, confidence))
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        day_params = self._daily_kernel_params(city, specialization, num_visits, transport_type)
+        if threshold is not None:
+            day_params['max_work_hours'] = threshold
+
+        # Поток 0 - подбор наклона, поток 1 - чанки оценки
+        tilt = {'visit_noise': 0.0, 'distance': 0.0, 'variation': 0.0}
+        impossible = max_daily_hours(day_params) <= day_params['max_work_hours']
+        if not impossible:
+            tilt = overload_tilt(day_params, make_rng(stream_seed(seed_seq, 0)))
+
+        accumulator = run_chunked(overload_is_chunk, {'day_params': day_params, 'tilt': tilt, 'sampler': sampler},
+                                  0 if impossible else iterations, stream_seed(seed_seq, 1), workers, chunk_size)
+        count = accumulator.count
+        probability, std_error, effective_sample_size = 0.0, 0.0, 0.0
+        if count:
+            estimate = accumulator.moments['weighted_overload']
+            probability = estimate.mean
+            std_error = math.sqrt(estimate.m2 / (count - 1) / count) if count > 1 else math.nan
+            # Kish по слагаемым оценки: (sum w 1{overload})^2 / sum (w 1{overload})^2
+            sum_squares = estimate.m2 + count * probability ** 2
+            effective_sample_size = (count * probability) ** 2 / sum_squares if sum_squares > 0 else 0.0
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+
+        result = {
+            'overload_probability': probability * 100,
+            'std_error': std_error * 100,
+            'ci': (max(0.0, probability - z * std_error) * 100, min(1.0, probability + z * std_error) * 100),
+            'relative_error': std_error / probability if probability > 0 else math.inf,
+            'effective_sample_size': effective_sample_size,
+            'tilted_overload_share': accumulator.true_counts['is_overloaded'] / count * 100 if count else 0.0,
+            'mean_weight': accumulator.moments['weight'].mean if count else 1.0,  # Контроль: близко к 1
+            'impossible': impossible,  # Переработка невозможна даже при всех величинах на максимуме
+            'tilt': tilt,
             'input_params': {
                 'city': city,
                 'specialization': specialization,
                 'num_visits': num_visits,
                 'transport_type': transport_type,
-                'iterations': iterations
+                'iterations': count,
+                'threshold': day_params['max_work_hours'],
+                'confidence': confidence,
+                'sampler': sampler,
+                'random_seed': random_seed if random_seed is not None else seed_seq.entropy
             }
         }
+        self.result_cache.put(cache_key, result)
+        return result
 
-    def monte_carlo_density_simulation(self, city, specialization, num_visits,
-                                       transport_type, iterations=1000):
-        """Монте-Карло с учётом плотности"""
-        if hasattr(self, 'density_calculator'):
-            results = []
-            for _ in range(iterations):
-                day_result = self.density_calculator.simulate_density_day(
-                    city, specialization, num_visits, transport_type
-                )
-                results.append(day_result)
+    def default_sensitivity_parameters(self, city, transport_type, model='daily', specialization='Кардиологи'):
+        """
+        Спорные параметры модели для анализа чувствительности (диапазон +- 20%):
+        только те, что читает ядро model (см. mc_sensitivity.default_parameters)
+        """
+        density_spec_key = None
+        if model == 'density':
+            density_spec_key = self.density_calculator.calculate_density_factors(city, specialization)['spec_key']
+        return default_parameters(model, city, self.specialization_names.get(specialization, specialization),
+                                  transport_type, density_spec_key)
+
+    def sensitivity_analysis(self, city, specialization, num_visits, transport_type, parameters=None,
+                             model='daily', base_samples=512, inner_iterations=500, random_seed=None, rng=None,
+                             workers=1, block_size=256, sampler='sobol', confidence=0.95):
+        """
+        Индексы Соболя (первого порядка и полные) среднего времени дня и вероятности
+        переработки по параметрам модели.
+        parameters - пути к параметрам в UNIFIED_PARAMS / MC_PARAMS / cities_data
+        (список - диапазон +- 20% от текущего значения, или словарь {путь: (low, high)});
+        по умолчанию default_sensitivity_parameters для model.
+        model - ядро: 'daily' (дневная модель) или 'density' (модель плотности).
+        Параметры, которые не влияют на выходы ядра, исключаются с предупреждением
+        (result['ignored_parameters']).
+        Модель оценивается base_samples * (k + 2) раз по inner_iterations дней.
+        """
+        if model not in SENSITIVITY_MODELS:
+            raise ValueError(f"Неизвестная модель: {model}")
+        seed_seq = root_sequence(random_seed, rng)
+        base = {
+            'UNIFIED_PARAMS': self.UNIFIED_PARAMS,
+            'MC_PARAMS': self.MC_PARAMS,
+            'cities_data': self.density_calculator.cities_data if model == 'density' else self.cities_data
+        }
+        if parameters is None:
+            parameters = self.default_sensitivity_parameters(city, transport_type, model, specialization)
+        resolved = resolve_parameters(base, parameters)
 
-            # Статистика
-            return self._calculate_density_mc_statistics(results, city, specialization,
-                                                         num_visits, transport_type, iterations)
-        else:
-            return self.monte_carlo_daily_simulation(city, specialization, num_visits,
-                                                     transport_type, iterations)
+        result = run_sensitivity({
+            'model': model,
+            'city': city,
+            'specialization': specialization,
+            'spec_key': self.specialization_names.get(specialization, specialization),
+            'num_visits': int(num_visits),
+            'transport_type': transport_type,
+            'inner_iterations': int(inner_iterations),
+            'sampler': 'random',
+            'base': base
+        }, resolved, base_samples, seed_seq, workers, block_size, sampler, confidence)
 
-    def _simulate_single_random_day(self, city, specialization, num_visits, transport_type, random_seed=None):
-        """Одна случайная реализация дня - БЕЗ ОТДЕЛЬНОГО АДМИН. ВРЕМЕНИ"""
-        import random
-        import numpy as np
+        result['input_params'] = {
+            'city': city,
+            'specialization': specialization,
+            'num_visits': num_visits,
+            'transport_type': transport_type,
+            'model': model,
+            'base_samples': base_samples,
+            'inner_iterations': inner_iterations,
+            'confidence': confidence,
+            'random_seed': random_seed if random_seed is not None else seed_seq.entropy
+        }
+        return result
+
+    def mc_params_fingerprint(self):
+        """Отпечаток параметров модели для кэшей Монте-Карло"""
+        return params_fingerprint(self.UNIFIED_PARAMS, self.MC_PARAMS, self.cities_data)
+
+    def precompute_mc_grid(self, path=DEFAULT_GRID_PATH, max_visits=20, iterations=1000, random_seed=0,
+                           workers=1, progress_callback=None):
+        """
+        Расчёт дневного и density Монте-Карло для всех городов, специализаций,
+        видов транспорта и 1..max_visits визитов с сохранением на диск
+        """
+        self.mc_grid = precompute_grid(self, max_visits, iterations, random_seed, workers,
+                                       progress_callback=progress_callback)
+        self.mc_grid.save(path)
+        return self.mc_grid
+
+    def calculate_portfolio(self, source, method='simple', output=None, random_seed=0, workers=1):
+        """
+        Пакетный расчёт портфеля проектов из CSV / Parquet (или DataFrame):
+        method='simple' - как calculate_city_load, 'density' - как calculate_city_load_with_density.
+        Возвращает (таблица с min/optimal reps и напряжённостью, отчёт о пропускной способности)
+        """
+        return calculate_portfolio(self, source, method, output, random_seed, workers)
+
+    def allocate_reps(self, source, total_reps, objective='max_overrun', method='simple', random_seed=0, workers=1):
+        """
+        Распределение общей численности total_reps между проектами портфеля (CSV / Parquet,
+        DataFrame или список словарей): objective='max_overrun' - наименьший наибольший
+        перерасход срока, 'shortfall' - наименьшее суммарное недовыполнение к сроку.
+        Возвращает (таблица с численностью по проектам, итоги распределения)
+        """
+        return allocate_reps(self, source, total_reps, objective, method, random_seed, workers)
+
+    def load_mc_grid(self, path=DEFAULT_GRID_PATH):
+        """Загрузка сетки с диска; False - файла нет или параметры модели изменились"""
+        self.mc_grid = MCGridCache.load(path, self.mc_params_fingerprint())
+        return self.mc_grid is not None
+
+    def _grid_result(self, method, city, specialization, num_visits, transport_type, iterations, random_seed,
+                     rng, keep_raw, adaptive, sampler, previous, checkpoint, time_budget):
+        """
+        Результат из сетки для обычного запуска: без seed (сетка - такая же случайная
+        выборка), без особых режимов и ровно на столько итераций, сколько в сетке
+        (меньшее число итераций сеткой не подменяется)
+        """
+        if self.mc_grid is None or random_seed is not None or rng is not None:
+            return None
+        if adaptive or sampler != 'random' or previous is not None or checkpoint is not None:
+            return None
+        if time_budget is not None or iterations is None or iterations != self.mc_grid.settings.get('iterations'):
+            return None
+        return self.lookup_mc_grid(method, city, specialization, num_visits, transport_type, keep_raw)
+
+    def lookup_mc_grid(self, method, city, specialization, num_visits, transport_type, keep_raw=False):
+        """
+        Готовый результат Монте-Карло из сетки ('daily' или 'density') в формате
+        monte_carlo_daily_simulation (keep_raw=True - с raw_results) или None.
+        Совпадает с прогоном на input_params['iterations'] итераций с seed ячейки
+        """
+        if self.mc_grid is None or self.mc_grid.fingerprint != self.mc_params_fingerprint():
+            return None
 
-        # Устанавливаем seed
-        if random_seed is not None:
-            random.seed(random_seed)
-            np.random.seed(random_seed)
+        cell = self.mc_grid.get(method, city, specialization, transport_type, num_visits)
+        if cell is None or (keep_raw and cell.get('raw') is None):
+            return None
+
+        mc_result = {
+            'statistics': copy.deepcopy(cell['statistics']),
+            'input_params': {
+                'city': city,
+                'specialization': specialization,
+                'num_visits': num_visits,
+                'transport_type': transport_type,
+                'sampler': 'random',
+                'iterations': self.mc_grid.settings.get('iterations'),
+                'chunk_size': self.mc_grid.settings.get('chunk_size', DEFAULT_CHUNK_SIZE),
+                'random_seed': self.mc_grid.seed(method, city, specialization, transport_type, num_visits),
+                'calculation_type': 'density_mc' if method == 'density' else 'daily_mc',
+                'cached': True
+            }
+        }
+        if keep_raw:
+            mc_result['raw_results'] = decode_raw(cell['raw'])
+        return mc_result
+
+    def _daily_kernel_params(self, city, specialization, num_visits, transport_type):
+        """Параметры случайного дня для векторизованного ядра (mc_engine)"""
+        spec_key = self.specialization_names.get(specialization, specialization)
+        return daily_kernel_params(self.UNIFIED_PARAMS, self.cities_data, city, spec_key, num_visits, transport_type)
+
+    def _simulate_single_random_day(self, city, specialization, num_visits, transport_type, random_seed=None,
+                                    rng=None):
+        """Одна случайная реализация дня - БЕЗ ОТДЕЛЬНОГО АДМИН. ВРЕМЕНИ"""
+        # Собственный поток случайных чисел (seed не меняет глобальное состояние)
+        rng = make_rng(random_seed, rng)
 
         # 1. Определяем параметры визита
         spec_key = self.specialization_names.get(specialization, specialization)
@@ -251,7 +880,7 @@ class MedicalRepCalculatorGUI:
         # 2. Случайное время для каждого визита (включая админ. работу)
         visit_times = []
         for _ in range(num_visits):
-            visit_time = np.random.normal(avg_visit, (max_visit - min_visit) / 6)
+            visit_time = rng.normal(avg_visit, (max_visit - min_visit) / 6)
             visit_time = max(min_visit, min(max_visit, visit_time))
             visit_times.append(visit_time)
 
@@ -265,7 +894,7 @@ class MedicalRepCalculatorGUI:
         distances = []
         for _ in range(max(0, num_visits - 1)):
             base_distance = avg_distance_km * detour_factor
-            variation = np.random.uniform(0.7, 1.3)
+            variation = rng.uniform(0.7, 1.3)
             distance = base_distance * variation
             distances.append(distance)
 
@@ -278,7 +907,7 @@ class MedicalRepCalculatorGUI:
         travel_times = []
         for distance in distances:
             base_travel_hours = distance / transport_speed
-            time_variation = np.random.uniform(0.75, 1.25)
+            time_variation = rng.uniform(0.75, 1.25)
             travel_hours = base_travel_hours * time_variation
             travel_minutes = travel_hours * 60 + transport_waiting
             travel_times.append(travel_minutes)
@@ -295,7 +924,7 @@ class MedicalRepCalculatorGUI:
         efficiency = (total_visit_time_min / total_time_min * 100) if total_time_min > 0 else 0
 
         # 6. Успешные визиты
-        success_rate = np.random.uniform(0.8, 0.95)
+        success_rate = rng.uniform(0.8, 0.95)
         successful_visits = int(num_visits * success_rate)
 
         # 7. Проверка условий
@@ -315,80 +944,43 @@ class MedicalRepCalculatorGUI:
         }
 
     def _calculate_mc_statistics(self, results):
-        """Расчёт статистики по результатам Монте-Карло"""
-        import numpy as np
-
-        stats = {}
-
-        for key, values in results.items():
-            if values and len(values) > 0:
-                try:
-                    # ★ ВАЖНО: Для булевых массивов преобразуем в float ★
-                    if isinstance(values[0], (bool, np.bool_)):
-                        values_array = np.array(values, dtype=float)
-                    else:
-                        values_array = np.array(values)
-
-                    stats[key] = {
-                        'mean': float(np.mean(values_array)),
-                        'median': float(np.median(values_array)),
-                        'std': float(np.std(values_array)) if len(values_array) > 1 else 0.0,
-                        'min': float(np.min(values_array)),
-                        'max': float(np.max(values_array))
-                    }
-
-                    # Процентили (если достаточно данных)
-                    if len(values_array) >= 5:
-                        stats[key]['p5'] = float(np.percentile(values_array, 5))
-                        stats[key]['p95'] = float(np.percentile(values_array, 95))
-
-                except Exception as e:
-                    print(f"Ошибка при расчёте статистики для {key}: {e}")
-                    stats[key] = {'mean': 0, 'median': 0, 'std': 0, 'min': 0, 'max': 0}
-
-        # ★ ИСПРАВЛЕННЫЙ РАСЧЁТ ДЛЯ БУЛЕВЫХ МАССИВОВ ★
-
-        # 1. Вероятность перегрузки
-        if results.get('is_overloaded') and len(results['is_overloaded']) > 0:
-            # Преобразуем булевый массив в числовой
-            overload_array = np.array(results['is_overloaded'], dtype=float)
-            overload_prob = np.mean(overload_array) * 100
-
-            stats['overload_probability'] = {
-                'value': float(overload_prob),
-                'description': f"Вероятность переработки (>8 часов): {overload_prob:.1f}%"
-            }
-
-        # 2. Вероятность оптимального дня
-        if results.get('is_optimal') and len(results['is_optimal']) > 0:
-            # Преобразуем булевый массив в числовой
-            optimal_array = np.array(results['is_optimal'], dtype=float)
-            optimal_prob = np.mean(optimal_array) * 100
-
-            stats['optimal_probability'] = {
-                'value': float(optimal_prob),
-                'description': f"Вероятность оптимального дня: {optimal_prob:.1f}%"
-            }
-
-        return stats
+        """Расчёт статистики по результатам Монте-Карло (словарь списков/массивов)"""
+        accumulator = MCAccumulator()
+        accumulator.update({
+            key: np.asarray(values) for key, values in results.items()
+            if values is not None and len(values) > 0
+        })
+        return accumulator.statistics()
 
     def calculate_city_load(self, city, specialization, transport_type,
                             total_visits_needed, visits_per_doctor,
                             project_calendar_days,
-                            work_days_per_week=5, max_work_hours_per_day=8):
+                            work_days_per_week=5, max_work_hours_per_day=8, reps_range=None):
         """
         ★ ПРОСТОЙ И НАДЁЖНЫЙ расчёт проекта ★
+        reps_range=(first, last) - сценарии для заданного диапазона численности (например, (1, 500))
         """
+        cache_key = self._result_cache_key('calculate_city_load', (
+            city, specialization, transport_type, total_visits_needed, visits_per_doctor,
+            project_calendar_days, work_days_per_week, max_work_hours_per_day, reps_range))
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            # Как и при расчёте (_simple_city_load), результат становится текущим проектом
+            self.current_project_result = cached
+            return cached
+
         print(f"🚀 Запуск расчета проекта: {city} - {specialization}")
 
         try:
             # Пробуем самый простой метод
-            return self._simple_city_load(
+            result = self._simple_city_load(
                 city, specialization, transport_type,
                 total_visits_needed, visits_per_doctor,
                 project_calendar_days,
-                work_days_per_week, max_work_hours_per_day
+                work_days_per_week, max_work_hours_per_day, reps_range
             )
+            self.result_cache.put(cache_key, result)
+            return result
 
         except Exception as e:
             print(f"❌ Все методы провалились: {e}")
@@ -402,25 +994,18 @@ class MedicalRepCalculatorGUI:
     def _simple_city_load(self, city, specialization, transport_type,
                           total_visits_needed, visits_per_doctor,
                           project_calendar_days,
-                          work_days_per_week=5, max_work_hours_per_day=8):
+                          work_days_per_week=5, max_work_hours_per_day=8, reps_range=None):
         """
         ПРОСТОЙ но РАЗНООБРАЗНЫЙ расчет с реалистичными сценариями
         """
-        # Базовые значения с учетом специализации
+        # Базовые значения с учетом специализации (1 час на аптеку, 1.5 часа на врача)
         if 'аптек' in specialization.lower():
-            time_per_visit = 1.0  # 1 час на аптеку
+            time_per_visit = SIMPLE_VISIT_HOURS['pharmacy']
         else:
-            time_per_visit = 1.5  # 1.5 часа на врача
+            time_per_visit = SIMPLE_VISIT_HOURS['doctor']
 
         # Корректировка по городу
-        city_factors = {
-            'Москва': 0.8,  # Выше плотность - меньше времени
-            'Санкт-Петербург': 0.9,
-            'Екатеринбург': 1.1,
-            'Новосибирск': 1.1,
-            'Казань': 1.0
-        }
-        city_factor = city_factors.get(city, 1.0)
+        city_factor = SIMPLE_CITY_FACTORS.get(city, 1.0)
         time_per_visit *= city_factor
 
         # Расчеты
@@ -439,7 +1024,7 @@ class MedicalRepCalculatorGUI:
         total_project_hours = total_work_days * max_work_hours_per_day
 
         # Медпреды (реалистичный расчет)
-        efficiency = 0.82  # 82% эффективности
+        efficiency = SIMPLE_EFFICIENCY
         available_hours = total_project_hours * efficiency if total_project_hours > 0 else 1
 
         min_reps = 1
@@ -447,7 +1032,7 @@ class MedicalRepCalculatorGUI:
             min_reps = math.ceil(total_hours / available_hours)
 
         # Оптимальное количество (не минимальное + 1, а с расчетом)
-        optimal_load = 0.75  # 75% загрузка оптимальна
+        optimal_load = SIMPLE_OPTIMAL_LOAD
         optimal_reps = math.ceil(
             total_hours / (available_hours * optimal_load)) if available_hours > 0 else min_reps + 1
 
@@ -460,135 +1045,20 @@ class MedicalRepCalculatorGUI:
         if total_project_hours > 0:
             intensity = (total_hours / total_project_hours) * 100
 
-        if intensity > 100:
-            status = "критическая"
-            color = "#e74c3c"
-            icon = "🔥"
-        elif intensity > 85:
-            status = "высокая"
-            color = "#e74c3c"
-            icon = "⚠"
-        elif intensity > 70:
-            status = "средняя"
-            color = "#f39c12"
-            icon = "⚠"
-        elif intensity > 50:
-            status = "нормальная"
-            color = "#2ecc71"
-            icon = "✓"
-        else:
-            status = "низкая"
-            color = "#3498db"
-            icon = "ℹ"
+        status, color, icon = (str(value) for value in project_status(intensity))
 
         # ★ РАЗНООБРАЗНЫЕ СЦЕНАРИИ (от 1 до N медпредов) ★
-        scenarios = []
-
-        # Определяем диапазон для отображения
-        # Минимум 5 вариантов, максимум 10
-        min_reps_to_show = max(1, min_reps - 2)
-        max_reps_to_show = max(min_reps + 7, optimal_reps + 5)
-
-        # Ограничиваем разумными пределами
-        max_reps_to_show = min(max_reps_to_show, min_reps + 15)  # Не более 15 вариантов
-
-        print(f"   Сценарии: от {min_reps_to_show} до {max_reps_to_show} медпредов")
-
-        for reps in range(min_reps_to_show, max_reps_to_show + 1):
-            if reps < 1:
-                continue
-
-            # Время выполнения
-            if reps > 0 and available_hours > 0:
-                weeks_needed = total_hours / (reps * available_hours) * (project_calendar_days / 7)
-            else:
-                weeks_needed = project_weeks
-
-            calendar_days = weeks_needed * 7
-
-            # Процент использования сроков
-            time_util = 0
-            if project_calendar_days > 0:
-                time_util = (calendar_days / project_calendar_days) * 100
-
-            # Загрузка персонала
-            rep_load = 0
-            if reps > 0 and available_hours > 0:
-                rep_load = (total_hours / (reps * available_hours)) * 100
-
-            # ★ РАЗНЫЕ РЕКОМЕНДАЦИИ В ЗАВИСИМОСТИ ОТ ПАРАМЕТРОВ ★
-            recommendation = ""
-            is_minimal_flag = False
-            is_optimal_flag = False
-
-            if reps == min_reps:
-                recommendation = "Минимальное (высокая напряжённость)"
-                is_minimal_flag = True
-            elif reps == optimal_reps:
-                recommendation = "Оптимальное (рекомендуется)"
-                is_optimal_flag = True
-            elif rep_load > 95:
-                recommendation = "Сильная перегрузка"
-            elif rep_load > 90:
-                recommendation = "Перегрузка персонала"
-            elif rep_load < 50:
-                recommendation = "Сильная недогрузка"
-            elif rep_load < 60:
-                recommendation = "Недогрузка персонала"
-            elif 75 <= rep_load <= 85:
-                recommendation = "Идеальная загрузка"
-            elif 70 <= rep_load <= 90:
-                recommendation = "Хорошая загрузка"
-            elif time_util < 60:
-                recommendation = "Значительно быстрее плана"
-            elif time_util < 80:
-                recommendation = "Быстрее плана"
-            elif time_util > 120:
-                recommendation = "Значительно медленнее плана"
-            elif time_util > 100:
-                recommendation = "Медленнее плана"
-            else:
-                recommendation = "Приемлемый вариант"
-
-            # ★ ДОБАВЛЯЕМ ИНТЕРЕСНЫЕ МЕТРИКИ ★
-            if reps <= 3 and rep_load > 120:
-                recommendation += " (очень напряжённо)"
-            elif reps >= 10 and rep_load < 40:
-                recommendation += " (избыточно)"
-
-            scenarios.append({
-                'reps_count': reps,
-                'weeks': round(weeks_needed, 1),
-                'work_days': round(weeks_needed * work_days_per_week, 0),
-                'calendar_days': round(calendar_days, 0),
-                'time_utilization': round(time_util, 1),
-                'rep_utilization': round(rep_load, 1),
-                'recommendation': recommendation,
-                'is_minimal': is_minimal_flag,
-                'is_optimal': is_optimal_flag
-            })
-
-        # ★ УБЕДИМСЯ, ЧТО ЕСТЬ РАЗНООБРАЗИЕ ★
-        # Если сценариев меньше 5, добавим еще
-        if len(scenarios) < 5:
-            for i in range(len(scenarios), 5):
-                reps = max_reps_to_show + i + 1
-                weeks = total_hours / (reps * available_hours) * (
-                            project_calendar_days / 7) if available_hours > 0 else 0
-
-                scenarios.append({
-                    'reps_count': reps,
-                    'weeks': round(weeks, 1),
-                    'work_days': round(weeks * work_days_per_week, 0),
-                    'calendar_days': round(weeks * 7, 0),
-                    'time_utilization': round((weeks * 7 / project_calendar_days) * 100,
-                                              1) if project_calendar_days > 0 else 0,
-                    'rep_utilization': round((total_hours / (reps * available_hours)) * 100,
-                                             1) if available_hours > 0 else 0,
-                    'recommendation': "📈 Дополнительный вариант",
-                    'is_minimal': False,
-                    'is_optimal': False
-                })
+        # Диапазон: от min_reps - 2, не менее 8 вариантов и не более 15 сверх минимума
+        reps = scenario_range(min_reps, optimal_reps, above_min=7, above_optimal=5, max_above_min=15,
+                              reps_range=reps_range)
+        if len(reps):
+            print(f"   Сценарии: от {reps[0]} до {reps[-1]} медпредов")
+
+        table = scenario_table(total_hours, available_hours / project_weeks, project_calendar_days, reps,
+                               min_reps, optimal_reps, work_days_per_week, available_hours,
+                               rules=SIMPLE_RULES, suffixes=SIMPLE_SUFFIXES)
+        table['is_optimal'] &= ~table['is_minimal']
+        scenarios = scenario_rows(table)
 
         print(f"   Сгенерировано {len(scenarios)} сценариев")
 
@@ -635,7 +1105,7 @@ class MedicalRepCalculatorGUI:
     def _legacy_calculate_city_load(self, city, specialization, transport_type,
                                     total_visits_needed, visits_per_doctor,
                                     project_calendar_days,
-                                    work_days_per_week=5, max_work_hours_per_day=8):
+                                    work_days_per_week=5, max_work_hours_per_day=8, reps_range=None):
         """
         ★ ПРОСТОЙ И НАДЁЖНЫЙ расчёт нагрузки на город ★
         """
@@ -688,87 +1158,14 @@ class MedicalRepCalculatorGUI:
             if total_project_hours > 0:
                 intensity = (total_time_all_doctors_hours / total_project_hours) * 100
 
-            project_status = "не определена"
-            status_color = "#95a5a6"
-            status_icon = "ℹ"
-
-            if intensity > 100:
-                project_status = "критическая"
-                status_color = "#e74c3c"
-                status_icon = "🔥"
-            elif intensity > 85:
-                project_status = "высокая"
-                status_color = "#e74c3c"
-                status_icon = "⚠"
-            elif intensity > 70:
-                project_status = "средняя"
-                status_color = "#f39c12"
-                status_icon = "⚠"
-            elif intensity > 50:
-                project_status = "нормальная"
-                status_color = "#2ecc71"
-                status_icon = "✓"
-            else:
-                project_status = "низкая"
-                status_color = "#3498db"
-                status_icon = "ℹ"
+            status, status_color, status_icon = (str(value) for value in project_status(intensity))
 
             # ★ 6. СЦЕНАРИИ ★
-            scenarios = []
-
-            min_reps_to_show = max(1, min_reps_needed_int - 2)
-            max_reps_to_show = max(min_reps_needed_int + 5, optimal_reps_needed_int + 3)
-
-            for reps in range(min_reps_to_show, max_reps_to_show + 1):
-                if reps < 1:
-                    continue
-
-                # Время выполнения
-                actual_weeks = 0
-                if reps > 0 and hours_per_rep_per_week > 0 and efficiency_factor > 0:
-                    actual_weeks = total_time_all_doctors_hours / (reps * hours_per_rep_per_week * efficiency_factor)
-
-                actual_calendar_days = actual_weeks * 7
-
-                # Процент использования сроков
-                time_utilization = 0
-                if project_calendar_days > 0:
-                    time_utilization = (actual_calendar_days / project_calendar_days) * 100
-
-                # Загрузка персонала
-                rep_utilization = 0
-                available_hours = reps * available_hours_per_rep
-                if available_hours > 0:
-                    rep_utilization = (total_time_all_doctors_hours / available_hours) * 100
-
-                # Рекомендация
-                recommendation = ""
-                if reps == min_reps_needed_int:
-                    recommendation = "Минимальное (высокая напряжённость)"
-                elif reps == optimal_reps_needed_int:
-                    recommendation = "Оптимальное (рекомендуется)"
-                elif rep_utilization > 90:
-                    recommendation = "Перегрузка персонала"
-                elif rep_utilization < 60:
-                    recommendation = "Недогрузка персонала"
-                elif 70 <= rep_utilization <= 85:
-                    recommendation = "Хорошая загрузка"
-                elif time_utilization < 70:
-                    recommendation = "⚡ Быстрее плана"
-                else:
-                    recommendation = "Приемлемый вариант"
-
-                scenarios.append({
-                    'reps_count': reps,
-                    'weeks': round(actual_weeks, 1),
-                    'work_days': round(actual_weeks * work_days_per_week, 0),
-                    'calendar_days': round(actual_calendar_days, 0),
-                    'time_utilization': round(time_utilization, 1),
-                    'rep_utilization': round(rep_utilization, 1),
-                    'recommendation': recommendation,
-                    'is_minimal': reps == min_reps_needed_int,
-                    'is_optimal': reps == optimal_reps_needed_int
-                })
+            reps = scenario_range(min_reps_needed_int, optimal_reps_needed_int, reps_range=reps_range)
+            scenarios = scenario_rows(scenario_table(
+                total_time_all_doctors_hours, hours_per_rep_per_week * efficiency_factor, project_calendar_days,
+                reps, min_reps_needed_int, optimal_reps_needed_int, work_days_per_week, available_hours_per_rep,
+                rules=LEGACY_RULES))
 
             # ★ 7. ФОРМИРУЕМ РЕЗУЛЬТАТ ★
             result = {
@@ -792,7 +1189,7 @@ class MedicalRepCalculatorGUI:
                     'optimal_reps_needed': optimal_reps_needed_int,
                     'optimal_reps_exact': round(optimal_reps_needed, 2),
                     'project_intensity': round(intensity, 1),
-                    'project_status': project_status,
+                    'project_status': status,
                     'status_color': status_color,
                     'status_icon': status_icon,
                     'hours_per_rep_per_week': hours_per_rep_per_week,
@@ -830,58 +1227,16 @@ class MedicalRepCalculatorGUI:
     def _generate_legacy_scenarios(self, total_hours_needed, available_hours_per_rep,
                                    hours_per_rep_per_week, efficiency_factor,
                                    work_days_per_week, project_calendar_days,
-                                   min_reps, optimal_reps):
+                                   min_reps, optimal_reps, reps_range=None):
         """Генерация сценариев для legacy метода"""
-        scenarios = []
-
-        min_to_show = max(1, min_reps - 2)
-        max_to_show = max(min_reps + 5, optimal_reps + 3)
-
-        for reps in range(min_to_show, max_to_show + 1):
-            if reps < 1:
-                continue
-
-            # Время выполнения
-            available_hours = reps * available_hours_per_rep
-            if available_hours > 0:
-                actual_weeks = total_hours_needed / (reps * hours_per_rep_per_week * efficiency_factor)
-                actual_calendar_days = actual_weeks * 7
-
-                # Процент использования сроков
-                time_util = (actual_calendar_days / project_calendar_days) * 100 if project_calendar_days > 0 else 100
-
-                # Загрузка персонала
-                rep_load = (total_hours_needed / available_hours) * 100 if available_hours > 0 else 100
-
-                # Рекомендация
-                if reps == min_reps:
-                    rec = "Минимальное (напряжённый режим)"
-                elif reps == optimal_reps:
-                    rec = "Оптимальное (рекомендуется)"
-                elif rep_load > 90:
-                    rec = "Перегрузка персонала"
-                elif rep_load < 60:
-                    rec = "Недогрузка персонала"
-                elif 70 <= rep_load <= 85:
-                    rec = "Хорошая загрузка"
-                elif time_util < 70:
-                    rec = "Быстрее плана"
-                else:
-                    rec = "Приемлемый вариант"
-
-                scenarios.append({
-                    'reps_count': reps,
-                    'weeks': round(actual_weeks, 1),
-                    'work_days': round(actual_weeks * work_days_per_week, 0),
-                    'calendar_days': round(actual_calendar_days, 0),
-                    'time_utilization': round(time_util, 1),
-                    'rep_utilization': round(rep_load, 1),
-                    'recommendation': rec,
-                    'is_minimal': reps == min_reps,
-                    'is_optimal': reps == optimal_reps
-                })
+        if available_hours_per_rep <= 0:
+            return []
 
-        return scenarios
+        reps = scenario_range(min_reps, optimal_reps, reps_range=reps_range)
+        return scenario_rows(scenario_table(
+            total_hours_needed, hours_per_rep_per_week * efficiency_factor, project_calendar_days, reps,
+            min_reps, optimal_reps, work_days_per_week, available_hours_per_rep,
+            rules=LEGACY_SCENARIO_RULES, empty_time_utilization=100))
 
     def calculate_city_load_simple_fallback(self, city, specialization, transport_type,
                                             total_visits_needed, visits_per_doctor,
@@ -1104,8 +1459,10 @@ class MedicalRepCalculatorGUI:
 
         return total_minutes
 
-    def generate_sample_locations(self, city, specialization, num_visits):
+    def generate_sample_locations(self, city, specialization, num_visits, rng=None):
         """Генерация случайных локаций для визитов в городе"""
+        rng = make_rng(rng=rng)
+
         if specialization == 'pharmacy':
             num_locations = self.cities_data[city]['pharmacies']
             location_type = 'Аптека'
@@ -1128,8 +1485,8 @@ class MedicalRepCalculatorGUI:
 
         for i in range(max_locations):
             # Случайное смещение от центра (до 10 км)
-            lat_offset = random.uniform(-0.15, 0.15)
-            lon_offset = random.uniform(-0.2, 0.2)
+            lat_offset = rng.uniform(-0.15, 0.15)
+            lon_offset = rng.uniform(-0.2, 0.2)
 
             locations.append({
                 'id': i + 1,
@@ -1179,14 +1536,16 @@ class MedicalRepCalculatorGUI:
         return visited, total_distance, travel_time
 
     def calculate_daily_schedule(self, city, specialization, num_visits, transport_type='Автомобиль',
-                                 start_time='09:00', max_work_hours=8):
+                                 start_time='09:00', max_work_hours=8, random_seed=None, rng=None):
         """Расчет полного рабочего дня"""
+        rng = make_rng(random_seed, rng)
+
         # Преобразуем русские названия в ключи
         spec_key = self.specialization_names.get(specialization, specialization)
         transport_key = self.transport_names.get(transport_type, transport_type)
 
         # Генерация локаций
-        locations = self.generate_sample_locations(city, spec_key, num_visits)
+        locations = self.generate_sample_locations(city, spec_key, num_visits, rng=rng)
 
         # Расчет маршрута
         route, total_distance, travel_time = self.calculate_optimal_route(
@@ -1227,7 +1586,7 @@ class MedicalRepCalculatorGUI:
                 current_time += timedelta(minutes=segment_travel_time)
 
             # Визит
-            visit_duration = random.uniform(
+            visit_duration = rng.uniform(
                 self.visit_params[visit_type]['min'],
                 self.visit_params[visit_type]['max']
             )
@@ -1267,15 +1626,18 @@ class MedicalRepCalculatorGUI:
         self.current_result = result
         return result
 
-    def unified_calculate_day(self, city, specialization, num_visits, transport_type):
+    def unified_calculate_day(self, city, specialization, num_visits, transport_type,
+                              random_seed=None, rng=None):
         """
         ★ ОБНОВЛЁННЫЙ РАСЧЁТ С УЧЁТОМ ПЛОТНОСТИ ВРАЧЕЙ ★
         """
+        rng = make_rng(random_seed, rng)
+
         try:
             # Используем новый калькулятор плотности
             if hasattr(self, 'density_calculator'):
                 result = self.density_calculator.simulate_density_day(
-                    city, specialization, num_visits, transport_type
+                    city, specialization, num_visits, transport_type, rng=rng
                 )
 
                 # Форматируем для совместимости
@@ -1301,7 +1663,8 @@ class MedicalRepCalculatorGUI:
                     'clinics_visited': result['clinics_visited'],
                     'density_based': True,
                     'is_big_city': result['is_big_city'],
-                    'locations': self._generate_density_locations(city, specialization, num_visits, result),
+                    'locations': self._generate_density_locations(city, specialization, num_visits, result,
+                                                                  rng=rng),
                     'route': list(range(min(num_visits, 10))),  # Простой маршрут для совместимости
                     'schedule': self._create_density_schedule(result['detailed_schedule'])
                 }
@@ -1315,14 +1678,15 @@ class MedicalRepCalculatorGUI:
             print(f"Ошибка в unified_calculate_day: {e}")
             return self._legacy_calculate_day(city, specialization, num_visits, transport_type)
 
-    def _generate_density_locations(self, city, specialization, num_visits, density_result):
+    def _generate_density_locations(self, city, specialization, num_visits, density_result, rng=None):
         """Генерация локаций, СГРУППИРОВАННЫХ ПО РАЙОНАМ в крупных городах"""
+        rng = make_rng(rng=rng)
         locations = []
         schedule = density_result.get('detailed_schedule', [])
 
         if not schedule:
             # Если нет детального расписания, создаем случайные, но группированные
-            return self._generate_grouped_locations(city, specialization, num_visits, density_result)
+            return self._generate_grouped_locations(city, specialization, num_visits, density_result, rng=rng)
 
         # Группируем визиты по районам
         visits_by_district = {}
@@ -1359,8 +1723,8 @@ class MedicalRepCalculatorGUI:
             # Внутри района точки должны быть близко друг к другу
             for i, visit in enumerate(visits):
                 # Случайное смещение внутри района (максимум 1-2 км)
-                lat_offset = random.uniform(-0.01, 0.01)
-                lon_offset = random.uniform(-0.015, 0.015)
+                lat_offset = rng.uniform(-0.01, 0.01)
+                lon_offset = rng.uniform(-0.015, 0.015)
 
                 clinic_id = visit.get('clinic_id', i + 1)
 
@@ -1379,8 +1743,9 @@ class MedicalRepCalculatorGUI:
 
         return locations
 
-    def _generate_grouped_locations(self, city, specialization, num_visits, density_result):
+    def _generate_grouped_locations(self, city, specialization, num_visits, density_result, rng=None):
         """Генерация группированных локаций когда нет детального расписания"""
+        rng = make_rng(rng=rng)
         locations = []
         base_lat, base_lon = self.city_coords.get(city, (55.7558, 37.6173))
 
@@ -1423,8 +1788,8 @@ class MedicalRepCalculatorGUI:
             for i in range(district_visits):
                 # Точки внутри района должны быть близко
                 cluster_radius = 0.005  # ~500 метров
-                angle = random.uniform(0, 2 * math.pi)
-                radius = random.uniform(0, cluster_radius)
+                angle = rng.uniform(0, 2 * math.pi)
+                radius = rng.uniform(0, cluster_radius)
 
                 lat_offset = radius * math.cos(angle)
                 lon_offset = radius * math.sin(angle)
@@ -1443,8 +1808,9 @@ class MedicalRepCalculatorGUI:
 
         return locations
 
-    def _generate_grouped_locations(self, city, specialization, num_visits, density_result):
+    def _generate_grouped_locations(self, city, specialization, num_visits, density_result, rng=None):
         """Генерация группированных локаций когда нет детального расписания"""
+        rng = make_rng(rng=rng)
         locations = []
         base_lat, base_lon = self.city_coords.get(city, (55.7558, 37.6173))
 
@@ -1487,8 +1853,8 @@ class MedicalRepCalculatorGUI:
             for i in range(district_visits):
                 # Точки внутри района должны быть близко
                 cluster_radius = 0.005  # ~500 метров
-                angle = random.uniform(0, 2 * math.pi)
-                radius = random.uniform(0, cluster_radius)
+                angle = rng.uniform(0, 2 * math.pi)
+                radius = rng.uniform(0, cluster_radius)
 
                 lat_offset = radius * math.cos(angle)
                 lon_offset = radius * math.sin(angle)
@@ -1545,25 +1911,20 @@ class MedicalRepCalculatorGUI:
         return schedule
 
     def unified_calculate_day_variable(self, city, specialization, num_visits, transport_type,
-                                       random_seed=None):
+                                       random_seed=None, rng=None):
         """
         УНИФИЦИРОВАННЫЙ расчёт с вариативностью (для "Рабочего дня")
         Административное время УЖЕ ВКЛЮЧЕНО во время визита!
         """
-        import random
-        import numpy as np
-
-        # Устанавливаем seed для воспроизводимости
-        if random_seed is not None:
-            random.seed(random_seed)
-            np.random.seed(random_seed)
+        # Собственный поток случайных чисел для воспроизводимости
+        rng = make_rng(random_seed, rng)
 
         # 1. Определяем тип визита
         spec_key = self.specialization_names.get(specialization, specialization)
         is_pharmacy = (spec_key == 'pharmacy')
 
         # 2. Генерируем локации (для маршрута)
-        locations = self.generate_sample_locations(city, spec_key, num_visits)
+        locations = self.generate_sample_locations(city, spec_key, num_visits, rng=rng)
 
         # 3. Создаем простой маршрут (последовательный)
         route = list(range(min(num_visits, len(locations))))
@@ -1582,7 +1943,7 @@ class MedicalRepCalculatorGUI:
         visit_times = []
         for _ in range(num_visits):
             # Нормальное распределение вокруг среднего
-            visit_time = np.random.normal(avg_visit, (max_visit - min_visit) / 6)
+            visit_time = rng.normal(avg_visit, (max_visit - min_visit) / 6)
             # Ограничиваем диапазоном
             visit_time = max(min_visit, min(max_visit, visit_time))
             visit_times.append(visit_time)
@@ -1600,7 +1961,7 @@ class MedicalRepCalculatorGUI:
         for _ in range(max(0, num_visits - 1)):
             # Нормальное распределение с вариацией ±30%
             base_distance = avg_distance_km * detour_factor
-            variation = np.random.uniform(0.7, 1.3)  # ±30%
+            variation = rng.uniform(0.7, 1.3)  # ±30%
             distance = base_distance * variation
             distances.append(distance)
 
@@ -1615,7 +1976,7 @@ class MedicalRepCalculatorGUI:
         for distance in distances:
             base_travel_hours = distance / transport_speed
             # Вариация времени ±25% (пробки, светофоры)
-            time_variation = np.random.uniform(0.75, 1.25)
+            time_variation = rng.uniform(0.75, 1.25)
             travel_hours = base_travel_hours * time_variation
             travel_minutes = travel_hours * 60 + transport_waiting
             travel_times.append(travel_minutes)
@@ -1633,7 +1994,7 @@ class MedicalRepCalculatorGUI:
         efficiency = (total_visit_time_min / total_time_min * 100) if total_time_min > 0 else 0
 
         # 10. ★ ДОПОЛНИТЕЛЬНЫЕ СЛУЧАЙНЫЕ МЕТРИКИ ★
-        success_rate = np.random.uniform(0.8, 0.95)  # 80-95% успешных визитов
+        success_rate = rng.uniform(0.8, 0.95)  # 80-95% успешных визитов
         successful_visits = int(num_visits * success_rate)
 
         # 11. Формируем результат
@@ -1678,11 +2039,11 @@ class MedicalRepCalculatorGUI:
                 progress_callback(20)
 
             # Минимальный набор данных - всего 50 примеров
-            np.random.seed(42)
+            rng = np.random.default_rng(42)
             n_samples = 50  # Вместо 1000!
 
-            X = np.random.rand(n_samples, 6) * 2 + 0.5
-            y = np.random.rand(n_samples) * 0.5 + 0.5  # Эффективность 50-100%
+            X = rng.random((n_samples, 6)) * 2 + 0.5
+            y = rng.random(n_samples) * 0.5 + 0.5  # Эффективность 50-100%
 
             if progress_callback:
                 progress_callback(40)
@@ -2238,160 +2599,276 @@ class MedicalRepCalculatorGUI:
     def calculate_city_load_with_density(self, city, specialization, transport_type,
                                          total_visits_needed, visits_per_doctor,
                                          project_calendar_days,
-                                         work_days_per_week=5, max_work_hours_per_day=8):
-        """Просто вызывает density_calculator"""
+                                         work_days_per_week=5, max_work_hours_per_day=8,
+                                         random_seed=None, rng=None, reps_range=None):
+        """
+        Просто вызывает density_calculator (результат с явным seed кэшируется).
+        reps_range - см. calculate_city_load
+        """
         if hasattr(self, 'density_calculator'):
-            return self.density_calculator.calculate_city_load_with_density(
+            cache_key = None
+            if random_seed is not None and rng is None:
+                cache_key = self._result_cache_key('calculate_city_load_with_density', (
+                    city, specialization, transport_type, total_visits_needed, visits_per_doctor,
+                    project_calendar_days, work_days_per_week, max_work_hours_per_day, random_seed, reps_range))
+                cached = self.result_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+
+            result = self.density_calculator.calculate_city_load_with_density(
                 city, specialization, transport_type,
                 total_visits_needed, visits_per_doctor,
                 project_calendar_days,
-                work_days_per_week, max_work_hours_per_day
+                work_days_per_week, max_work_hours_per_day,
+                random_seed=random_seed, rng=rng, reps_range=reps_range
             )
+            if 'error' not in result:
+                self.result_cache.put(cache_key, result)
+            return result
         else:
             return self._legacy_calculate_city_load(
                 city, specialization, transport_type,
                 total_visits_needed, visits_per_doctor,
                 project_calendar_days,
-                work_days_per_week, max_work_hours_per_day
+                work_days_per_week, max_work_hours_per_day, reps_range
             )
 
-    def _generate_project_scenarios(self, city, specialization, transport_type,
-                                    total_visits_needed, visits_per_doctor,
-                                    unique_doctors_needed, time_per_doctor_hours,
-                                    hours_per_rep_per_week, efficiency_factor,
-                                    min_reps_needed, min_reps_needed_int,
-                                    optimal_reps_needed_int, project_calendar_days):
-        """Генерация сценариев для проекта"""
-        scenarios = []
-
-        # Определяем диапазон для отображения
-        min_reps_to_show = max(1, min_reps_needed_int - 2)
-        max_reps_to_show = max(min_reps_needed_int + 6, optimal_reps_needed_int + 4)
-
-        rep_options = list(range(min_reps_to_show, max_reps_to_show + 1))
-
-        for num_reps in rep_options:
-            if num_reps < 1:
-                continue
-
-            # Время выполнения
-            available_hours = num_reps * hours_per_rep_per_week * efficiency_factor * (project_calendar_days / 7)
-            required_hours = unique_doctors_needed * time_per_doctor_hours
-
-            actual_weeks = required_hours / (num_reps * hours_per_rep_per_week * efficiency_factor)
-            actual_calendar_days = actual_weeks * 7
-
-            # Загрузка сроков (% от заданного срока)
-            time_utilization = (actual_calendar_days / project_calendar_days) * 100
-
-            # Загрузка персонала (% от их времени)
-            rep_load_percentage = (required_hours / available_hours) * 100 if available_hours > 0 else 100
-
-            # ★ УЛУЧШЕННЫЕ РЕКОМЕНДАЦИИ ★
-            recommendation = ""
-            if num_reps == min_reps_needed_int:
-                recommendation = "Минимальное (высокая напряжённость)"
-            elif num_reps == optimal_reps_needed_int:
-                recommendation = "Оптимальное (рекомендуется)"
-            elif rep_load_percentage < 60:
-                recommendation = "Недогрузка персонала"
-            elif rep_load_percentage > 90:
-                recommendation = "Перегрузка персонала"
-            elif 70 <= rep_load_percentage <= 85:
-                recommendation = "Хорошая загрузка"
-            elif time_utilization < 70:
-                recommendation = "Быстрее плана"
-            else:
-                recommendation = "Приемлемый вариант"
-
-            scenarios.append({
-                'reps_count': num_reps,
-                'weeks': round(actual_weeks, 1),
-                'work_days': round(actual_weeks * 5, 0),  # 5 рабочих дней в неделю
-                'calendar_days': round(actual_calendar_days, 0),
-                'time_utilization': round(time_utilization, 1),
-                'rep_utilization': round(rep_load_percentage, 1),
-                'recommendation': recommendation,
-                'is_minimal': num_reps == min_reps_needed_int,
-                'is_optimal': num_reps == optimal_reps_needed_int
-            })
-
-        return scenarios
-
-    def monte_carlo_with_density(self, city, specialization, num_visits, transport_type, iterations=1000):
+    def _completion_args(self, city, specialization, transport_type, total_visits_needed, visits_per_day,
+                         project_calendar_days, work_days_per_week, model):
+        """Параметры completion_chunk и срок проекта в рабочих днях (с проверкой входных данных)"""
+        if model not in COMPLETION_MODELS:
+            raise ValueError(f"Неизвестная модель дня: {model}")
+        if visits_per_day <= 0 or total_visits_needed <= 0:
+            raise ValueError("Число визитов должно быть положительным")
+        deadline = calendar_work_days(project_calendar_days, work_days_per_week)
+        if deadline <= 0:
+            raise ValueError("В сроке проекта нет ни одного рабочего дня")
+
+        if model == 'density':
+            day_args = self._density_task_args(city, specialization, visits_per_day, transport_type)
+        else:
+            day_args = self._daily_kernel_params(city, specialization, visits_per_day, transport_type)
+        return {
+            'model': model,
+            'day_args': day_args,
+            'total_visits_needed': total_visits_needed,
+            'visits_per_day': visits_per_day
+        }, deadline
+
+    def simulate_project_completion(self, city, specialization, transport_type, total_visits_needed,
+                                    visits_per_day, project_calendar_days, reps=None, replications=1000,
+                                    work_days_per_week=5, model='daily', start_date=None, random_seed=None,
+                                    rng=None, workers=1, chunk_size=DEFAULT_CHUNK_SIZE, confidence=0.95):
         """
-        Монте-Карло анализ с учётом плотности врачей
+        Стохастическое завершение проекта: каждый рабочий день каждого медпреда
+        симулируется пакетным дневным ядром (model='daily') или ядром с плотностью
+        ('density'); проект закончен, когда набрано total_visits_needed успешных визитов.
+        Для каждой численности из reps (по умолчанию - от 1 до успевающей во всех репликах,
+        не более 500): распределение срока в календарных днях (и датах от start_date -
+        первого рабочего дня) и вероятность уложиться в project_calendar_days, %
         """
-        results = {
-            'total_hours': [],
-            'successful_visits': [],
-            'travel_distance': [],
-            'waiting_time': [],
-            'districts_visited': [],
-            'efficiency': []
-        }
-
-        if not hasattr(self, 'density_calculator'):
-            return self.monte_carlo_daily_simulation(city, specialization, num_visits, transport_type, iterations)
-
-        for i in range(iterations):
-            day_result = self.density_calculator.simulate_day_with_density(
-                city, specialization, num_visits, transport_type
-            )
-
-            results['total_hours'].append(day_result['total_hours'])
-            results['successful_visits'].append(day_result['successful_visits'])
-            results['travel_distance'].append(day_result['total_travel_distance_km'])
-            results['waiting_time'].append(day_result['total_waiting_time_min'])
-            results['districts_visited'].append(day_result['districts_visited'])
-
-            efficiency = (day_result['total_visit_time_min'] / (day_result['total_hours'] * 60)) * 100
-            results['efficiency'].append(efficiency)
-
-        # Статистика
-        stats = self._calculate_density_statistics(results)
+        completion_args, deadline = self._completion_args(city, specialization, transport_type, total_visits_needed,
+                                                          visits_per_day, project_calendar_days, work_days_per_week,
+                                                          model)
+        seed_seq = root_sequence(random_seed, rng)
+        cache_key = None
+        if random_seed is not None and rng is None:
+            cache_key = self._result_cache_key('simulate_project_completion', (
+                city, specialization, transport_type, total_visits_needed, visits_per_day, project_calendar_days,
+                None if reps is None else list(reps), replications, work_days_per_week, model, start_date,
+                random_seed, chunk_size, confidence))
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        accumulator = run_chunked(completion_chunk, completion_args, replications, seed_seq, workers, chunk_size,
+                                  keep_raw=True)
+        rep_days = accumulator.raw_results()['rep_days'].astype(np.int64)
+        completed = rep_days > 0
+
+        if reps is None:
+            longest = rep_days[completed].max() if completed.any() else deadline
+            reps = range(1, min(500, max(1, math.ceil(longest / deadline))) + 1)
+
+        # Незавершённые реплики - после любого срока
+        never = np.iinfo(np.int64).max
+        count = len(rep_days)
+        table = {}
+        for reps_count in reps:
+            work_days = np.where(completed, -(-rep_days // reps_count), never)
+            on_time = int(np.sum(work_days <= deadline))
+            probability = on_time / count if count else 0.0
+            # Интервал Уилсона: не вырождается в точку при вероятности 0 или 1
+            low, high = wilson_interval(on_time, count, confidence)
+            quantiles = np.percentile(work_days, COMPLETION_PERCENTILES, method='inverted_cdf') if count else []
+            days = {q: int(work_day_calendar(day, work_days_per_week)) if day != never else None
+                    for q, day in zip(COMPLETION_PERCENTILES, quantiles)}
+            finished = work_day_calendar(work_days[completed], work_days_per_week)
+
+            row = {
+                'on_time_probability': probability * 100,
+                'ci': (low * 100, high * 100),
+                'mean_calendar_days': float(finished.mean()) if len(finished) else None,
+                'calendar_days': days
+            }
+            if start_date is not None:
+                row['finish_dates'] = {q: start_date + timedelta(days=day - 1) if day is not None else None
+                                       for q, day in days.items()}
+            table[int(reps_count)] = row
 
-        return {
-            'raw_results': results,
-            'statistics': stats,
+        result = {
+            'reps': table,
+            # Наименьшая численность, с которой проект успевает с вероятностью не ниже целевой
+            'min_reps': {target: next((k for k, row in table.items() if row['on_time_probability'] >= target), None)
+                         for target in COMPLETION_PERCENTILES},
+            'rep_days': {
+                'mean': float(rep_days[completed].mean()) if completed.any() else None,
+                'std': float(rep_days[completed].std(ddof=1)) if completed.sum() > 1 else 0.0,
+                'percentiles': dict(zip(COMPLETION_PERCENTILES, np.percentile(
+                    rep_days[completed], COMPLETION_PERCENTILES).tolist())) if completed.any() else {}
+            },
+            'completed_share': float(completed.mean() * 100) if count else 0.0,
             'input_params': {
                 'city': city,
                 'specialization': specialization,
-                'num_visits': num_visits,
                 'transport_type': transport_type,
-                'iterations': iterations,
-                'calculation_type': 'density_based'
+                'total_visits_needed': total_visits_needed,
+                'visits_per_day': visits_per_day,
+                'project_calendar_days': project_calendar_days,
+                'work_days_per_week': work_days_per_week,
+                'deadline_work_days': deadline,
+                'replications': count,
+                'model': model,
+                'confidence': confidence,
+                'random_seed': random_seed if random_seed is not None else seed_seq.entropy
             }
         }
+        self.result_cache.put(cache_key, result)
+        return result
 
-
-    def _calculate_density_statistics(self, results):
-        """Расчёт статистики для анализа плотности"""
-        import numpy as np
-
-        stats = {}
-
-        for key, values in results.items():
-            if values:
-                stats[key] = {
-                    'mean': float(np.mean(values)),
-                    'median': float(np.median(values)),
-                    'std': float(np.std(values)) if len(values) > 1 else 0.0,
-                    'min': float(np.min(values)),
-                    'max': float(np.max(values))
-                }
-
-        # Дополнительная статистика по городам
-        if 'successful_visits' in results:
-            success_rates = [v / max(1, results['successful_visits'][i]) for i, v in
-                             enumerate(results['successful_visits'])]
-            stats['success_rate'] = {
-                'mean': float(np.mean(success_rates)) * 100,
-                'min': float(np.min(success_rates)) * 100,
-                'max': float(np.max(success_rates)) * 100
+    def min_reps_for_deadline(self, city, specialization, transport_type, total_visits_needed, visits_per_day,
+                              project_calendar_days, target_probability=90, confidence=0.95, work_days_per_week=5,
+                              model='daily', max_replications=5000, random_seed=None, rng=None, workers=1,
+                              chunk_size=DEADLINE_CHUNK_SIZE):
+        """
+        Наименьшая численность, при которой проект успевает в project_calendar_days
+        с вероятностью не ниже target_probability, %. Реплики (см. simulate_project_completion)
+        считаются порциями по чанкам, после каждого чанка численность подбирается
+        поиском с удвоением шага и бисекцией на всех накопленных репликах сразу.
+        Расчёт останавливается досрочно, когда соседние численности отделены от цели
+        интервалами Уилсона (decided), иначе - на max_replications (decided=False,
+        min_reps - по точечной оценке, reliable_reps - с запасом по интервалу)
+        """
+        completion_args, deadline = self._completion_args(city, specialization, transport_type, total_visits_needed,
+                                                          visits_per_day, project_calendar_days, work_days_per_week,
+                                                          model)
+        seed_seq = root_sequence(random_seed, rng)
+        cache_key = None
+        if random_seed is not None and rng is None:
+            cache_key = self._result_cache_key('min_reps_for_deadline', (
+                city, specialization, transport_type, total_visits_needed, visits_per_day, project_calendar_days,
+                target_probability, confidence, work_days_per_week, model, max_replications, random_seed,
+                chunk_size))
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        state = MCRunState(completion_chunk, completion_args, seed_seq, chunk_size, keep_raw=True)
+        search = None
+
+        def check_decided(current_state):
+            nonlocal search
+            search = deadline_reps_search(current_state.current().raw_results()['rep_days'], deadline,
+                                          target_probability / 100, confidence)
+            return search['decided']
+
+        # Правило остановки - после каждого чанка по порядку: ответ не зависит от числа workers
+        run_batches(state, completion_chunk, completion_args, max_replications, workers, on_chunk=check_decided)
+        if search is None:
+            check_decided(state)
+
+        candidates = {reps: {'on_time_probability': probability * 100, 'ci': (low * 100, high * 100)}
+                      for reps, (probability, low, high) in search['candidates'].items()}
+        min_reps = search['min_reps']
+        result = {
+            'min_reps': min_reps,
+            'decided': search['decided'],
+            'reliable_reps': search['reliable_reps'],
+            'on_time_probability': candidates[min_reps]['on_time_probability'] if min_reps is not None else None,
+            'ci': candidates[min_reps]['ci'] if min_reps is not None else None,
+            'candidates': candidates,
+            'replications': state.iterations,
+            'input_params': {
+                'city': city,
+                'specialization': specialization,
+                'transport_type': transport_type,
+                'total_visits_needed': total_visits_needed,
+                'visits_per_day': visits_per_day,
+                'project_calendar_days': project_calendar_days,
+                'target_probability': target_probability,
+                'confidence': confidence,
+                'work_days_per_week': work_days_per_week,
+                'deadline_work_days': deadline,
+                'model': model,
+                'max_replications': max_replications,
+                'random_seed': random_seed if random_seed is not None else seed_seq.entropy
             }
+        }
+        self.result_cache.put(cache_key, result)
+        return result
 
-        return stats
+    def _generate_project_scenarios(self, city, specialization, transport_type,
+                                    total_visits_needed, visits_per_doctor,
+                                    unique_doctors_needed, time_per_doctor_hours,
+                                    hours_per_rep_per_week, efficiency_factor,
+                                    min_reps_needed, min_reps_needed_int,
+                                    optimal_reps_needed_int, project_calendar_days, reps_range=None):
+        """Генерация сценариев для проекта"""
+        # Определяем диапазон для отображения
+        reps = scenario_range(min_reps_needed_int, optimal_reps_needed_int, above_min=6, above_optimal=4,
+                              reps_range=reps_range)
+        required_hours = unique_doctors_needed * time_per_doctor_hours
+
+        # 5 рабочих дней в неделю
+        return scenario_rows(scenario_table(
+            required_hours, hours_per_rep_per_week * efficiency_factor, project_calendar_days, reps,
+            min_reps_needed_int, optimal_reps_needed_int, rules=PROJECT_RULES))
+
+    def monte_carlo_with_density(self, city, specialization, num_visits, transport_type, iterations=1000,
+                                 random_seed=None, rng=None, workers=1, chunk_size=DEFAULT_CHUNK_SIZE,
+                                 keep_raw=False, adaptive=False, tolerances=None, confidence=0.95,
+                                 sampler='random', previous=None, checkpoint=None, time_budget=None):
+        """
+        Монте-Карло анализ с учётом плотности врачей
+        (previous, checkpoint, time_budget - см. monte_carlo_daily_simulation)
+        """
+        if not hasattr(self, 'density_calculator'):
+            return self.monte_carlo_daily_simulation(city, specialization, num_visits, transport_type, iterations,
+                                                     random_seed=random_seed, rng=rng, workers=workers, chunk_size=chunk_size,
+                                                     keep_raw=keep_raw, adaptive=adaptive,
+                                                     tolerances=tolerances, confidence=confidence,
+                                                     sampler=sampler, previous=previous, checkpoint=checkpoint,
+                                                     time_budget=time_budget)
+
+        seed_seq = root_sequence(random_seed, rng)
+        return self._run_mc(density_analysis_chunk, self._density_task_args(city, specialization, num_visits,
+                                                                            transport_type, sampler),
+                            iterations, seed_seq, {
+                                'city': city,
+                                'specialization': specialization,
+                                'num_visits': num_visits,
+                                'transport_type': transport_type,
+                                'sampler': sampler,
+                                'calculation_type': 'density_based',
+                                'random_seed': random_seed if random_seed is not None else seed_seq.entropy
+                            }, workers, chunk_size, keep_raw, adaptive, tolerances, confidence,
+                            cacheable=rng is None, previous=previous,
+                            checkpoint=self._mc_checkpoint(checkpoint, 'monte_carlo_with_density', {
+                                'city': city, 'specialization': specialization, 'num_visits': num_visits,
+                                'transport_type': transport_type, 'chunk_size': chunk_size, 'keep_raw': keep_raw,
+                                'adaptive': adaptive, 'tolerances': tolerances, 'confidence': confidence,
+                                'sampler': sampler, 'time_budget': time_budget}),
+                            time_budget=time_budget)
 
     def _legacy_calculate_day(self, city, specialization, num_visits, transport_type):
         """
@@ -2507,7 +2984,8 @@ class DensityBasedCalculator:
             'districts': city_data['districts']
         }
 
-    def simulate_day_with_density(self, city, specialization, target_visits, transport_type):
+    def simulate_day_with_density(self, city, specialization, target_visits, transport_type,
+                                  random_seed=None, rng=None):
         """
         Симуляция дня с учётом плотности врачей
         Возвращает реалистичное расписание с учетом:
@@ -2516,8 +2994,7 @@ class DensityBasedCalculator:
         - Вероятности отсутствия врача
         - Ожидания в очереди
         """
-        import random
-        import numpy as np
+        rng = make_rng(random_seed, rng)
 
         density_factors = self.calculate_density_factors(city, specialization)
         if not density_factors:
@@ -2526,14 +3003,14 @@ class DensityBasedCalculator:
         # 1. Распределяем визиты по поликлиникам с учётом плотности
         visits_schedule = []
         remaining_visits = target_visits
-        current_district = random.randint(1, density_factors['districts'])
+        current_district = int(rng.integers(1, density_factors['districts'] + 1))
 
         # Максимум врачей в одной поликлинике за один заход
         max_doctors_per_visit = min(3, density_factors['doctors_per_clinic'] * 0.7)
 
         while remaining_visits > 0:
             # Решаем, остаться в той же поликлинике или поехать в другую
-            if len(visits_schedule) > 0 and random.random() < density_factors['same_clinic_probability']:
+            if len(visits_schedule) > 0 and rng.random() < density_factors['same_clinic_probability']:
                 # Остаёмся в той же поликлинике (утренние/вечерние смены)
                 same_clinic_visits = min(remaining_visits, max_doctors_per_visit)
                 clinic_type = 'same_clinic'
@@ -2541,20 +3018,20 @@ class DensityBasedCalculator:
             else:
                 # Едем в другую поликлинику
                 same_clinic_visits = min(remaining_visits,
-                                         random.randint(1, int(max_doctors_per_visit)))
+                                         int(rng.integers(1, int(max_doctors_per_visit) + 1)))
                 clinic_type = 'different_clinic'
-                travel_distance_km = density_factors['avg_distance_between_clinics_km'] * random.uniform(0.8, 1.2)
+                travel_distance_km = density_factors['avg_distance_between_clinics_km'] * rng.uniform(0.8, 1.2)
                 # Меняем район с некоторой вероятностью
-                if random.random() < 0.3:
-                    current_district = random.randint(1, density_factors['districts'])
+                if rng.random() < 0.3:
+                    current_district = int(rng.integers(1, density_factors['districts'] + 1))
 
             # 2. Рассчитываем время для этой группы визитов
             for i in range(same_clinic_visits):
                 # Время ожидания врача
-                waiting_time = random.uniform(*density_factors['waiting_time_range'])
+                waiting_time = rng.uniform(*density_factors['waiting_time_range'])
 
                 # Вероятность, что врач отсутствует
-                if random.random() < density_factors['doctor_absence_probability']:
+                if rng.random() < density_factors['doctor_absence_probability']:
                     # Врач отсутствует - потраченное время
                     visit_result = {
                         'successful': False,
@@ -2567,9 +3044,9 @@ class DensityBasedCalculator:
                     # Успешный визит
                     # Время визита зависит от того, первый ли визит в поликлинике
                     if i == 0:
-                        visit_duration = random.uniform(20, 35)  # Первый визит дольше
+                        visit_duration = rng.uniform(20, 35)  # Первый визит дольше
                     else:
-                        visit_duration = random.uniform(15, 25)  # Последующие быстрее
+                        visit_duration = rng.uniform(15, 25)  # Последующие быстрее
 
                     visit_result = {
                         'successful': True,
@@ -2,15 +2,37 @@
 Логика расчета с учетом плотности врачей и территориального деления
 """
 
-import random
 import numpy as np
 import math
 from datetime import datetime, timedelta
 
+from rng_streams import make_rng, uniform_block
+from scenario_engine import DENSITY_RULES, scenario_range, scenario_rows, scenario_table
+
 
 class DensityCalculator:
     """Калькулятор, учитывающий плотность врачей и территориальное деление"""
 
+    # Числовые итоги дня, которые собираются в массивы при пакетной симуляции
+    DAY_FIELDS = (
+        'total_hours', 'successful_visits', 'success_rate',
+        'total_travel_distance_km', 'total_travel_time_min',
+        'total_visit_time_min', 'total_waiting_time_min',
+        'districts_visited', 'clinics_visited', 'visits_per_clinic', 'efficiency'
+    )
+
+    # Равномерные числа одного захода в поликлинику:
+    # 0 - возврат в посещённую, 1 - какая поликлиника, 2 - смена района,
+    # 3 - расстояние, 4 - новый район, 5 - доступные врачи, 6 - число визитов,
+    # далее по 3 на каждый из (максимум 3) визитов: ожидание, отсутствие врача, длительность
+    VISIT_GROUP_DRAWS = 7 + 3 * 3
+
+    # Параметры времени дня: утро / день / вечер
+    DOCTORS_SHARE_LOW = np.array([0.3, 0.4, 0.2])  # Доля доступных врачей: [low, low + 0.2)
+    WAITING_LOW = np.array([10.0, 5.0, 15.0])  # Утром больше очередь, днём меньше, вечером врачей мало
+    WAITING_HIGH = np.array([25.0, 15.0, 30.0])
+    TIME_OF_DAY = ('morning', 'afternoon', 'evening')
+
     def __init__(self, cities_data):
         self.cities_data = cities_data
 
@@ -49,210 +71,265 @@ class DensityCalculator:
             'spec_key': spec_key
         }
 
-    def simulate_density_day(self, city, specialization, target_visits, transport_type):
+    def simulate_density_day(self, city, specialization, target_visits, transport_type,
+                             random_seed=None, rng=None):
         """
         Симуляция дня с учётом плотности врачей и ТЕРРИТОРИАЛЬНОГО ДЕЛЕНИЯ
         В больших городах медпред работает только в 1-2 районах!
+        Случайные числа - только из собственного генератора rng (или random_seed).
+        Один день пакетного ядра simulate_density_batch с детальным расписанием.
         """
-        density_factors = self.calculate_density_factors(city, specialization)
-        if not density_factors:
+        batch = self.simulate_density_batch(city, specialization, target_visits, transport_type, 1,
+                                            random_seed, rng, detailed=True)
+        if batch.get('fallback'):
             return self._fallback_calculation(city, specialization, target_visits, transport_type)
 
+        day = {field: float(batch[field][0]) for field in self.DAY_FIELDS}
+        day['successful_visits'] = int(batch['successful_visits'][0])
+        day['districts_visited'] = int(batch['districts_visited'][0])
+        day['clinics_visited'] = int(batch['clinics_visited'][0])
+
+        return {
+            **day,
+            'attempted_visits': target_visits,
+            'is_big_city': batch['is_big_city'],
+            'available_districts_today': batch['available_districts_today'][0],
+            'detailed_schedule': batch['detailed_schedule'][0]
+        }
+
+    def simulate_density_days(self, city, specialization, target_visits, transport_type, days,
+                              random_seed=None, rng=None, sampler='random'):
+        """
+        Симуляция нескольких дней из одного потока случайных чисел.
+        Возвращает словарь массивов по DAY_FIELDS (без detailed_schedule).
+        """
+        batch = self.simulate_density_batch(city, specialization, target_visits, transport_type, days,
+                                            random_seed, rng, sampler=sampler)
+        return {field: batch[field] for field in self.DAY_FIELDS}
+
+    def _day_layout(self, city, density_factors):
+        """Территориальное деление дня: районы, расстояния, эффективность маршрутов"""
         # ★ КЛЮЧЕВОЙ ПРИНЦИП: в крупных городах ограничиваемся 1-2 районами ★
         is_big_city = city in ['Москва', 'Санкт-Петербург']
         if is_big_city:
             max_districts = 2  # В Москве/Питере максимум 2 района в день
-            clinics_per_district = density_factors['polyclinics'] // density_factors['districts']
             avg_distance_within_district = 1.5  # км внутри района
             avg_distance_between_districts = 8.0  # км между районами
+            travel_efficiency = 0.9  # В Москве/Питере лучше маршруты
         elif density_factors['districts'] >= 5:
             max_districts = 3  # В крупных городах 2-3 района
-            clinics_per_district = density_factors['polyclinics'] // density_factors['districts']
             avg_distance_within_district = 2.0
             avg_distance_between_districts = 5.0
+            travel_efficiency = 0.8
         else:
             max_districts = min(3, density_factors['districts'])  # В маленьких можно все
-            clinics_per_district = density_factors['polyclinics']
             avg_distance_within_district = 3.0
             avg_distance_between_districts = 4.0
+            travel_efficiency = 0.7
 
-        # ★ ВЫБИРАЕМ РАЙОНЫ ДЛЯ ЭТОГО ДНЯ ★
-        available_districts = random.sample(
-            range(1, density_factors['districts'] + 1),
-            min(max_districts, density_factors['districts'])
-        )
+        return {
+            'is_big_city': is_big_city,
+            'districts_per_day': min(max_districts, density_factors['districts']),
+            'within_km': avg_distance_within_district,
+            'between_km': avg_distance_between_districts,
+            'travel_efficiency': travel_efficiency
+        }
 
-        # ★ ВИЗИТЫ В ОДНОЙ ПОЛИКЛИНИКЕ ★
-        doctors_per_clinic = density_factors['doctors_per_clinic']
-        same_clinic_prob = density_factors['same_clinic_probability']
+    def simulate_density_batch(self, city, specialization, target_visits, transport_type, days,
+                               random_seed=None, rng=None, detailed=False, sampler='random'):
+        """
+        Пакетная симуляция days рабочих дней с учётом плотности.
+        Все случайные числа дня заранее берутся матрицами из rng, после чего
+        заходы в поликлиники обрабатываются векторно по всем дням сразу
+        (за один заход 1-3 визита, поэтому заходов не больше target_visits;
+        завершившиеся дни маскируются).
+        Возвращает массивы по DAY_FIELDS; detailed=True - ещё и detailed_schedule по дням.
+        sampler='sobol' / 'lhs' - все числа дня берутся из одной квазислучайной точки.
+        """
+        rng = make_rng(random_seed, rng)
+        n = max(0, int(days))
+        target_visits = int(target_visits)
+
+        density_factors = self.calculate_density_factors(city, specialization)
+        if not density_factors:
+            day = self._fallback_calculation(city, specialization, target_visits, transport_type)
+            batch = {field: np.full(n, float(day[field])) for field in self.DAY_FIELDS}
+            batch.update(fallback=True, is_big_city=False,
+                         available_districts_today=[[] for _ in range(n)],
+                         detailed_schedule=[[] for _ in range(n)])
+            return batch
+
+        # Выбор районов дня (без повторений) и стартового района,
+        # затем равномерные числа на каждый заход: (дни, заходы, VISIT_GROUP_DRAWS)
+        district_dims = density_factors['districts'] + 1
+        steps = max(target_visits, 0)
+        if sampler == 'random':
+            district_draws = rng.random((n, district_dims))
+            group_draws = rng.random((n, steps, self.VISIT_GROUP_DRAWS))
+        else:
+            draws = uniform_block(rng, n, district_dims + steps * self.VISIT_GROUP_DRAWS, sampler)
+            district_draws = draws[:, :district_dims]
+            group_draws = draws[:, district_dims:].reshape(n, steps, self.VISIT_GROUP_DRAWS)
 
-        schedule = []
-        remaining_visits = target_visits
-        current_district = random.choice(available_districts)
-        visited_clinics_by_district = {d: set() for d in available_districts}
-        total_travel_distance = 0
+        return self._density_batch_from_draws(city, density_factors, target_visits, transport_type,
+                                              district_draws, group_draws, detailed)
+
+    def _density_batch_from_draws(self, city, density_factors, target_visits, transport_type,
+                                  district_draws, group_draws, detailed=False):
+        n = group_draws.shape[0]
+        layout = self._day_layout(city, density_factors)
+        m = layout['districts_per_day']
+        rows = np.arange(n)
 
         transport_speed = {'Автомобиль': 40, 'Общественный транспорт': 25, 'Пешком': 5}.get(transport_type, 40)
         transport_waiting = {'Автомобиль': 5, 'Общественный транспорт': 10, 'Пешь': 0}.get(transport_type, 5)
 
-        while remaining_visits > 0:
-            # ★ РЕШАЕМ: остаться в той же поликлинике или поехать в другую? ★
-            current_clinics = visited_clinics_by_district[current_district]
-
-            if current_clinics and random.random() < same_clinic_prob * 0.7:
-                # Возвращаемся в уже посещенную поликлинику (другие врачи/смена)
-                clinic_id = random.choice(list(current_clinics))
-                travel_distance = 0  # Уже там
-                same_clinic_return = True
-            else:
-                # Идем в новую поликлинику
-                clinic_id = len(current_clinics) + 1
-                current_clinics.add(clinic_id)
-
-                # Расстояние зависит от того, меняем ли район
-                if not visited_clinics_by_district[current_district] or len(
-                        visited_clinics_by_district[current_district]) == 1:
-                    travel_distance = 0  # Первая поликлиника в районе
-                else:
-                    # Внутри района - близко, между районами - дальше
-                    if random.random() < 0.8 or len(available_districts) == 1:
-                        # Остаемся в том же районе (80% времени)
-                        travel_distance = avg_distance_within_district * random.uniform(0.5, 1.5)
-                    else:
-                        # Меняем район (20% времени, только если есть куда менять)
-                        old_district = current_district
-                        current_district = random.choice([d for d in available_districts if d != old_district])
-                        travel_distance = avg_distance_between_districts * random.uniform(0.8, 1.2)
+        # ★ ВЫБИРАЕМ РАЙОНЫ ДЛЯ ЭТОГО ДНЯ ★ (префикс случайной перестановки)
+        available_districts = np.argsort(district_draws[:, :-1], axis=1)[:, :m] + 1
+        current = np.minimum((district_draws[:, -1] * m).astype(int), m - 1)
+
+        # ★ ВИЗИТЫ В ОДНОЙ ПОЛИКЛИНИКЕ ★
+        doctors_per_clinic = density_factors['doctors_per_clinic']
+        same_clinic_prob = density_factors['same_clinic_probability']
+        absence_prob = density_factors['doctor_absence_probability']
+
+        clinics = np.zeros((n, m), dtype=int)  # Посещённые поликлиники по районам дня
+        remaining = np.full(n, target_visits)
+        total_travel_distance = np.zeros(n)
+        successful_visits = np.zeros(n, dtype=int)
+        total_visit_time = np.zeros(n)
+        total_waiting_time = np.zeros(n)
+        schedules = [[] for _ in range(n)] if detailed else None
+
+        for step in range(group_draws.shape[1]):
+            active = remaining > 0
+            if not active.any():
+                break
+            u = group_draws[:, step, :]
 
+            # ★ РЕШАЕМ: остаться в той же поликлинике или поехать в другую? ★
+            current_clinics = clinics[rows, current]
+            returning = active & (current_clinics > 0) & (u[:, 0] < same_clinic_prob * 0.7)
+            new_clinic = active & ~returning
+            clinic_id = np.where(returning, (u[:, 1] * current_clinics).astype(int) + 1, current_clinics + 1)
+            clinics[rows[new_clinic], current[new_clinic]] += 1
+
+            # Первая поликлиника в районе - без переезда; дальше 80% внутри района
+            moving = new_clinic & (current_clinics > 0)
+            switching = moving & (u[:, 2] >= 0.8) & (m > 1)
+            staying = moving & ~switching
+            travel_distance = np.where(staying, layout['within_km'] * (0.5 + u[:, 3]), 0.0) + \
+                np.where(switching, layout['between_km'] * (0.8 + 0.4 * u[:, 3]), 0.0)
+            if m > 1:
+                other = (current + 1 + np.minimum((u[:, 4] * (m - 1)).astype(int), m - 2)) % m
+                current = np.where(switching, other, current)
             total_travel_distance += travel_distance
 
             # ★ СКОЛЬКО ВРАЧЕЙ ДОСТУПНО В ЭТОЙ ПОЛИКЛИНИКЕ СЕЙЧАС? ★
-            # Учитываем смены: утро (3-5 врачей), день (4-6), вечер (2-4)
-            time_of_day = 'morning' if len(schedule) < target_visits * 0.4 else \
-                'afternoon' if len(schedule) < target_visits * 0.7 else 'evening'
-
-            if time_of_day == 'morning':
-                available_doctors_now = max(1, int(doctors_per_clinic * random.uniform(0.3, 0.5)))
-            elif time_of_day == 'afternoon':
-                available_doctors_now = max(1, int(doctors_per_clinic * random.uniform(0.4, 0.6)))
-            else:  # evening
-                available_doctors_now = max(1, int(doctors_per_clinic * random.uniform(0.2, 0.4)))
-
-            # ★ СКОЛЬКО ВИЗИТОВ СДЕЛАЕМ ЗА ЭТОТ ЗАХОД? ★
-            # За один заход можно посетить 1-3 врачей максимум
-            max_visits_per_visit = min(3, available_doctors_now)
-            visits_this_time = min(
-                remaining_visits,
-                random.randint(1, max_visits_per_visit)
-            )
-
-            for visit_num in range(visits_this_time):
-                # Время ожидания зависит от времени дня
-                if time_of_day == 'morning':
-                    waiting_time = random.uniform(10, 25)  # Утром больше очередь
-                elif time_of_day == 'afternoon':
-                    waiting_time = random.uniform(5, 15)  # Днем меньше
+            done = target_visits - remaining
+            time_of_day = np.where(done < target_visits * 0.4, 0, np.where(done < target_visits * 0.7, 1, 2))
+            available_doctors = np.maximum(
+                1, (doctors_per_clinic * (self.DOCTORS_SHARE_LOW[time_of_day] + 0.2 * u[:, 5])).astype(int))
+
+            # ★ СКОЛЬКО ВИЗИТОВ СДЕЛАЕМ ЗА ЭТОТ ЗАХОД? ★ (1-3 врача за заход)
+            max_visits = np.minimum(3, available_doctors)
+            visits_now = np.where(active, np.minimum(remaining, (u[:, 6] * max_visits).astype(int) + 1), 0)
+
+            waiting_low = self.WAITING_LOW[time_of_day]
+            waiting_span = self.WAITING_HIGH[time_of_day] - waiting_low
+            for visit_num in range(3):
+                made = visit_num < visits_now
+                waiting_time = waiting_low + waiting_span * u[:, 7 + 3 * visit_num]
+                absent = u[:, 8 + 3 * visit_num] < absence_prob
+                if visit_num == 0:
+                    duration = 20 + 15 * u[:, 9] + waiting_time  # Первый дольше
                 else:
-                    waiting_time = random.uniform(15, 30)  # Вечером врачей мало
-
-                # Вероятность отсутствия врача
-                if random.random() < density_factors['doctor_absence_probability']:
-                    # Неудачный визит - врач отсутствует
-                    visit_duration = waiting_time
-                    successful = False
-                else:
-                    # Успешный визит
-                    if visit_num == 0:
-                        visit_duration = random.uniform(20, 35) + waiting_time  # Первый дольше
-                    else:
-                        visit_duration = random.uniform(15, 25) + waiting_time * 0.5  # Последующие быстрее
-                    successful = True
-
-                schedule.append({
-                    'clinic_id': clinic_id,
-                    'district': current_district,
-                    'visit_num': len(schedule) + 1,
-                    'successful': successful,
-                    'duration': visit_duration,
-                    'waiting_time': waiting_time,
-                    'travel_distance': travel_distance if visit_num == 0 else 0,
-                    'time_of_day': time_of_day,
-                    'available_doctors': available_doctors_now,
-                    'same_clinic_return': same_clinic_return if 'same_clinic_return' in locals() else False
-                })
-
-                remaining_visits -= 1
-                if remaining_visits <= 0:
-                    break
+                    duration = 15 + 10 * u[:, 9 + 3 * visit_num] + waiting_time * 0.5  # Последующие быстрее
+                duration = np.where(absent, waiting_time, duration)
+                successful = made & ~absent
+
+                successful_visits += successful
+                total_visit_time += np.where(successful, duration, 0.0)
+                total_waiting_time += np.where(made, waiting_time, 0.0)
+
+                if detailed:
+                    for day in np.flatnonzero(made):
+                        schedules[day].append({
+                            'clinic_id': int(clinic_id[day]),
+                            'district': int(available_districts[day, current[day]]),
+                            'visit_num': len(schedules[day]) + 1,
+                            'successful': bool(successful[day]),
+                            'duration': float(duration[day]),
+                            'waiting_time': float(waiting_time[day]),
+                            'travel_distance': float(travel_distance[day]) if visit_num == 0 else 0,
+                            'time_of_day': self.TIME_OF_DAY[time_of_day[day]],
+                            'available_doctors': int(available_doctors[day]),
+                            'same_clinic_return': bool(returning[day])
+                        })
+
+            remaining -= visits_now
 
         # ★ РАСЧЁТ ИТОГОВ С УЧЁТОМ ЛОГИКИ ПЛОТНОСТИ ★
-        successful_visits = sum(1 for v in schedule if v['successful'])
-        total_visit_time = sum(v['duration'] for v in schedule if v['successful'])
-        total_waiting_time = sum(v['waiting_time'] for v in schedule)
-
         # Время на перемещение (меньше в больших городах из-за плотности!)
-        if is_big_city:
-            travel_efficiency = 0.9  # В Москве/Питере лучше маршруты
-        elif density_factors['districts'] >= 5:
-            travel_efficiency = 0.8
-        else:
-            travel_efficiency = 0.7
-
-        total_travel_time = (total_travel_distance / transport_speed * 60 * travel_efficiency) + \
-                            (len([d for d in visited_clinics_by_district.values() if d]) * transport_waiting)
+        total_travel_time = total_travel_distance / transport_speed * 60 * layout['travel_efficiency'] + \
+            (clinics > 0).sum(axis=1) * transport_waiting
 
         total_time_minutes = total_visit_time + total_waiting_time + total_travel_time
-        total_hours = total_time_minutes / 60
+        clinics_visited = clinics.sum(axis=1)
 
         # ★ ЭФФЕКТИВНОСТЬ: в больших городах выше из-за плотности ★
-        base_efficiency = (total_visit_time / total_time_minutes * 100) if total_time_minutes > 0 else 0
-        if is_big_city:
-            efficiency = min(95, base_efficiency * 1.15)  # +15% в Москве/Питере
+        base_efficiency = np.zeros(n)
+        np.divide(total_visit_time * 100, total_time_minutes, out=base_efficiency, where=total_time_minutes > 0)
+        if layout['is_big_city']:
+            efficiency = np.minimum(95, base_efficiency * 1.15)  # +15% в Москве/Питере
         elif density_factors['districts'] >= 5:
-            efficiency = min(90, base_efficiency * 1.05)  # +5% в крупных
+            efficiency = np.minimum(90, base_efficiency * 1.05)  # +5% в крупных
         else:
             efficiency = base_efficiency
 
-        return {
-            'total_hours': total_hours,
-            'successful_visits': successful_visits,
-            'attempted_visits': target_visits,
-            'success_rate': successful_visits / target_visits if target_visits > 0 else 0,
+        visits_per_clinic = np.zeros(n)
+        np.divide(successful_visits, clinics_visited, out=visits_per_clinic, where=clinics_visited > 0)
+
+        batch = {
+            'total_hours': total_time_minutes / 60,
+            'successful_visits': successful_visits.astype(float),
+            'success_rate': successful_visits / target_visits if target_visits > 0 else np.zeros(n),
             'total_travel_distance_km': total_travel_distance,
             'total_travel_time_min': total_travel_time,
             'total_visit_time_min': total_visit_time,
             'total_waiting_time_min': total_waiting_time,
-            'districts_visited': len(available_districts),
-            'clinics_visited': sum(len(clinics) for clinics in visited_clinics_by_district.values()),
-            'visits_per_clinic': successful_visits / sum(
-                len(clinics) for clinics in visited_clinics_by_district.values()) if any(
-                visited_clinics_by_district.values()) else 0,
+            'districts_visited': np.full(n, float(m)),
+            'clinics_visited': clinics_visited.astype(float),
+            'visits_per_clinic': visits_per_clinic,
             'efficiency': efficiency,
-            'is_big_city': is_big_city,
-            'available_districts_today': available_districts,
-            'detailed_schedule': schedule
+            'is_big_city': layout['is_big_city']
         }
+        if detailed:
+            batch['available_districts_today'] = available_districts.tolist()
+            batch['detailed_schedule'] = schedules
+        return batch
 
     def calculate_city_load_with_density(self, city, specialization, transport_type,
                                          total_visits_needed, visits_per_doctor,
                                          project_calendar_days,
-                                         work_days_per_week=5, max_work_hours_per_day=8):
+                                         work_days_per_week=5, max_work_hours_per_day=8,
+                                         random_seed=None, rng=None, reps_range=None):
         """
         Расчёт проекта с учётом плотности врачей
+        (reps_range=(first, last) - явный диапазон численности для сценариев)
         """
+        rng = make_rng(random_seed, rng)
+
         try:
-            # ★ МОДЕЛИРУЕМ 30 РАБОЧИХ ДНЕЙ для статистики ★
-            daily_results = []
-            for _ in range(30):
-                day_result = self.simulate_density_day(
-                    city, specialization, visits_per_doctor, transport_type
-                )
-                daily_results.append(day_result)
+            # ★ МОДЕЛИРУЕМ 30 РАБОЧИХ ДНЕЙ для статистики ★ (одним пакетом)
+            daily_results = self.simulate_density_days(
+                city, specialization, visits_per_doctor, transport_type, 30, rng=rng
+            )
 
             # Средние показатели
-            avg_hours_per_day = np.mean([r['total_hours'] for r in daily_results])
-            avg_success_rate = np.mean([r['success_rate'] for r in daily_results])
-            avg_successful_visits = np.mean([r['successful_visits'] for r in daily_results])
+            avg_hours_per_day = float(np.mean(daily_results['total_hours']))
+            avg_success_rate = float(np.mean(daily_results['success_rate']))
+            avg_successful_visits = float(np.mean(daily_results['successful_visits']))
 
             # ★ РАСЧЁТ ПРОЕКТА ★
             effective_visits_needed = total_visits_needed / avg_success_rate
@@ -284,7 +361,7 @@ class DensityCalculator:
             scenarios = self._generate_scenarios(
                 total_time_all_doctors_hours, available_hours_per_rep,
                 work_days_per_week, project_calendar_days,
-                min_reps_needed_int, optimal_reps_needed_int
+                min_reps_needed_int, optimal_reps_needed_int, reps_range
             )
 
             return {
@@ -311,16 +388,16 @@ class DensityCalculator:
                 },
                 'daily_statistics': {
                     'avg_successful_visits': round(avg_successful_visits, 1),
-                    'avg_travel_distance': round(np.mean([r['total_travel_distance_km'] for r in daily_results]), 1),
-                    'districts_per_day_avg': round(np.mean([r['districts_visited'] for r in daily_results]), 1),
-                    'clinics_per_day_avg': round(np.mean([r['clinics_visited'] for r in daily_results]), 1)
+                    'avg_travel_distance': round(float(np.mean(daily_results['total_travel_distance_km'])), 1),
+                    'districts_per_day_avg': round(float(np.mean(daily_results['districts_visited'])), 1),
+                    'clinics_per_day_avg': round(float(np.mean(daily_results['clinics_visited'])), 1)
                 },
                 'scenarios': scenarios,
                 'standard_day_example': {
                     'visits_per_day': visits_per_doctor,
                     'successful_visits': round(avg_successful_visits, 1),
                     'work_hours': round(avg_hours_per_day, 2),
-                    'distance_km': round(np.mean([r['total_travel_distance_km'] for r in daily_results]), 1),
+                    'distance_km': round(float(np.mean(daily_results['total_travel_distance_km'])), 1),
                     'success_rate': round(avg_success_rate * 100, 1)
                 }
             }
@@ -333,52 +410,12 @@ class DensityCalculator:
 
     def _generate_scenarios(self, total_hours_needed, available_hours_per_rep,
                             work_days_per_week, project_calendar_days,
-                            min_reps, optimal_reps):
-        """Генерация сценариев"""
-        scenarios = []
-
-        min_to_show = max(1, min_reps - 2)
-        max_to_show = max(min_reps + 5, optimal_reps + 3)
-
-        for reps in range(min_to_show, max_to_show + 1):
-            if reps < 1:
-                continue
-
-            # Время выполнения
-            weeks_needed = total_hours_needed / (reps * work_days_per_week * 8 * 0.85)
-            calendar_days_needed = weeks_needed * 7
-
-            # Процент использования сроков
-            time_util = (calendar_days_needed / project_calendar_days) * 100
-
-            # Загрузка персонала
-            rep_load = (total_hours_needed / (reps * available_hours_per_rep)) * 100
-
-            # Рекомендация
-            if reps == min_reps:
-                rec = "Минимальное (напряжённый режим)"
-            elif reps == optimal_reps:
-                rec = "Оптимальное (рекомендуется)"
-            elif rep_load > 90:
-                rec = "Перегрузка"
-            elif rep_load < 60:
-                rec = "Недогрузка"
-            else:
-                rec = "Хорошая загрузка"
-
-            scenarios.append({
-                'reps_count': reps,
-                'weeks': round(weeks_needed, 1),
-                'work_days': round(weeks_needed * work_days_per_week, 0),
-                'calendar_days': round(calendar_days_needed, 0),
-                'time_utilization': round(time_util, 1),
-                'rep_utilization': round(rep_load, 1),
-                'recommendation': rec,
-                'is_minimal': reps == min_reps,
-                'is_optimal': reps == optimal_reps
-            })
-
-        return scenarios
+                            min_reps, optimal_reps, reps_range=None):
+        """Генерация сценариев (неделя медпреда - work_days_per_week дней по 8 ч, 85%)"""
+        reps = scenario_range(min_reps, optimal_reps, reps_range=reps_range)
+        return scenario_rows(scenario_table(
+            total_hours_needed, work_days_per_week * 8 * 0.85, project_calendar_days, reps,
+            min_reps, optimal_reps, work_days_per_week, available_hours_per_rep, rules=DENSITY_RULES))
 
     def _fallback_calculation(self, city, specialization, target_visits, transport_type):
         """Запасной расчет"""
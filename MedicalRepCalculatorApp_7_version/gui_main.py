@@ -746,11 +746,46 @@ class ResultsPanel(QWidget):
         self.mc_iterations_spin.setFixedWidth(165)
         mc_ctrl_lay.addWidget(self.mc_iterations_spin)
 
+        # Итерации как верхняя граница: остановка при достижении точности
+        self.mc_adaptive_checkbox = AppCheckBox("До сходимости")
+        self.mc_adaptive_checkbox.setToolTip(
+            "Считать, пока доверительный интервал среднего времени и вероятности "
+            "переработки не станет достаточно узким (не больше заданного числа итераций)")
+        mc_ctrl_lay.addWidget(self.mc_adaptive_checkbox)
+
+        # Способ выборки: квазислучайные точки дают ту же точность за меньшее число итераций
+        self.mc_sampler_combo = AppComboBox()
+        for title, sampler in [("Случайная выборка", 'random'), ("Sobol", 'sobol'),
+                               ("Латинский гиперкуб", 'lhs')]:
+            self.mc_sampler_combo.addItem(title, sampler)
+        self.mc_sampler_combo.setFixedWidth(190)
+        mc_ctrl_lay.addWidget(self.mc_sampler_combo)
+
+        # Бюджет времени: столько итераций, сколько успеет посчитаться (предсказуемое ожидание)
+        self.mc_budget_combo = AppComboBox()
+        for title, budget in [("По числу итераций", 0.0), ("За 0,3 с", 0.3), ("За 3 с", 3.0),
+                              ("За 30 с", 30.0)]:
+            self.mc_budget_combo.addItem(title, budget)
+        self.mc_budget_combo.setFixedWidth(170)
+        mc_ctrl_lay.addWidget(self.mc_budget_combo)
+
         self.mc_run_btn = AppButton("▶   Запустить симуляцию", variant='primary')
         self.mc_run_btn.setEnabled(False)
         self.mc_run_btn.setFixedWidth(200)
         mc_ctrl_lay.addWidget(self.mc_run_btn)
 
+        # Продолжение последней симуляции: новые итерации добавляются к уже посчитанным
+        self.mc_refine_btn = AppButton("Уточнить", variant='ghost')
+        self.mc_refine_btn.setEnabled(False)
+        self.mc_refine_btn.setToolTip("Добавить итерации к последней симуляции")
+        mc_ctrl_lay.addWidget(self.mc_refine_btn)
+
+        # Повторный запуск с теми же входными данными берёт прошлую выборку из кэша
+        self.mc_resample_btn = AppButton("Новая выборка", variant='ghost')
+        self.mc_resample_btn.setEnabled(False)
+        self.mc_resample_btn.setToolTip("Пересчитать симуляцию с новыми случайными числами")
+        mc_ctrl_lay.addWidget(self.mc_resample_btn)
+
         mc_hint = QLabel("Сначала выполните расчёт рабочего дня")
         mc_hint.setStyleSheet(f"color: {C['text3']}; font-size: 11px;")
         mc_ctrl_lay.addWidget(mc_hint)
@@ -887,6 +922,11 @@ class MainWindow(QMainWindow):
         super().__init__()
         self.calculator = MedicalRepCalculatorGUI()
         self.last_calculation_params = None
+        # Seed последней симуляции и входные данные, для которых он взят: повтор с теми же
+        # данными берётся из кэша, уточнение продолжает тот же поток
+        # (None - результат из сетки или первый запуск)
+        self.mc_seed = None
+        self.mc_seed_params = None
         self._build_ui()
         self._connect_signals()
         self._center()
@@ -1059,6 +1099,9 @@ class MainWindow(QMainWindow):
 
         self._build_menu()
         self.results_panel.mc_run_btn.setEnabled(False)
+        self.results_panel.mc_budget_combo.currentIndexChanged.connect(
+            lambda _: self.results_panel.mc_iterations_spin.setEnabled(
+                not self.results_panel.mc_budget_combo.currentData()))
 
     def _switch_mode(self, idx):
         self.input_stack.setCurrentIndex(idx)
@@ -1110,6 +1153,8 @@ class MainWindow(QMainWindow):
         self.daily_calc_panel.export_btn.clicked.connect(self.export_results)
         self.project_calc_panel.calculate_btn.clicked.connect(self.calculate_project)
         self.results_panel.mc_run_btn.clicked.connect(self.run_monte_carlo_simulation)
+        self.results_panel.mc_refine_btn.clicked.connect(self.refine_monte_carlo_simulation)
+        self.results_panel.mc_resample_btn.clicked.connect(self.resample_monte_carlo_simulation)
         self.results_panel.project_export_btn.clicked.connect(self.export_project_results)
         self.train_btn.clicked.connect(self.train_model)
 
@@ -1207,6 +1252,8 @@ class MainWindow(QMainWindow):
                 'transport': transport, 'num_visits': num_visits
             }
             self.results_panel.mc_run_btn.setEnabled(True)
+            self.results_panel.mc_refine_btn.setEnabled(False)
+            self.results_panel.mc_resample_btn.setEnabled(False)
             self.results_title.setText(f"{city}  ·  {spec}  ·  {num_visits} визитов")
             self.status_dot.setText("✓  Готов")
             self.status_dot.setStyleSheet(f"color: {C['success']}; font-size: 12px; font-weight: 600;")
@@ -1763,20 +1810,63 @@ class MainWindow(QMainWindow):
     # ── Монте-Карло ──────────────────────────────────────────────────────────
 
     def run_monte_carlo_simulation(self):
+        """
+        Запуск: для тех же входных данных - с прошлым seed (результат из кэша),
+        для новых - без seed (ячейка предрассчитанной сетки или новая выборка)
+        """
+        if self.mc_seed_params != self.last_calculation_params:
+            self.mc_seed = None
+        self._monte_carlo()
+
+    def resample_monte_carlo_simulation(self):
+        """Новая выборка по явному запросу: прошлый результат из кэша не берётся"""
+        self.mc_seed = int(np.random.SeedSequence().entropy % 2 ** 32)
+        self._monte_carlo()
+
+    def refine_monte_carlo_simulation(self):
+        """Продолжение последней симуляции с тем же потоком случайных чисел"""
+        self._monte_carlo(previous=self.calculator.current_mc_results)
+
+    def _monte_carlo(self, previous=None):
         try:
             if not self.last_calculation_params:
                 QMessageBox.information(self, "Сначала выполните расчёт",
                     "Выполните расчёт рабочего дня, затем запустите симуляцию.")
                 return
-            p     = self.last_calculation_params
-            iters = self.results_panel.mc_iterations_spin.value()
-            mc    = self.calculator.monte_carlo_daily_simulation(
-                p['city'], p['specialization'], p['num_visits'], p['transport'], iters)
-            self.calculator.current_mc_results = mc
+            p      = self.last_calculation_params
+            budget = self.results_panel.mc_budget_combo.currentData() or None
+            iters  = None if budget else self.results_panel.mc_iterations_spin.value()
+            hits   = self.calculator.result_cache.hits
+            mc     = self.calculator.monte_carlo_daily_simulation(
+                p['city'], p['specialization'], p['num_visits'], p['transport'], iters,
+                random_seed=self.mc_seed, keep_raw=True,
+                adaptive=self.results_panel.mc_adaptive_checkbox.isChecked(),
+                sampler=self.results_panel.mc_sampler_combo.currentData(),
+                previous=previous, time_budget=budget)
+            iters = mc['input_params']['iterations']
+            from_cache = self.calculator.result_cache.hits > hits or mc['input_params'].get('cached', False)
+            seed = mc['input_params']['random_seed']
+            # Результат из сетки повторяется запуском без seed, остальные - с тем же seed
+            # (уточнение продолжает тот же поток и seed не меняет)
+            if previous is None:
+                self.mc_seed = None if mc['input_params'].get('cached') else seed
+                self.mc_seed_params = dict(p)
+            # Редкая переработка: частота ненадёжна, уточняем выборкой по значимости
+            if mc['statistics'].get('overload_probability', {}).get('value', 0) < 1:
+                mc['overload_is'] = self.calculator.overload_probability_is(
+                    p['city'], p['specialization'], p['num_visits'], p['transport'], 20000,
+                    random_seed=seed)
+            # Прошлый результат заменён: его общая память (если была) больше не нужна
+            replaced, self.calculator.current_mc_results = self.calculator.current_mc_results, mc
+            self.calculator.release_mc_result(replaced)
             self.update_monte_carlo_graphs(mc)
             self.update_mc_statistics(mc)
             self.results_panel.set_current_tab(5)
-            self.status_bar.showMessage(f"Монте-Карло завершено ({iters} итераций)")
+            self.results_panel.mc_refine_btn.setEnabled(True)
+            self.results_panel.mc_resample_btn.setEnabled(True)
+            elapsed = f", {mc['time_budget']['elapsed']:.2f} с" if 'time_budget' in mc else ""
+            self.status_bar.showMessage(
+                f"Монте-Карло завершено ({iters} итераций{elapsed}{', из кэша' if from_cache else ''})")
         except Exception as e:
             QMessageBox.critical(self, "Ошибка симуляции", str(e))
 
@@ -1817,7 +1907,8 @@ class MainWindow(QMainWindow):
                 self.results_panel.mc_graph_layout.addWidget(err)
                 return
 
-            raw = mc_results['raw_results']
+            # Сырые итерации - типизированные массивы; NaN отбрасываются маской
+            raw = {key: np.asarray(values) for key, values in mc_results['raw_results'].items()}
             fig = Figure(figsize=(10, 16), dpi=100, facecolor=BG)
             fig.subplots_adjust(left=0.12, right=0.95, bottom=0.07, top=0.94,
                                 hspace=0.4, wspace=0.3)
@@ -1826,9 +1917,8 @@ class MainWindow(QMainWindow):
             ax1 = fig.add_subplot(311)
             ax1.set_facecolor(SURF)
             if 'total_hours' in raw and len(raw['total_hours']) > 0:
-                total_hours_filtered = [x for x in raw['total_hours']
-                                        if x is not None and not np.isnan(x)]
-                if total_hours_filtered:
+                total_hours_filtered = raw['total_hours'][~np.isnan(raw['total_hours'])]
+                if total_hours_filtered.size:
                     n, bins, patches = ax1.hist(total_hours_filtered, bins=30,
                                                 alpha=0.7, color=BLUE,
                                                 edgecolor=BG, linewidth=1)
@@ -1836,8 +1926,8 @@ class MainWindow(QMainWindow):
                     try:
                         from scipy.stats import gaussian_kde
                         kde = gaussian_kde(total_hours_filtered)
-                        x_range = np.linspace(min(total_hours_filtered),
-                                               max(total_hours_filtered), 150)
+                        x_range = np.linspace(total_hours_filtered.min(),
+                                               total_hours_filtered.max(), 150)
                         density = kde(x_range)
                         ax1_twin = ax1.twinx()
                         ax1_twin.plot(
@@ -1897,9 +1987,8 @@ class MainWindow(QMainWindow):
             ax2 = fig.add_subplot(312)
             ax2.set_facecolor(SURF)
             if 'efficiency' in raw and len(raw['efficiency']) > 0:
-                eff_filtered = [x for x in raw['efficiency']
-                                if x is not None and not np.isnan(x)]
-                if eff_filtered:
+                eff_filtered = raw['efficiency'][~np.isnan(raw['efficiency'])]
+                if eff_filtered.size:
                     n_bins = min(20, len(eff_filtered) // 10)
                     ax2.hist(eff_filtered, bins=n_bins, alpha=0.7,
                              color=GREEN, edgecolor=BG, linewidth=1)
@@ -1929,18 +2018,16 @@ class MainWindow(QMainWindow):
             has_hours  = 'total_hours'       in raw and len(raw['total_hours']) > 0
             has_visits = 'successful_visits' in raw and len(raw['successful_visits']) > 0
             if has_hours and has_visits:
-                hours  = raw['total_hours']
-                visits = raw['successful_visits']
-                valid  = [(h, v) for h, v in zip(hours, visits)
-                          if h is not None and v is not None
-                          and not np.isnan(h) and not np.isnan(v)]
-                if valid and len(valid) >= 10:
-                    hours_v, visits_v = zip(*valid)
+                hours  = raw['total_hours'].astype(float)
+                visits = raw['successful_visits'].astype(float)
+                valid  = ~np.isnan(hours) & ~np.isnan(visits)
+                if valid.sum() >= 10:
+                    hours_v, visits_v = hours[valid], visits[valid]
                     ax3.scatter(hours_v, visits_v, alpha=0.6, s=40,
                                 color=PURPLE, edgecolors='white', linewidth=0.5)
                     if len(hours_v) > 1:
                         z = np.polyfit(hours_v, visits_v, 1)
-                        x_trend = np.linspace(min(hours_v), max(hours_v), 100)
+                        x_trend = np.linspace(hours_v.min(), hours_v.max(), 100)
                         ax3.plot(x_trend, np.poly1d(z)(x_trend),
                                  color=RED, linewidth=2, linestyle='--',
                                  alpha=0.9, label='Линия тренда')
@@ -2014,6 +2101,39 @@ class MainWindow(QMainWindow):
             html += (f"<h3>Анализ рисков</h3>"
                      f"<p style='color:{color};font-weight:600;'>"
                      f"{op.get('description','')}</p>")
+            if 'overload_is' in mc_results:
+                ois = mc_results['overload_is']
+                html += "<table>"
+                html += sr("Переработка (выборка по значимости)",
+                           "невозможна" if ois['impossible'] else
+                           f"{ois['overload_probability']:.4f} ± {ois['std_error']:.4f}%")
+                html += sr("Эффективный размер выборки", f"{ois['effective_sample_size']:,.0f}")
+                html += "</table>"
+        if 'convergence' in mc_results:
+            conv  = mc_results['convergence']
+            names = {'total_hours': ("Среднее время", "ч"),
+                     'overload_probability': ("Вероятность переработки", "п.п.")}
+            html += f"<h3>Точность (±, {conv['confidence']:.0%})</h3><table>"
+            for key, target in conv['targets'].items():
+                name, unit = names.get(key, (key, ""))
+                mark = "✓" if target['converged'] else "✗"
+                html += sr(name, f"±{target['half_width']:.2f} {unit} "
+                                 f"(допуск {target['tolerance']:.2f}) {mark}")
+            html += sr("Сходимость", "достигнута" if conv['converged']
+                       else f"нет, лимит {conv['max_iterations']:,} итераций")
+            html += "</table>"
+        if 'time_budget' in mc_results:
+            tb  = mc_results['time_budget']
+            est = tb['estimates']
+            html += f"<h3>Оценка за {tb['time_budget']:g} с (± стд. ошибка)</h3><table>"
+            html += sr("Затрачено", f"{tb['elapsed']:.2f} с, {tb['batches']} порций")
+            if 'total_hours' in est:
+                html += sr("Среднее время", f"{est['total_hours']['mean']:.2f} "
+                                            f"± {est['total_hours']['std_error']:.3f} ч")
+            if 'overload_probability' in est:
+                html += sr("Вероятность переработки", f"{est['overload_probability']['mean']:.1f} "
+                                                      f"± {est['overload_probability']['std_error']:.2f} п.п.")
+            html += "</table>"
         html += "</body></html>"
         self.results_panel.mc_stats_text.setHtml(html)
 
@@ -0,0 +1,121 @@
+"""
+Ограниченный кэш результатов расчётов (LRU) со статистикой попаданий
+"""
+
+import copy
+import sys
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Предел памяти кэша по умолчанию: результаты с сырыми итерациями весят десятки МБ
+DEFAULT_MAX_BYTES = 128 * 2 ** 20
+
+
+def freeze(value):
+    """Хешируемое представление аргумента для ключа кэша"""
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, np.random.SeedSequence):
+        return ('SeedSequence', freeze(value.entropy), tuple(value.spawn_key))
+    if isinstance(value, np.ndarray):
+        return tuple(value.tolist())
+    return value
+
+
+def value_nbytes(value, _seen=None):
+    """
+    Оценка памяти значения: массивы NumPy и таблицы pandas - по их данным,
+    контейнеры и объекты (накопители, состояние прогона) - рекурсивно
+    """
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        return size + sum(value_nbytes(key, seen) + value_nbytes(item, seen) for key, item in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(value_nbytes(item, seen) for item in value)
+    if hasattr(value, '__dict__'):
+        return size + value_nbytes(vars(value), seen)
+    return size
+
+
+class LRUCache:
+    """
+    Кэш на OrderedDict: при переполнении (по числу элементов или по памяти max_bytes)
+    вытесняются давно не использованные элементы; значение больше max_bytes не кэшируется.
+    Значения копируются при записи и чтении, поэтому изменение результата
+    вызывающим кодом не портит кэш.
+    """
+
+    def __init__(self, maxsize=64, max_bytes=DEFAULT_MAX_BYTES):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._sizes = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Значение по ключу или None (key=None - кэширование отключено)"""
+        if key is None:
+            return None
+        if key not in self._data:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._data.move_to_end(key)
+        return copy.deepcopy(self._data[key])
+
+    def put(self, key, value):
+        if key is None or self.maxsize <= 0:
+            return
+        self._discard(key)
+        value = copy.deepcopy(value)
+        size = value_nbytes(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        self._data[key] = value
+        self._sizes[key] = size
+        self.bytes += size
+        while len(self._data) > self.maxsize or (self.max_bytes is not None and self.bytes > self.max_bytes):
+            self._discard(next(iter(self._data)))
+            self.evictions += 1
+
+    def _discard(self, key):
+        if key in self._data:
+            del self._data[key]
+            self.bytes -= self._sizes.pop(key)
+
+    def clear(self):
+        self._data.clear()
+        self._sizes.clear()
+        self.bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Статистика попаданий"""
+        requests = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hit_rate': self.hits / requests * 100 if requests else 0.0
+        }
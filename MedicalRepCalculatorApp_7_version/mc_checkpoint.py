@@ -0,0 +1,68 @@
+"""
+Контрольные точки длинных расчётов Монте-Карло: состояние прогона (накопители
+и номер следующего чанка, по которому восстанавливается поток случайных чисел)
+периодически сохраняется в локальный файл, расчёт можно продолжить после сбоя.
+"""
+
+import os
+import pickle
+import time
+
+# Как часто сохранять состояние, секунд
+CHECKPOINT_INTERVAL = 30.0
+
+CHECKPOINT_VERSION = 1
+
+
+class MCCheckpoint:
+    """
+    Сохранение состояния между порциями чанков.
+    job - описание расчёта для возобновления: method, kwargs, target
+    (итоговое число итераций), fingerprint параметров модели
+    """
+
+    def __init__(self, path, job, interval=CHECKPOINT_INTERVAL):
+        self.path = path
+        self.job = job
+        self.interval = interval
+        self._last_save = time.monotonic()
+
+    def __call__(self, state):
+        """Обработчик порции: сохраняет состояние не чаще раза в interval секунд"""
+        if time.monotonic() - self._last_save >= self.interval:
+            self.save(state)
+        return False
+
+    def save(self, state):
+        """Запись через временный файл - прерывание не оставит битую точку"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'version': CHECKPOINT_VERSION, 'job': self.job, 'state': state}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        self._last_save = time.monotonic()
+
+    def remove(self):
+        """Расчёт завершён - контрольная точка больше не нужна"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    @staticmethod
+    def load(path):
+        """
+        (job, state) из файла или None - файла нет или он повреждён.
+        Файл - pickle, загружать только собственные контрольные точки
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+            print(f"Контрольная точка не прочитана: {e}")
+            return None
+
+        if data.get('version') != CHECKPOINT_VERSION:
+            print(f"Контрольная точка другой версии: {data.get('version')}")
+            return None
+        return data['job'], data['state']
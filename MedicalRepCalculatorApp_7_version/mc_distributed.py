@@ -0,0 +1,253 @@
+"""
+Распределённый Монте-Карло: координатор раздаёт задачи чанков исполнителям
+на других машинах по TCP и собирает их накопители. Транспорт -
+multiprocessing.connection (сообщения с префиксом длины, подключение
+подтверждается общим ключом), без внешних сервисов.
+
+Координатор передаётся вместо числа процессов (workers=coordinator) в методы
+Монте-Карло, перебор числа визитов, сетку и анализ чувствительности: задача -
+(функция чанка, параметры, номер потока seed, размер чанка), ответ -
+накопитель MCAccumulator. Накопители сливаются в порядке номеров чанков,
+поэтому результат совпадает с расчётом на одной машине.
+
+Исполнитель: python mc_distributed.py worker HOST:PORT [--processes N] [--key KEY]
+(ключ также берётся из переменной окружения MC_DISTRIBUTED_KEY).
+"""
+
+import argparse
+import os
+import pickle
+import queue
+import threading
+import time
+from multiprocessing import Process
+from multiprocessing.connection import Client, Listener
+
+DEFAULT_PORT = 47100
+
+AUTHKEY_ENV = 'MC_DISTRIBUTED_KEY'
+
+# Сколько секунд вызов map ждёт, пока нет ни одного исполнителя, прежде чем сдаться
+WORKER_TIMEOUT = 30.0
+
+# Период проверки исполнителей и предела времени во время ожидания map
+WAIT_POLL_INTERVAL = 0.2
+
+
+def resolve_authkey(authkey=None):
+    """
+    Ключ подключения (str / bytes или из MC_DISTRIBUTED_KEY). Задачи и накопители
+    передаются через pickle, поэтому без ключа координатор и исполнители не запускаются
+    """
+    authkey = authkey or os.environ.get(AUTHKEY_ENV)
+    if not authkey:
+        raise ValueError(f"Не задан ключ подключения (authkey или переменная {AUTHKEY_ENV})")
+    return authkey.encode('utf-8') if isinstance(authkey, str) else bytes(authkey)
+
+
+class _Batch:
+    """Результаты одного вызова map в порядке аргументов"""
+
+    def __init__(self, size):
+        self.results = [None] * size
+        self.pending = size
+        self.error = None
+        self.cancelled = False  # Вызов прерван: оставшиеся задачи не выполняются
+        self._done = threading.Condition()
+
+    def finish(self, index, ok, value):
+        with self._done:
+            if ok:
+                self.results[index] = value
+            elif self.error is None:
+                self.error = value
+            self.pending -= 1
+            self._done.notify_all()
+
+    def wait(self, timeout=None):
+        """True - все задачи завершены (ожидание не дольше timeout секунд)"""
+        with self._done:
+            return self._done.wait_for(lambda: self.pending == 0, timeout)
+
+    def result(self):
+        if self.error is not None:
+            raise self.error
+        return self.results
+
+
+class MCCoordinator:
+    """
+    Очередь задач для подключённых исполнителей (по задаче на подключение).
+    map(fn, *iterables) - как у ProcessPoolExecutor; если исполнитель отключился,
+    его задача возвращается в очередь и достаётся другому.
+    Пока нет ни одного исполнителя, задачи ждут в очереди, но не дольше
+    worker_timeout секунд - затем map завершается с RuntimeError
+    """
+
+    def __init__(self, address=('0.0.0.0', DEFAULT_PORT), authkey=None, worker_timeout=WORKER_TIMEOUT):
+        self._listener = Listener(address, authkey=resolve_authkey(authkey))
+        self.address = self._listener.address
+        self.worker_timeout = worker_timeout
+        self._jobs = queue.Queue()
+        self._connections = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                connection = self._listener.accept()
+            except OSError as e:
+                if self._closed:
+                    return
+                print(f"Исполнитель не подключён: {e}")
+                continue
+            with self._lock:
+                self._connections.add(connection)
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection):
+        """Цикл подключения: задача -> ответ; разрыв - задача возвращается в очередь"""
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    connection.send(None)
+                    return
+                batch, index, fn, args = job
+                if batch.cancelled:
+                    continue
+                try:
+                    connection.send((fn, args))
+                    ok, value = connection.recv()
+                except (OSError, EOFError):
+                    self._jobs.put(job)
+                    return
+                batch.finish(index, ok, value)
+        except (OSError, EOFError):
+            pass
+        finally:
+            with self._lock:
+                self._connections.discard(connection)
+            connection.close()
+
+    def worker_count(self):
+        """Число подключённых исполнителей"""
+        with self._lock:
+            return len(self._connections)
+
+    def wait_for_workers(self, count=1, timeout=None):
+        """Ожидание count исполнителей; False - не дождались за timeout секунд"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.worker_count() < count:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def map(self, fn, *iterables, timeout=None):
+        """
+        Раздача задач fn(*args); список результатов в порядке аргументов.
+        timeout - предел ожидания всего вызова в секундах (TimeoutError);
+        исполнителей нет дольше worker_timeout (не подключились или все
+        отключились) - RuntimeError. Задачи прерванного вызова не выполняются
+        """
+        calls = list(zip(*iterables))
+        batch = _Batch(len(calls))
+        for index, args in enumerate(calls):
+            self._jobs.put((batch, index, fn, args))
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        idle_since = None
+        try:
+            while not batch.wait(WAIT_POLL_INTERVAL):
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    raise TimeoutError(f"Задачи не выполнены за {timeout} с")
+                if self.worker_count():
+                    idle_since = None
+                elif idle_since is None:
+                    idle_since = now
+                elif now - idle_since >= self.worker_timeout:
+                    raise RuntimeError("Нет подключённых исполнителей: задачи некому выполнить")
+        except BaseException:
+            batch.cancelled = True
+            raise
+        return batch.result()
+
+    def close(self):
+        """Остановка: исполнители получают сигнал завершения, порт освобождается"""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in range(self.worker_count()):
+            self._jobs.put(None)
+        self._listener.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def run_worker(address, authkey=None, retry_interval=2.0):
+    """
+    Исполнитель: подключается к координатору и выполняет задачи до сигнала
+    завершения. Пока координатор недоступен, подключение повторяется
+    """
+    authkey = resolve_authkey(authkey)
+    while True:
+        try:
+            connection = Client(address, authkey=authkey)
+            break
+        except ConnectionRefusedError:
+            time.sleep(retry_interval)
+
+    with connection:
+        while True:
+            try:
+                job = connection.recv()
+            except (OSError, EOFError):
+                return
+            if job is None:
+                return
+            fn, args = job
+            try:
+                result = (True, fn(*args))
+            except Exception as e:
+                result = (False, e)
+            try:
+                connection.send(result)
+            except (TypeError, AttributeError, pickle.PicklingError) as e:
+                connection.send((False, RuntimeError(f"Результат задачи не передан: {e}")))
+
+
+def parse_address(text):
+    """'host:port' или 'host' (порт по умолчанию)"""
+    host, _, port = text.rpartition(':')
+    if not host:
+        return text, DEFAULT_PORT
+    return host, int(port)
+
+
+def start_workers(address, processes=1, authkey=None):
+    """Запуск processes исполнителей в отдельных процессах (по подключению на процесс)"""
+    authkey = resolve_authkey(authkey)
+    workers = [Process(target=run_worker, args=(address, authkey), daemon=True) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Исполнитель распределённого Монте-Карло")
+    parser.add_argument('mode', choices=['worker'])
+    parser.add_argument('address', help="адрес координатора host:port")
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--key', default=None, help=f"ключ подключения (по умолчанию {AUTHKEY_ENV})")
+    cli = parser.parse_args()
+
+    for process in start_workers(parse_address(cli.address), cli.processes, cli.key):
+        process.join()
@@ -0,0 +1,994 @@
+"""
+Векторизованные ядра Монте-Карло для симуляции рабочего дня
+и параллельный запуск итераций по чанкам
+"""
+
+import copy
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import repeat
+from statistics import NormalDist
+
+import numpy as np
+
+from density_logic import DensityCalculator
+from mc_cache import freeze
+from mc_shared import SharedRawBuffers, raw_schema
+from mc_stats import MCAccumulator, wilson_interval
+from rng_streams import make_rng, normal_ppf, seed_sequence, stream_seed, uniform_block
+
+# Размер чанка фиксирован и не зависит от числа процессов:
+# чанк i всегда получает поток stream_seed(seed, i), поэтому результат
+# одинаков при любом количестве workers
+DEFAULT_CHUNK_SIZE = 1000
+
+# Целевая точность адаптивного режима (полуширина доверительного интервала):
+# среднее время дня - 0.05 ч (3 минуты), вероятность переработки - 1 п.п.
+DEFAULT_TOLERANCES = {
+    'total_hours': 0.05,
+    'overload_probability': 1.0
+}
+
+# Верхняя граница итераций в режиме "по времени", если не задана явно
+TIME_BUDGET_MAX_ITERATIONS = 1_000_000
+
+# Дневные ядра для симуляции завершения проекта
+COMPLETION_MODELS = ('daily', 'density')
+
+# Случайных чисел на один вызов дневного ядра (ограничение памяти): дней
+# медпредов в вызове тем меньше, чем больше визитов в дне и чисел на визит
+COMPLETION_DRAW_VALUES = 4_000_000
+
+# Реплика проекта, не набравшая визиты за столько дней-медпредов
+# (в разах от числа дней при успехе всех визитов), считается незавершённой
+COMPLETION_MAX_DAYS_FACTOR = 20
+
+# Процентили срока завершения проекта и целевые вероятности успеть, %
+COMPLETION_PERCENTILES = (50, 80, 90, 95)
+
+# Подбор численности под срок: реплик в чанке (порция проверки досрочной остановки)
+DEADLINE_CHUNK_SIZE = 200
+
+# Показатели дневного Монте-Карло, которые попадают в статистику
+DAILY_MC_FIELDS = (
+    'total_hours',
+    'productive_hours',
+    'travel_hours',
+    'efficiency',
+    'successful_visits',  # Успешные визиты (врач доступен)
+    'is_overloaded',  # Перегрузка (>8 часов)
+    'is_optimal'  # Оптимальный день (6-8 часов, 6-8 визитов)
+)
+
+
+def daily_kernel_params(unified_params, cities_data, city, spec_key, num_visits, transport_type):
+    """Параметры случайного дня для векторизованного ядра из UNIFIED_PARAMS и cities_data"""
+    visit_prefix = 'pharmacy' if spec_key == 'pharmacy' else 'doctor'
+
+    avg_distance_km = cities_data.get(city, {}).get('avg_distance_km', unified_params['avg_distance_per_visit_km'])
+    detour_factor = unified_params['city_detour_factors'].get(city, 1.2)
+
+    return {
+        'num_visits': num_visits,
+        'min_visit': unified_params[f'{visit_prefix}_visit_min'],
+        'max_visit': unified_params[f'{visit_prefix}_visit_max'],
+        'avg_visit': unified_params[f'{visit_prefix}_visit_avg'],
+        'base_distance_km': avg_distance_km * detour_factor,
+        'transport_speed': unified_params['transport_speed_kmh'].get(transport_type, 40),
+        'transport_waiting': unified_params['transport_waiting_min'].get(transport_type, 5),
+        'max_work_hours': unified_params['max_work_hours_per_day']
+    }
+
+
+def daily_draws(num_visits, iterations, rng, sampler='random', antithetic=False):
+    """
+    Случайные величины дня: нормальный шум времени визитов (iterations, num_visits),
+    равномерные числа расстояний и вариации пути (iterations, num_visits - 1)
+    и доли успешных визитов (iterations,).
+    Для 'sobol' / 'lhs' все величины - одна квазислучайная точка на итерацию,
+    нормальный шум получается обратной функцией распределения.
+    antithetic=True - вторая половина итераций зеркальна первой (z -> -z, u -> 1 - u):
+    строки i и ceil(n/2) + i образуют антитетическую пару.
+    """
+    num_legs = max(0, num_visits - 1)
+    if antithetic:
+        base = daily_draws(num_visits, iterations - iterations // 2, rng, sampler)
+        pairs = iterations // 2
+        return {
+            key: np.concatenate([values, (-values if key == 'visit_noise' else 1 - values)[:pairs]])
+            for key, values in base.items()
+        }
+
+    if sampler == 'random':
+        return {
+            'visit_noise': rng.standard_normal((iterations, num_visits)),
+            'distance': rng.random((iterations, num_legs)),
+            'variation': rng.random((iterations, num_legs)),
+            'success': rng.random(iterations)
+        }
+
+    u = uniform_block(rng, iterations, num_visits + 2 * num_legs + 1, sampler)
+    return {
+        'visit_noise': normal_ppf(u[:, :num_visits]),
+        'distance': u[:, num_visits:num_visits + num_legs],
+        'variation': u[:, num_visits + num_legs:num_visits + 2 * num_legs],
+        'success': u[:, -1]
+    }
+
+
+# Показатели, по которым сравниваются конфигурации (compare_configurations)
+COMPARISON_FIELDS = ('total_hours', 'travel_hours', 'efficiency', 'successful_visits', 'is_overloaded')
+
+# Показатели кривой "число визитов -> показатели" (visit_count_sweep)
+SWEEP_FIELDS = ('total_hours', 'efficiency', 'successful_visits', 'is_overloaded')
+
+
+def simulate_daily_batch(day_params, iterations, rng=None, sampler='random', antithetic=False):
+    """
+    Пакетная симуляция рабочих дней (аналог _simulate_single_random_day).
+    Все визиты всех итераций генерируются матрицами (iterations, num_visits),
+    поездки - матрицами (iterations, num_visits - 1), итоги сворачиваются по оси 1.
+    Случайные числа берутся только из rng (numpy.random.Generator);
+    sampler - способ выборки (см. rng_streams.SAMPLERS), antithetic - зеркальные пары.
+    """
+    rng = make_rng(rng=rng)
+    n = max(0, int(iterations))
+    draws = daily_draws(int(day_params['num_visits']), n, rng, sampler, antithetic)
+    return daily_from_draws(day_params, draws)
+
+
+def simulate_daily_configs(configs, iterations, rng=None, sampler='random'):
+    """
+    Общие случайные числа (CRN) для нескольких конфигураций дня: одна выборка
+    на максимальное число визитов, каждая конфигурация берёт свой срез
+    (визит j и переезд j используют одни и те же числа во всех конфигурациях)
+    """
+    rng = make_rng(rng=rng)
+    n = max(0, int(iterations))
+    max_visits = max(int(day_params['num_visits']) for day_params in configs)
+    draws = daily_draws(max_visits, n, rng, sampler)
+    return [daily_from_draws(day_params, draws) for day_params in configs]
+
+
+def daily_from_draws(day_params, draws):
+    """Показатели дней из готовых случайных величин (лишние столбцы отбрасываются)"""
+    num_visits = int(day_params['num_visits'])
+    num_legs = max(0, num_visits - 1)
+    n = len(draws['success'])
+
+    min_visit = day_params['min_visit']
+    max_visit = day_params['max_visit']
+    avg_visit = day_params['avg_visit']
+
+    # 1. Время визитов (включая админ. работу): (iterations, num_visits)
+    visit_times = avg_visit + (max_visit - min_visit) / 6 * draws['visit_noise'][:, :num_visits]
+    np.clip(visit_times, min_visit, max_visit, out=visit_times)
+    total_visit_time_min = visit_times.sum(axis=1)
+
+    # 2. Расстояния и вариация времени в пути: (iterations, num_visits - 1)
+    distances = day_params['base_distance_km'] * (0.7 + 0.6 * draws['distance'][:, :num_legs])
+    time_variation = 0.75 + 0.5 * draws['variation'][:, :num_legs]
+    total_distance_km = distances.sum(axis=1)
+
+    travel_minutes = distances / day_params['transport_speed'] * time_variation * 60 + \
+        day_params['transport_waiting']
+    total_travel_min = travel_minutes.sum(axis=1)
+
+    # 3. Общее время и эффективность
+    total_time_min = total_visit_time_min + total_travel_min
+    total_hours = total_time_min / 60
+
+    efficiency = np.zeros(n)
+    np.divide(total_visit_time_min * 100, total_time_min, out=efficiency, where=total_time_min > 0)
+
+    # 4. Успешные визиты
+    success_rate = 0.8 + 0.15 * draws['success']
+    successful_visits = np.floor(num_visits * success_rate).astype(int)
+
+    # 5. Проверка условий
+    max_work_hours = day_params['max_work_hours']
+
+    return {
+        'total_hours': total_hours,
+        'productive_hours': total_visit_time_min / 60,
+        'travel_hours': total_travel_min / 60,
+        'efficiency': efficiency,
+        'successful_visits': successful_visits,
+        'success_rate_percent': success_rate * 100,
+        'is_overloaded': total_hours > max_work_hours,
+        'is_optimal': (total_hours >= 6) & (total_hours <= 8) &
+                      (successful_visits >= 5) & (successful_visits <= 8),
+        'total_distance_km': total_distance_km
+    }
+
+
+def simulate_visit_sweep(day_params, max_visits, iterations, rng=None, sampler='random'):
+    """
+    Все варианты числа визитов 1..max_visits за один проход: день с k визитами -
+    префикс дня с k + 1 визитами (первые k визитов и k - 1 переездов),
+    итоги получаются накопленными суммами по оси визитов.
+    Возвращает матрицы (iterations, max_visits): столбец k - 1 соответствует k визитам.
+    """
+    rng = make_rng(rng=rng)
+    n = max(0, int(iterations))
+    max_visits = max(1, int(max_visits))
+    draws = daily_draws(max_visits, n, rng, sampler)
+
+    min_visit = day_params['min_visit']
+    max_visit = day_params['max_visit']
+
+    visit_times = day_params['avg_visit'] + (max_visit - min_visit) / 6 * draws['visit_noise']
+    np.clip(visit_times, min_visit, max_visit, out=visit_times)
+    visit_minutes = np.cumsum(visit_times, axis=1)
+
+    travel_legs = day_params['base_distance_km'] * (0.7 + 0.6 * draws['distance']) / \
+        day_params['transport_speed'] * (0.75 + 0.5 * draws['variation']) * 60 + \
+        day_params['transport_waiting']
+    travel_minutes = np.zeros((n, max_visits))
+    np.cumsum(travel_legs, axis=1, out=travel_minutes[:, 1:])
+
+    total_minutes = visit_minutes + travel_minutes
+    total_hours = total_minutes / 60
+    efficiency = np.zeros((n, max_visits))
+    np.divide(visit_minutes * 100, total_minutes, out=efficiency, where=total_minutes > 0)
+
+    visit_counts = np.arange(1, max_visits + 1)
+    successful_visits = np.floor(visit_counts * (0.8 + 0.15 * draws['success'])[:, None]).astype(int)
+
+    return {
+        'total_hours': total_hours,
+        'travel_hours': travel_minutes / 60,
+        'efficiency': efficiency,
+        'successful_visits': successful_visits,
+        'is_overloaded': total_hours > day_params['max_work_hours']
+    }
+
+
+def sweep_chunk(sweep_args, iterations, seed_seq):
+    """
+    Задача для пула процессов: чанк кривой "число визитов -> показатели".
+    sweep_args = {'day_params': ..., 'max_visits': ..., 'sampler': ...};
+    ключи результата - comparison_key(показатель, k)
+    """
+    sweep = simulate_visit_sweep(sweep_args['day_params'], sweep_args['max_visits'], iterations,
+                                 np.random.default_rng(seed_seq), sweep_args.get('sampler', 'random'))
+    return {
+        comparison_key(field, k): sweep[field][:, k - 1]
+        for field in SWEEP_FIELDS
+        for k in range(1, sweep_args['max_visits'] + 1)
+    }
+
+
+def expected_daily_hours(day_params, tilt=None):
+    """
+    Точное математическое ожидание total_hours дневной модели:
+    время визита - нормальное, обрезанное по [min_visit, max_visit]
+    (E[clip(X, a, b)] в замкнутой форме), расстояние и вариация пути
+    независимы со средним 1, ожидание транспорта постоянно.
+    tilt - ожидание при наклонённых распределениях (см. overload_tilt)
+    """
+    tilt = tilt or {}
+    num_visits = int(day_params['num_visits'])
+    num_legs = max(0, num_visits - 1)
+    low, high = day_params['min_visit'], day_params['max_visit']
+    sigma = (high - low) / 6
+    mu = day_params['avg_visit'] + sigma * tilt.get('visit_noise', 0.0)
+
+    if sigma > 0:
+        normal = NormalDist()
+        alpha, beta = (low - mu) / sigma, (high - mu) / sigma
+        expected_visit = (low * normal.cdf(alpha) + high * (1 - normal.cdf(beta)) +
+                          mu * (normal.cdf(beta) - normal.cdf(alpha)) +
+                          sigma * (normal.pdf(alpha) - normal.pdf(beta)))
+    else:
+        expected_visit = min(max(mu, low), high)
+
+    distance_factor = 0.7 + 0.6 * tilted_uniform_mean(tilt.get('distance', 0.0))
+    variation_factor = 0.75 + 0.5 * tilted_uniform_mean(tilt.get('variation', 0.0))
+    expected_leg = day_params['base_distance_km'] / day_params['transport_speed'] * \
+        distance_factor * variation_factor * 60 + day_params['transport_waiting']
+    return (num_visits * expected_visit + num_legs * expected_leg) / 60
+
+
+# ★ ВЫБОРКА ПО ЗНАЧИМОСТИ ДЛЯ РЕДКОЙ ПЕРЕРАБОТКИ ★
+# Нормальный шум визитов сдвигается (z ~ N(theta, 1)), равномерные числа пути
+# берутся из экспоненциально наклонённого распределения (плотность ~ e^(theta u)).
+# Каждая итерация получает вес - отношение исходной плотности к наклонённой.
+
+# Наибольший параметр наклона (ограничение переполнения e^theta)
+MAX_TILT = 50.0
+
+# Пробная выборка и доля элиты для подбора наклона (перекрёстная энтропия)
+IS_PILOT_SIZE = 2000
+IS_ELITE_SHARE = 0.1
+
+
+def tilted_uniform(v, theta):
+    """Наклонённое распределение на [0, 1] из равномерных v (обратная функция распределения)"""
+    if abs(theta) < 1e-9:
+        return v
+    return np.log1p(v * math.expm1(theta)) / theta
+
+
+def tilted_uniform_mean(theta):
+    """Среднее наклонённого распределения на [0, 1]"""
+    if abs(theta) < 1e-9:
+        return 0.5
+    return 1 / -math.expm1(-theta) - 1 / theta
+
+
+def tilted_uniform_theta(mean):
+    """Параметр наклона, при котором среднее на [0, 1] равно mean (бисекция)"""
+    low, high = -MAX_TILT, MAX_TILT
+    for _ in range(60):
+        middle = (low + high) / 2
+        if tilted_uniform_mean(middle) < mean:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+
+def max_daily_hours(day_params):
+    """Наибольшее возможное время дня (все величины на верхней границе)"""
+    num_visits = int(day_params['num_visits'])
+    leg = day_params['base_distance_km'] * 1.3 / day_params['transport_speed'] * 1.25 * 60 + \
+        day_params['transport_waiting']
+    return (num_visits * day_params['max_visit'] + max(0, num_visits - 1) * leg) / 60
+
+
+def overload_tilt(day_params, rng=None, threshold=None, pilot_size=IS_PILOT_SIZE, elite_share=IS_ELITE_SHARE,
+                  max_levels=30):
+    """
+    Наклон распределений для выборки по значимости методом перекрёстной энтропии:
+    пробная выборка, элита - дни длиннее (1 - elite_share)-квантиля (но не длиннее
+    порога), новый наклон - взвешенные средние величин элиты (общие для всех
+    визитов и всех переездов). Уровень поднимается, пока не достигнет порога
+    переработки (по умолчанию max_work_hours). Обрезка времени визитов и
+    нелинейность пути учитываются автоматически. Если переработка не редкая
+    (не меньше elite_share пробной выборки), наклон нулевой - обычная выборка.
+    """
+    rng = make_rng(rng=rng)
+    threshold = day_params['max_work_hours'] if threshold is None else threshold
+    num_visits = int(day_params['num_visits'])
+    tilt = {'visit_noise': 0.0, 'distance': 0.0, 'variation': 0.0}
+
+    for _ in range(max_levels):
+        draws, weights = tilted_daily_draws(num_visits, pilot_size, rng, tilt)
+        total_hours = daily_from_draws(day_params, draws)['total_hours']
+        if not any(tilt.values()) and np.mean(total_hours > threshold) >= elite_share:
+            break
+        level = min(threshold, float(np.quantile(total_hours, 1 - elite_share)))
+        elite = total_hours >= level
+        elite_weights = weights[elite]
+        if elite_weights.sum() <= 0:
+            break
+
+        def elite_mean(key):
+            values = draws[key]
+            if values.shape[1] == 0:
+                return None
+            return float(np.average(values[elite].mean(axis=1), weights=elite_weights))
+
+        tilt = {'visit_noise': float(np.clip(elite_mean('visit_noise'), -MAX_TILT, MAX_TILT))}
+        for key in ('distance', 'variation'):
+            mean = elite_mean(key)
+            tilt[key] = tilted_uniform_theta(mean) if mean is not None else 0.0
+        if level >= threshold:
+            break
+    return tilt
+
+
+def tilted_daily_draws(num_visits, iterations, rng, tilt, sampler='random'):
+    """
+    Случайные величины дня (как daily_draws) из наклонённых распределений
+    и веса итераций (отношение правдоподобий исходной и наклонённой выборки)
+    """
+    num_legs = max(0, num_visits - 1)
+    theta_visit = tilt.get('visit_noise', 0.0)
+    theta_distance = tilt.get('distance', 0.0)
+    theta_variation = tilt.get('variation', 0.0)
+
+    if sampler == 'random':
+        noise = rng.standard_normal((iterations, num_visits))
+        distance = rng.random((iterations, num_legs))
+        variation = rng.random((iterations, num_legs))
+        success = rng.random(iterations)
+    else:
+        u = uniform_block(rng, iterations, num_visits + 2 * num_legs + 1, sampler)
+        noise = normal_ppf(u[:, :num_visits])
+        distance = u[:, num_visits:num_visits + num_legs]
+        variation = u[:, num_visits + num_legs:num_visits + 2 * num_legs]
+        success = u[:, -1]
+
+    draws = {
+        'visit_noise': noise + theta_visit,
+        'distance': tilted_uniform(distance, theta_distance),
+        'variation': tilted_uniform(variation, theta_variation),
+        'success': success
+    }
+
+    # log(f / g): для нормального сдвига -theta z + theta^2 / 2 (z - наклонённое значение),
+    # для наклонённого равномерного log((e^theta - 1) / theta) - theta u
+    log_weight = (-theta_visit * draws['visit_noise'] + theta_visit ** 2 / 2).sum(axis=1)
+    for key, theta in (('distance', theta_distance), ('variation', theta_variation)):
+        if abs(theta) >= 1e-9:
+            log_weight += num_legs * math.log(math.expm1(theta) / theta) - theta * draws[key].sum(axis=1)
+    return draws, np.exp(log_weight)
+
+
+def overload_is_chunk(is_args, iterations, seed_seq):
+    """
+    Задача для пула процессов: чанк выборки по значимости.
+    is_args = {'day_params', 'tilt', 'sampler'}; среднее weighted_overload -
+    несмещённая оценка вероятности переработки, weight - для эффективного
+    размера выборки
+    """
+    day_params = is_args['day_params']
+    draws, weights = tilted_daily_draws(int(day_params['num_visits']), iterations,
+                                        np.random.default_rng(seed_seq), is_args['tilt'],
+                                        is_args.get('sampler', 'random'))
+    overloaded = daily_from_draws(day_params, draws)['is_overloaded']
+    return {
+        'weighted_overload': weights * overloaded,
+        'weight': weights,
+        'is_overloaded': overloaded
+    }
+
+
+def density_mc_metrics(days, max_work_hours):
+    """Показатели Монте-Карло с учётом плотности из массивов по дням"""
+    total_hours = days['total_hours']
+    successful_visits = days['successful_visits'].astype(int)
+
+    return {
+        'total_hours': total_hours,
+        'successful_visits': successful_visits,
+        'success_rate': days['success_rate'] * 100,
+        'efficiency': days['efficiency'],
+        'total_travel_distance_km': days['total_travel_distance_km'],
+        'total_waiting_time_min': days['total_waiting_time_min'],
+        'clinics_visited': days['clinics_visited'].astype(int),
+        'districts_visited': days['districts_visited'].astype(int),
+        'is_overloaded': total_hours > max_work_hours,
+        'is_optimal': (total_hours >= 6) & (total_hours <= 8) &
+                      (successful_visits >= 5) & (successful_visits <= 8)
+    }
+
+
+def density_analysis_metrics(days):
+    """Показатели анализа плотности (monte_carlo_with_density)"""
+    total_minutes = days['total_hours'] * 60
+    efficiency = np.zeros(len(total_minutes))
+    np.divide(days['total_visit_time_min'] * 100, total_minutes, out=efficiency, where=total_minutes > 0)
+
+    return {
+        'total_hours': days['total_hours'],
+        'successful_visits': days['successful_visits'].astype(int),
+        'travel_distance': days['total_travel_distance_km'],
+        'waiting_time': days['total_waiting_time_min'],
+        'districts_visited': days['districts_visited'].astype(int),
+        'efficiency': efficiency,
+        'success_rate': days['success_rate'] * 100
+    }
+
+
+def daily_chunk(day_params, iterations, seed_seq):
+    """Задача для пула процессов: один чанк дневной симуляции"""
+    batch = simulate_daily_batch(day_params, iterations, np.random.default_rng(seed_seq),
+                                 day_params.get('sampler', 'random'), day_params.get('antithetic', False))
+    return {key: batch[key] for key in DAILY_MC_FIELDS}
+
+
+def comparison_key(field, index):
+    """Ключ показателя конфигурации index в накопителе сравнения"""
+    return f"{field}#{index}"
+
+
+def difference_key(field, index):
+    """Ключ парной разности показателя: конфигурация index минус базовая (0)"""
+    return f"{field}#{index}-0"
+
+
+def comparison_chunk(comparison_args, iterations, seed_seq):
+    """
+    Задача для пула процессов: чанк сравнения конфигураций на общих случайных числах.
+    comparison_args = {'configs': [day_params, ...], 'sampler': ...};
+    возвращает показатели каждой конфигурации и парные разности с базовой
+    """
+    configs = comparison_args['configs']
+    batches = simulate_daily_configs(configs, iterations, np.random.default_rng(seed_seq),
+                                     comparison_args.get('sampler', 'random'))
+
+    result = {}
+    for index, batch in enumerate(batches):
+        for field in COMPARISON_FIELDS:
+            result[comparison_key(field, index)] = batch[field]
+            if index > 0:
+                result[difference_key(field, index)] = \
+                    batch[field].astype(float) - batches[0][field].astype(float)
+    return result
+
+
+def _simulate_density_chunk(density_args, iterations, seed_seq):
+    calculator = DensityCalculator(density_args['cities_data'])
+    return calculator.simulate_density_days(density_args['city'], density_args['specialization'],
+                                            density_args['num_visits'], density_args['transport_type'],
+                                            iterations, rng=np.random.default_rng(seed_seq),
+                                            sampler=density_args.get('sampler', 'random'))
+
+
+def density_chunk(density_args, iterations, seed_seq):
+    """
+    Задача для пула процессов: один чанк симуляции с учётом плотности.
+    density_args - словарь: cities_data, city, specialization, num_visits,
+    transport_type, max_work_hours, sampler
+    """
+    days = _simulate_density_chunk(density_args, iterations, seed_seq)
+    return density_mc_metrics(days, density_args['max_work_hours'])
+
+
+def density_analysis_chunk(density_args, iterations, seed_seq):
+    """Задача для пула процессов: чанк для monte_carlo_with_density"""
+    return density_analysis_metrics(_simulate_density_chunk(density_args, iterations, seed_seq))
+
+
+def successful_visits_draws(model, day_args, days, rng):
+    """
+    Успешные визиты за days независимых дней медпреда: дневное ядро (day_args - day_params)
+    или ядро с плотностью (day_args - аргументы density_chunk); ядро вызывается порциями
+    не больше COMPLETION_DRAW_VALUES случайных чисел
+    """
+    visits = max(1, day_args['num_visits'])
+    if model == 'density':
+        calculator = DensityCalculator(day_args['cities_data'])
+        # Группы визитов и районы дня
+        values_per_day = (visits + 1) * DensityCalculator.VISIT_GROUP_DRAWS
+    else:
+        # Шум визитов, расстояние и вариация переездов
+        values_per_day = 3 * visits
+    portion = max(1, COMPLETION_DRAW_VALUES // values_per_day)
+    parts = []
+    for start in range(0, days, portion):
+        n = min(portion, days - start)
+        if model == 'density':
+            batch = calculator.simulate_density_batch(day_args['city'], day_args['specialization'],
+                                                      day_args['num_visits'], day_args['transport_type'], n, rng=rng)
+        else:
+            batch = simulate_daily_batch(day_args, n, rng)
+        parts.append(np.asarray(batch['successful_visits'], dtype=float))
+    return np.concatenate(parts) if parts else np.zeros(0)
+
+
+def completion_chunk(completion_args, iterations, seed_seq):
+    """
+    Задача для пула процессов: чанк реплик проекта. Дни медпредов каждой реплики идут
+    одним потоком; rep_days - сколько дней-медпредов понадобилось, чтобы набрать
+    total_visits_needed успешных визитов (0 - не набрано за предельное число дней).
+    Команда из k медпредов при этом заканчивает на рабочий день ceil(rep_days / k)
+    """
+    rng = np.random.default_rng(seed_seq)
+    target = completion_args['total_visits_needed']
+    visits_per_day = completion_args['visits_per_day']
+    limit = COMPLETION_MAX_DAYS_FACTOR * math.ceil(target / visits_per_day)
+
+    rep_days = np.zeros(iterations)
+    collected = np.zeros(iterations)
+    active = np.arange(iterations)
+    drawn = 0
+    while len(active) and drawn < limit:
+        # Порция - сколько дней нужно отстающей реплике как минимум (если все визиты успешны)
+        block = min(max(1, math.ceil((target - collected[active].min()) / visits_per_day)), limit - drawn)
+        visits = successful_visits_draws(completion_args['model'], completion_args['day_args'],
+                                         len(active) * block, rng).reshape(len(active), block)
+        totals = collected[active, None] + np.cumsum(visits, axis=1)
+        reached = totals[:, -1] >= target
+        rep_days[active[reached]] = drawn + np.argmax(totals[reached] >= target, axis=1) + 1
+        collected[active] = totals[:, -1]
+        active = active[~reached]
+        drawn += block
+    return {'rep_days': rep_days}
+
+
+def calendar_work_days(calendar_days, work_days_per_week=5):
+    """Рабочих дней в первых calendar_days днях проекта (неделя начинается с рабочих дней)"""
+    weeks, rest = divmod(int(calendar_days), 7)
+    return weeks * work_days_per_week + min(rest, work_days_per_week)
+
+
+def work_day_calendar(work_days, work_days_per_week=5):
+    """Календарный день проекта, на который приходится рабочий день work_days (массив, с 1)"""
+    work_days = np.asarray(work_days) - 1
+    return work_days // work_days_per_week * 7 + work_days % work_days_per_week + 1
+
+
+def gallop_search(predicate, start=1, upper=None):
+    """
+    Наименьшее k >= 1, для которого выполняется монотонный predicate(k):
+    от start шаг удваивается (вниз или вверх) до смены ответа, затем бисекция.
+    Если predicate не выполняется и на upper - None
+    """
+    start = max(1, int(start))
+    if upper is not None:
+        start = min(start, int(upper))
+    step = 1
+    if predicate(start):
+        high, low = start, start - 1
+        while low >= 1 and predicate(low):
+            high = low
+            step *= 2
+            low = max(0, high - step)
+    else:
+        low = start
+        while True:
+            high = low + step if upper is None else min(low + step, int(upper))
+            if high <= low:
+                return None
+            if predicate(high):
+                break
+            low = high
+            step *= 2
+
+    while high - low > 1:
+        middle = (low + high) // 2
+        if predicate(middle):
+            high = middle
+        else:
+            low = middle
+    return high
+
+
+def deadline_reps_search(rep_days, deadline, target, confidence=0.95):
+    """
+    Подбор численности по выборке rep_days (см. completion_chunk) со сроком deadline рабочих дней:
+    команда из k успевает в реплике, если rep_days <= k * deadline. Все кандидаты
+    оцениваются на одних и тех же репликах, поэтому вероятность монотонна по k.
+    target - целевая вероятность (доля). Кандидат "заведомо ниже цели", если верхняя
+    граница интервала Уилсона меньше target, "заведомо выше" - если нижняя не меньше.
+    Ответ решён, когда наименьший не заведомо низкий кандидат уже заведомо высокий
+    """
+    rep_days = np.asarray(rep_days)
+    count = len(rep_days)
+    finished = np.sort(rep_days[rep_days > 0])
+    candidates = {}
+
+    def estimate(reps):
+        """(доля успевших реплик, границы интервала Уилсона) для команды из reps"""
+        if reps not in candidates:
+            successes = int(np.searchsorted(finished, reps * deadline, side='right'))
+            candidates[reps] = (successes / count if count else 0.0,
+                                *wilson_interval(successes, count, confidence))
+        return candidates[reps]
+
+    # Начало поиска - численность для средней реплики; дальше upper вероятность не растёт
+    start = math.ceil(finished.mean() / deadline) if len(finished) else 1
+    upper = max(1, math.ceil(finished[-1] / deadline)) if len(finished) else 1
+    lowest = gallop_search(lambda reps: estimate(reps)[2] >= target, start, upper)
+    reliable = gallop_search(lambda reps: estimate(reps)[1] >= target, start, upper)
+    return {
+        'min_reps': gallop_search(lambda reps: estimate(reps)[0] >= target, start, upper),
+        'decided': lowest == reliable,
+        'lowest_reps': lowest,
+        'reliable_reps': reliable,
+        'candidates': {reps: candidates[reps] for reps in sorted(candidates)}
+    }
+
+
+def accumulate_chunk(task, task_args, iterations, seed_seq, accumulator_options=None):
+    """
+    Выполнение чанка и свёртка его результатов в накопитель (в процессе-исполнителе).
+    accumulator_options - параметры MCAccumulator (keep_raw, antithetic, control)
+    """
+    accumulator = MCAccumulator(**(accumulator_options or {}))
+    accumulator.update(task(task_args, iterations, seed_seq))
+    return accumulator
+
+
+def accumulate_shared_chunk(task, task_args, iterations, seed_seq, accumulator_options, raw_spec, offset):
+    """
+    accumulate_chunk с сырыми итерациями в общей памяти: строки чанка
+    пишутся в массивы raw_spec начиная с offset, накопитель возвращается без них
+    """
+    batch = task(task_args, iterations, seed_seq)
+    accumulator = MCAccumulator(**dict(accumulator_options, keep_raw=False))
+    accumulator.update(batch)
+    with SharedRawBuffers.attach(raw_spec) as buffers:
+        buffers.write(offset, batch)
+    return accumulator
+
+
+def split_chunks(iterations, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Размеры чанков: полные чанки по chunk_size и остаток"""
+    iterations = max(0, int(iterations))
+    chunk_size = max(1, int(chunk_size))
+    sizes = [chunk_size] * (iterations // chunk_size)
+    if iterations % chunk_size:
+        sizes.append(iterations % chunk_size)
+    return sizes
+
+
+def is_pool(workers):
+    """workers - готовый пул с методом map (например, MCCoordinator), а не число процессов"""
+    return hasattr(workers, 'map')
+
+
+def resolve_workers(workers):
+    """None или 0 - все ядра машины; для пула - число его исполнителей"""
+    if is_pool(workers):
+        return max(1, workers.worker_count())
+    if not workers:
+        return os.cpu_count() or 1
+    return max(1, int(workers))
+
+
+@contextmanager
+def worker_pool(workers, tasks):
+    """
+    Пул для tasks задач: переданный пул (используется как есть и не закрывается),
+    свой пул процессов или None - считать в текущем процессе
+    """
+    if is_pool(workers):
+        yield workers
+        return
+    workers = resolve_workers(workers)
+    if workers > 1 and tasks > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, tasks)) as pool:
+            yield pool
+    else:
+        yield None
+
+
+class MCRunState:
+    """
+    Состояние прогона для продолжения (дозапуска итераций).
+    Полные чанки свёрнуты в full, неполный последний чанк хранится отдельно:
+    при продолжении он пересчитывается целиком из того же потока, поэтому
+    N + M итераций дают ту же статистику, что и один прогон на N + M.
+    """
+
+    def __init__(self, task, task_args, random_seed=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 keep_raw=False, accumulator_options=None):
+        self.signature = (task.__name__, freeze(task_args))
+        self.root = seed_sequence(random_seed)
+        self.chunk_size = max(1, int(chunk_size))
+        self.options = dict(accumulator_options or {}, keep_raw=keep_raw)
+        self.full = MCAccumulator(**self.options)
+        self.full_chunks = 0
+        self.tail = None
+        self.tail_size = 0
+
+    @property
+    def iterations(self):
+        return self.full_chunks * self.chunk_size + self.tail_size
+
+    def check(self, task, task_args, accumulator_options=None):
+        """
+        Продолжать можно только тот же расчёт: задача, её параметры и, если переданы,
+        параметры накопителя (размер чанка и keep_raw всегда берутся из состояния)
+        """
+        options = {key: value for key, value in self.options.items() if key != 'keep_raw'}
+        if accumulator_options is not None and freeze(accumulator_options) != freeze(options):
+            raise ValueError("Продолжение возможно только с теми же параметрами снижения дисперсии")
+        if (task.__name__, freeze(task_args)) != self.signature:
+            raise ValueError("Продолжение возможно только для того же расчёта с теми же параметрами")
+
+    def accumulator(self):
+        """Итоговый накопитель (копия - состояние можно продолжать дальше)"""
+        accumulator = copy.deepcopy(self.full)
+        if self.tail is not None:
+            accumulator.merge(self.tail)
+        return accumulator
+
+    def current(self):
+        """Накопитель только для чтения (без копии, если неполного чанка нет)"""
+        return self.full if self.tail is None else self.accumulator()
+
+
+def extend_run(state, task, task_args, iterations, workers=1, pool=None, on_chunk=None):
+    """
+    Дозапуск iterations итераций: чанки продолжают нумерацию потоков
+    stream_seed(root, i) с первого незавершённого чанка.
+    on_chunk(state) вызывается после слияния каждого чанка в порядке номеров;
+    True - остальные чанки отбрасываются (остановка не зависит от числа workers).
+    Состояние state изменяется на месте и возвращается.
+    """
+    state.check(task, task_args)
+    total = state.iterations + max(0, int(iterations))
+    sizes = split_chunks(total - state.full_chunks * state.chunk_size, state.chunk_size)
+    seeds = [stream_seed(state.root, state.full_chunks + i) for i in range(len(sizes))]
+
+    if pool is None:
+        with worker_pool(workers, len(sizes)) as own_pool:
+            parts = _accumulate_chunks(own_pool, task, task_args, sizes, seeds, state.options)
+    else:
+        parts = _accumulate_chunks(pool, task, task_args, sizes, seeds, state.options)
+
+    state.tail, state.tail_size = None, 0
+    for size, part in zip(sizes, parts):
+        if size == state.chunk_size:
+            state.full.merge(part)
+            state.full_chunks += 1
+        else:
+            state.tail, state.tail_size = part, size
+        if on_chunk is not None and on_chunk(state):
+            break
+    return state
+
+
+def run_chunked(task, task_args, iterations, random_seed=None, workers=1,
+                chunk_size=DEFAULT_CHUNK_SIZE, keep_raw=False, accumulator_options=None):
+    """
+    Запуск task(task_args, n, seed_seq) по чанкам.
+    Каждый чанк сворачивается в MCAccumulator (при workers > 1 - в пуле
+    процессов), накопители объединяются строго в порядке номеров чанков.
+    """
+    state = MCRunState(task, task_args, random_seed, chunk_size, keep_raw, accumulator_options)
+    return extend_run(state, task, task_args, iterations, workers).accumulator()
+
+
+def _accumulate_chunks(pool, task, task_args, sizes, seeds, options):
+    """
+    Накопители чанков (сырые итерации keep_raw возвращаются вместе с накопителем;
+    без копирования через общую память - см. run_shared)
+    """
+    if pool is None:
+        return [accumulate_chunk(task, task_args, n, s, options) for n, s in zip(sizes, seeds)]
+    return list(pool.map(accumulate_chunk, repeat(task), repeat(task_args), sizes, seeds, repeat(options)))
+
+
+def _shared_chunks(pool, task, task_args, sizes, seeds, options, buffers):
+    """Чанки с записью сырых итераций в buffers (подряд, в порядке номеров)"""
+    offsets = np.cumsum([0] + sizes[:-1]).tolist()
+    mapper = map if pool is None else pool.map
+    parts = list(mapper(accumulate_shared_chunk, repeat(task), repeat(task_args), sizes, seeds,
+                        repeat(options), repeat(buffers.spec()), offsets))
+    return parts, offsets
+
+
+def run_shared(task, task_args, iterations, random_seed=None, workers=1,
+               chunk_size=DEFAULT_CHUNK_SIZE, accumulator_options=None):
+    """
+    Прогон с сырыми итерациями в общей памяти без копирования в родителя:
+    процессы пула пишут строки чанков прямо в общие массивы, родитель их не копирует.
+    Возвращает (накопитель, SharedRawBuffers): статистика - в накопителе,
+    сырые итерации - представления buffers.arrays (например, raw_frame(buffers.arrays)
+    для графиков). Когда представления больше не нужны, сегменты освобождает
+    buffers.close() или with buffers: ...
+    Потоки чанков те же, что в run_chunked, - результаты совпадают
+    """
+    accumulator, buffers, _ = run_shared_state(task, task_args, iterations, random_seed, workers, chunk_size,
+                                               accumulator_options)
+    return accumulator, buffers
+
+
+def run_shared_state(task, task_args, iterations, random_seed=None, workers=1,
+                     chunk_size=DEFAULT_CHUNK_SIZE, accumulator_options=None):
+    """
+    run_shared и состояние прогона для продолжения (MCRunState с keep_raw):
+    сырые итерации накопителей состояния - представления buffers.arrays, поэтому
+    состояние действительно до buffers.close() (продолжать - его копию, copy.deepcopy).
+    Возвращает (накопитель без сырых итераций, SharedRawBuffers, состояние)
+    """
+    state = MCRunState(task, task_args, random_seed, chunk_size, True, accumulator_options)
+    sizes = split_chunks(iterations, state.chunk_size)
+    seeds = [stream_seed(state.root, i) for i in range(len(sizes))]
+    buffers = SharedRawBuffers(raw_schema(task(task_args, 1, stream_seed(state.root, 0))), sum(sizes))
+    try:
+        if is_pool(workers):
+            raise ValueError("Общая память доступна только пулу процессов этой машины")
+        with worker_pool(workers, len(sizes)) as pool:
+            parts, offsets = _shared_chunks(pool, task, task_args, sizes, seeds, state.options, buffers)
+    except BaseException:
+        buffers.close()
+        raise
+
+    accumulator = MCAccumulator(**dict(state.options, keep_raw=False))
+    for size, part, offset in zip(sizes, parts, offsets):
+        accumulator.merge(part)
+        part.keep_raw = True
+        part.raw_chunks = {key: [values[offset:offset + size]] for key, values in buffers.arrays.items()}
+        if size == state.chunk_size:
+            state.full.merge(part)
+            state.full_chunks += 1
+        else:
+            state.tail, state.tail_size = part, size
+    return accumulator, buffers, state
+
+
+def run_batches(state, task, task_args, iterations, workers=1, on_batch=None, on_chunk=None):
+    """
+    Дозапуск iterations итераций порциями по workers чанков (порции выровнены
+    по границам чанков, пул процессов общий для всех порций).
+    После каждой порции вызывается on_batch(state): контрольная точка,
+    бюджет времени; True - остановиться досрочно.
+    on_chunk(state) - правило остановки, которое проверяется после каждого чанка
+    в порядке номеров (см. extend_run): точка остановки и результат не зависят
+    от размера порции, то есть от числа workers.
+    """
+    limit = state.iterations + max(0, int(iterations))
+    chunks = math.ceil((limit - state.iterations) / state.chunk_size)
+    stopped = False
+
+    def check_chunk(current_state):
+        nonlocal stopped
+        stopped = bool(on_chunk(current_state))
+        return stopped
+
+    with worker_pool(workers, chunks) as pool:
+        while state.iterations < limit:
+            batch = resolve_workers(workers) * state.chunk_size
+            step = min(batch - state.iterations % state.chunk_size, limit - state.iterations)
+            extend_run(state, task, task_args, step, workers, pool, check_chunk if on_chunk is not None else None)
+            if on_batch is not None and on_batch(state):
+                break
+            if stopped:
+                break
+    return state
+
+
+class TimeBudget:
+    """
+    Обработчик порций для режима "по времени" (см. run_batches): расчёт
+    останавливается, когда следующая порция (оценка - длительность предыдущей)
+    уже не укладывается в бюджет. Хотя бы одна порция считается всегда.
+    on_batch - следующий обработчик в цепочке (контрольная точка)
+    """
+
+    def __init__(self, seconds, on_batch=None):
+        self.seconds = float(seconds)
+        self.on_batch = on_batch
+        self.started = time.monotonic()
+        self._last_batch = self.started
+        self.batches = 0
+
+    def __call__(self, state):
+        now = time.monotonic()
+        batch_time = now - self._last_batch
+        self._last_batch = now
+        self.batches += 1
+        stop = self.on_batch(state) if self.on_batch is not None else False
+        return bool(stop) or now + batch_time > self.started + self.seconds
+
+    def report(self):
+        """Бюджет, фактически затраченное время и число порций"""
+        return {
+            'time_budget': self.seconds,
+            'elapsed': time.monotonic() - self.started,
+            'batches': self.batches
+        }
+
+
+def run_adaptive(task, task_args, max_iterations, random_seed=None, workers=1,
+                 chunk_size=DEFAULT_CHUNK_SIZE, keep_raw=False, tolerances=None, confidence=0.95,
+                 accumulator_options=None, state=None, on_batch=None):
+    """
+    Запуск до сходимости: чанки считаются порциями (по workers чанков),
+    полуширина доверительного интервала целевых показателей проверяется
+    после каждого чанка в порядке номеров. Остановка - на первом чанке, где
+    все показатели в допуске, или когда исчерпано max_iterations.
+    Чанк i получает тот же поток, что и в run_chunked, поэтому результат
+    совпадает с фиксированным запуском на итоговом числе итераций
+    и не зависит от числа workers.
+    state - продолжить прошлый прогон (max_iterations - сколько добавить не более);
+    on_batch - дополнительный обработчик порции (см. run_batches).
+    Возвращает (состояние прогона, отчёт о достигнутой точности).
+    """
+    tolerances = dict(DEFAULT_TOLERANCES if tolerances is None else tolerances)
+    if state is None:
+        state = MCRunState(task, task_args, random_seed, chunk_size, keep_raw, accumulator_options)
+    limit = state.iterations + max(0, int(max_iterations))
+    report = state.current().convergence(tolerances, confidence)
+
+    def check_convergence(current_state):
+        nonlocal report
+        report = current_state.current().convergence(tolerances, confidence)
+        return report['converged']
+
+    if not report['converged']:
+        run_batches(state, task, task_args, limit - state.iterations, workers, on_batch, check_convergence)
+
+    report['max_iterations'] = limit
+    return state, report
@@ -0,0 +1,164 @@
+"""
+Предрассчитанная сетка Монте-Карло: все города x специализации x транспорт
+x число визитов, сохранённая на диск (gzip JSON). Кэш привязан к отпечатку
+параметров модели и автоматически устаревает при их изменении.
+Ячейка хранит статистику и сырые итерации (для графиков) - то же, что
+прогон с seed ячейки и keep_raw=True.
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from mc_engine import DEFAULT_CHUNK_SIZE
+
+# Методы Монте-Карло, которые попадают в сетку
+GRID_METHODS = ('daily', 'density')
+
+DEFAULT_GRID_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mc_grid_cache.json.gz')
+
+# Версия формата файла: сетки старого формата (без сырых итераций) не читаются
+GRID_VERSION = 2
+
+
+def params_fingerprint(unified_params, mc_params, cities_data):
+    """Отпечаток параметров модели (UNIFIED_PARAMS, MC_PARAMS, cities_data)"""
+    payload = json.dumps([unified_params, mc_params, cities_data],
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def grid_key(method, city, specialization, transport_type, num_visits):
+    """Ключ ячейки сетки"""
+    return f"{method}|{city}|{specialization}|{transport_type}|{int(num_visits)}"
+
+
+def cell_seed(random_seed, key):
+    """Seed ячейки: выводится из seed сетки и ключа ячейки"""
+    return [random_seed, int(hashlib.sha256(key.encode('utf-8')).hexdigest()[:8], 16)]
+
+
+def encode_raw(raw_results):
+    """Сырые итерации в JSON: тип и base64 байтов массива"""
+    return {key: [values.dtype.str, base64.b64encode(np.ascontiguousarray(values).tobytes()).decode('ascii')]
+            for key, values in raw_results.items()}
+
+
+def decode_raw(encoded):
+    """Обратно к типизированным массивам (каждый раз новые - их можно менять)"""
+    return {key: np.frombuffer(base64.b64decode(data), dtype=np.dtype(dtype)).copy()
+            for key, (dtype, data) in encoded.items()}
+
+
+class MCGridCache:
+    """Статистика и сырые итерации Монте-Карло по ячейкам сетки"""
+
+    def __init__(self, fingerprint, settings=None, entries=None):
+        self.fingerprint = fingerprint
+        self.settings = settings or {}
+        self.entries = entries or {}
+
+    def get(self, method, city, specialization, transport_type, num_visits):
+        """Ячейка {'statistics', 'raw'} (raw - см. decode_raw) или None"""
+        return self.entries.get(grid_key(method, city, specialization, transport_type, num_visits))
+
+    def put(self, method, city, specialization, transport_type, num_visits, statistics, raw_results=None):
+        self.entries[grid_key(method, city, specialization, transport_type, num_visits)] = {
+            'statistics': statistics,
+            'raw': encode_raw(raw_results) if raw_results is not None else None
+        }
+
+    def seed(self, method, city, specialization, transport_type, num_visits):
+        """Seed, с которым рассчитана ячейка"""
+        return cell_seed(self.settings.get('random_seed'),
+                         grid_key(method, city, specialization, transport_type, num_visits))
+
+    def save(self, path=DEFAULT_GRID_PATH):
+        """Запись на диск (через временный файл, чтобы не оставить битый кэш)"""
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump({'version': GRID_VERSION, 'fingerprint': self.fingerprint, 'settings': self.settings,
+                       'entries': self.entries}, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_GRID_PATH, fingerprint=None):
+        """
+        Загрузка с диска. None - файла нет, он повреждён, старого формата или
+        рассчитан для других параметров модели (fingerprint не совпал)
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Кэш сетки Монте-Карло не прочитан: {e}")
+            return None
+
+        if data.get('version') != GRID_VERSION:
+            return None
+        if fingerprint is not None and data.get('fingerprint') != fingerprint:
+            return None
+        return cls(data.get('fingerprint'), data.get('settings'), data.get('entries'))
+
+
+def precompute_grid(calculator, max_visits=20, iterations=1000, random_seed=0, workers=1,
+                    methods=GRID_METHODS, progress_callback=None):
+    """
+    Расчёт сетки: каждая ячейка - отдельный воспроизводимый прогон
+    (seed ячейки выводится из random_seed и её ключа, см. cell_seed)
+    """
+    cities = list(calculator.cities_data.keys())
+    specializations = list(calculator.specialization_names.keys())
+    transports = list(calculator.transport_names.keys())
+
+    cache = MCGridCache(calculator.mc_params_fingerprint(), {
+        'max_visits': max_visits,
+        'iterations': iterations,
+        'random_seed': random_seed,
+        'chunk_size': DEFAULT_CHUNK_SIZE,
+        'methods': list(methods)
+    })
+
+    simulations = {
+        'daily': calculator.monte_carlo_daily_simulation,
+        'density': calculator.monte_carlo_density_simulation
+    }
+    total = len(methods) * len(cities) * len(specializations) * len(transports) * max_visits
+    done = 0
+
+    for method in methods:
+        for city in cities:
+            for specialization in specializations:
+                for transport_type in transports:
+                    for num_visits in range(1, max_visits + 1):
+                        seed = cache.seed(method, city, specialization, transport_type, num_visits)
+                        result = simulations[method](city, specialization, num_visits, transport_type,
+                                                     iterations, random_seed=seed, workers=workers,
+                                                     chunk_size=DEFAULT_CHUNK_SIZE, keep_raw=True, use_grid=False)
+                        cache.put(method, city, specialization, transport_type, num_visits,
+                                  result['statistics'], result['raw_results'])
+
+                        done += 1
+                        if progress_callback:
+                            progress_callback(int(done / total * 100))
+
+    return cache
+
+
+if __name__ == '__main__':
+    # Предварительный расчёт: python mc_grid.py [путь_к_кэшу]
+    import sys
+    import time
+    from calculator_core import MedicalRepCalculatorGUI
+
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_GRID_PATH
+    started = time.time()
+    calculator = MedicalRepCalculatorGUI()
+    calculator.precompute_mc_grid(path)
+    print(f"Сетка Монте-Карло сохранена в {path} за {time.time() - started:.1f} с")
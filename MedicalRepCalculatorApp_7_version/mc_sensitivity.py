@@ -0,0 +1,277 @@
+"""
+Глобальный анализ чувствительности (индексы Соболя, схема Салтелли) по параметрам
+модели: UNIFIED_PARAMS, MC_PARAMS и cities_data. Каждая точка параметров
+оценивается векторизованным ядром Монте-Карло на общих случайных числах,
+блоки точек считаются в пуле процессов.
+"""
+
+import copy
+import warnings
+from itertools import repeat
+
+import numpy as np
+
+from density_logic import DensityCalculator
+from mc_engine import daily_draws, daily_from_draws, daily_kernel_params, worker_pool
+from rng_streams import seed_sequence, stream_seed, uniform_block
+
+# Выходы модели, для которых считаются индексы
+SENSITIVITY_OUTPUTS = ('total_hours', 'overload_probability')
+
+SENSITIVITY_MODELS = ('daily', 'density')
+
+# Диапазон по умолчанию: текущее значение +- 20%
+DEFAULT_SPREAD = 0.2
+
+
+def parse_path(path):
+    """
+    Путь к параметру: строка через точку ('UNIFIED_PARAMS.city_detour_factors.Москва',
+    'cities_data.Москва.waiting_time_range.1') или кортеж ключей; числа - индексы кортежей
+    """
+    if isinstance(path, str):
+        return tuple(int(key) if key.isdigit() else key for key in path.split('.'))
+    return tuple(path)
+
+
+def get_value(params, path):
+    value = params
+    for key in path:
+        value = value[key]
+    return value
+
+
+def set_value(params, path, value):
+    """Запись значения по пути; кортежи (диапазоны) пересобираются"""
+    *parents, last = path
+    container = params
+    holders = []
+    for key in parents:
+        holders.append((container, key))
+        container = container[key]
+    if isinstance(container, tuple):
+        items = list(container)
+        items[last] = value
+        holder, key = holders[-1]
+        holder[key] = tuple(items)
+    else:
+        container[last] = value
+
+
+def resolve_parameters(params, parameters, spread=DEFAULT_SPREAD):
+    """
+    [(имя, путь, (low, high))] из списка путей (диапазон - текущее значение +- spread)
+    или словаря {путь: (low, high)}
+    """
+    if not isinstance(parameters, dict):
+        parameters = {path: None for path in parameters}
+
+    resolved = []
+    for name, bounds in parameters.items():
+        path = parse_path(name)
+        if bounds is None:
+            current = float(get_value(params, path))
+            bounds = (current * (1 - spread), current * (1 + spread))
+        low, high = float(bounds[0]), float(bounds[1])
+        if not low < high:
+            raise ValueError(f"Пустой диапазон параметра {name}: {bounds}")
+        resolved.append(('.'.join(str(key) for key in path), path, (low, high)))
+    return resolved
+
+
+def default_parameters(model, city, spec_key, transport_type, density_spec_key):
+    """
+    Спорные параметры, которые читает ядро модели (диапазон - текущее значение +- spread):
+    дневная модель - время визита, объезд, скорость и ожидание транспорта, расстояние;
+    модель плотности - отсутствие врача, возврат в поликлинику, врачи на поликлинику
+    """
+    if model == 'density':
+        return [
+            f'cities_data.{city}.doctor_absence_probability',
+            f'cities_data.{city}.same_clinic_probability',
+            f'cities_data.{city}.doctors_per_polyclinic.{density_spec_key}'
+        ]
+    visit_prefix = 'pharmacy' if spec_key == 'pharmacy' else 'doctor'
+    return [
+        f'UNIFIED_PARAMS.{visit_prefix}_visit_avg',
+        f'UNIFIED_PARAMS.city_detour_factors.{city}',
+        f'UNIFIED_PARAMS.transport_speed_kmh.{transport_type}',
+        f'UNIFIED_PARAMS.transport_waiting_min.{transport_type}',
+        f'cities_data.{city}.avg_distance_km'
+    ]
+
+
+def saltelli_points(bounds, base_samples, rng, sampler='sobol'):
+    """
+    Точки схемы Салтелли: матрицы A, B (base_samples, k) и A_B^(i) - A со столбцом i из B.
+    Возвращает массив (base_samples * (k + 2), k) в порядке A, B, A_B^(1..k)
+    """
+    bounds = np.asarray(bounds, dtype=float)
+    k = len(bounds)
+    u = uniform_block(rng, base_samples, 2 * k, sampler)
+    low, span = bounds[:, 0], bounds[:, 1] - bounds[:, 0]
+    a = low + span * u[:, :k]
+    b = low + span * u[:, k:]
+
+    blocks = [a, b]
+    for i in range(k):
+        ab = a.copy()
+        ab[:, i] = b[:, i]
+        blocks.append(ab)
+    return np.vstack(blocks)
+
+
+def sobol_indices(outputs, base_samples, k):
+    """
+    Индексы первого порядка (оценка Салтелли 2010) и полные (Янсен)
+    по выходам в порядке saltelli_points. Выходы центрируются: несмещённость
+    не меняется, а дисперсия оценки первого порядка не растёт со средним
+    """
+    y = np.asarray(outputs, dtype=float).reshape(k + 2, base_samples)
+    y = y - y[:2].mean()
+    y_a, y_b, y_ab = y[0], y[1], y[2:]
+    variance = np.var(np.concatenate([y_a, y_b]))
+    if variance <= 0:
+        return np.zeros(k), np.zeros(k), 0.0
+    first = np.mean(y_b * (y_ab - y_a), axis=1) / variance
+    total = 0.5 * np.mean((y_a - y_ab) ** 2, axis=1) / variance
+    return first, total, float(variance)
+
+
+def bootstrap_indices(outputs, base_samples, k, rng, resamples=200, confidence=0.95):
+    """Доверительные интервалы индексов бутстрепом по строкам базовых матриц"""
+    y = np.asarray(outputs, dtype=float).reshape(k + 2, base_samples)
+    firsts, totals = [], []
+    for _ in range(resamples):
+        rows = rng.integers(0, base_samples, base_samples)
+        first, total, _ = sobol_indices(y[:, rows].ravel(), base_samples, k)
+        firsts.append(first)
+        totals.append(total)
+    tail = (1 - confidence) / 2 * 100
+    return (np.percentile(firsts, [tail, 100 - tail], axis=0),
+            np.percentile(totals, [tail, 100 - tail], axis=0))
+
+
+def _model_draws(model_args, rng):
+    """Общие случайные числа для всех точек блока"""
+    iterations = model_args['inner_iterations']
+    if model_args['model'] == 'daily':
+        return daily_draws(model_args['num_visits'], iterations, rng, model_args['sampler'])
+
+    factors = DensityCalculator(model_args['base']['cities_data']).calculate_density_factors(
+        model_args['city'], model_args['specialization'])
+    district_dims = factors['districts'] + 1
+    return {
+        'district_draws': rng.random((iterations, district_dims)),
+        'group_draws': rng.random((iterations, model_args['num_visits'], DensityCalculator.VISIT_GROUP_DRAWS))
+    }
+
+
+def _evaluate(model_args, params, draws):
+    """(среднее total_hours, вероятность переработки в %) в одной точке параметров"""
+    max_work_hours = params['UNIFIED_PARAMS']['max_work_hours_per_day']
+    if model_args['model'] == 'daily':
+        day_params = daily_kernel_params(params['UNIFIED_PARAMS'], params['cities_data'], model_args['city'],
+                                         model_args['spec_key'], model_args['num_visits'],
+                                         model_args['transport_type'])
+        total_hours = daily_from_draws(day_params, draws)['total_hours']
+    else:
+        calculator = DensityCalculator(params['cities_data'])
+        factors = calculator.calculate_density_factors(model_args['city'], model_args['specialization'])
+        total_hours = calculator._density_batch_from_draws(
+            model_args['city'], factors, model_args['num_visits'], model_args['transport_type'],
+            draws['district_draws'], draws['group_draws'])['total_hours']
+    return float(total_hours.mean()), float(np.mean(total_hours > max_work_hours) * 100)
+
+
+def sensitivity_block(model_args, points, seed_seq):
+    """
+    Задача для пула процессов: выходы модели в блоке точек параметров.
+    Все блоки берут одни и те же случайные числа (seed_seq) - выход модели
+    гладко зависит от параметров, шум Монте-Карло не попадает в индексы
+    """
+    draws = _model_draws(model_args, np.random.default_rng(seed_seq))
+    outputs = np.empty((len(points), len(SENSITIVITY_OUTPUTS)))
+    for row, point in enumerate(points):
+        params = copy.deepcopy(model_args['base'])
+        for path, value in zip(model_args['paths'], point):
+            set_value(params, path, float(value))
+        outputs[row] = _evaluate(model_args, params, draws)
+    return outputs
+
+
+def inert_parameters(model_args, parameters, seed_seq):
+    """
+    Имена параметров, от которых выходы ядра не зависят: на общих случайных числах
+    выходы на нижней и верхней границах диапазона совпадают (ядро параметр не читает,
+    как waiting_time_range в дневной модели). Их индексы были бы нулевыми
+    и выглядели бы как "неважный параметр"
+    """
+    model_args = dict(model_args, paths=[path for _, path, _ in parameters])
+    base_point = [float(get_value(model_args['base'], path)) for _, path, _ in parameters]
+    points = []
+    for column, (_, _, bounds) in enumerate(parameters):
+        for value in bounds:
+            point = list(base_point)
+            point[column] = value
+            points.append(point)
+    outputs = sensitivity_block(model_args, np.array(points), seed_seq)
+    return [name for column, (name, _, _) in enumerate(parameters)
+            if np.array_equal(outputs[2 * column], outputs[2 * column + 1])]
+
+
+def run_sensitivity(model_args, parameters, base_samples=512, random_seed=None, workers=1, block_size=256,
+                    sampler='sobol', confidence=0.95):
+    """
+    Анализ чувствительности: base_samples * (k + 2) оценок модели.
+    model_args - модель ('daily' / 'density'), город, специализация, число визитов,
+    транспорт, inner_iterations, base - словари параметров;
+    parameters - [(имя, путь, (low, high))] (см. resolve_parameters); параметры,
+    не влияющие на выходы ядра (inert_parameters), исключаются с предупреждением
+    и перечисляются в 'ignored_parameters'.
+    Поток 0 - точки Салтелли, 1 - общие случайные числа модели, 2 - бутстреп
+    """
+    root = seed_sequence(random_seed)
+    ignored = inert_parameters(model_args, parameters, stream_seed(root, 1))
+    if ignored:
+        warnings.warn(f"Параметры не влияют на выходы модели {model_args['model']} и исключены из анализа: "
+                      f"{', '.join(ignored)}")
+        parameters = [parameter for parameter in parameters if parameter[0] not in ignored]
+    if not parameters:
+        raise ValueError("Нет параметров, влияющих на выходы модели")
+    bounds = [bounds for _, _, bounds in parameters]
+    k = len(parameters)
+    points = saltelli_points(bounds, base_samples, np.random.default_rng(stream_seed(root, 0)), sampler)
+    model_args = dict(model_args, paths=[path for _, path, _ in parameters])
+
+    blocks = [points[start:start + block_size] for start in range(0, len(points), block_size)]
+    inner_seed = stream_seed(root, 1)
+    with worker_pool(workers, len(blocks)) as pool:
+        mapper = map if pool is None else pool.map
+        parts = list(mapper(sensitivity_block, repeat(model_args), blocks, repeat(inner_seed)))
+    outputs = np.vstack(parts)
+
+    names = [name for name, _, _ in parameters]
+    boot_rng = np.random.default_rng(stream_seed(root, 2))
+    results = {}
+    for column, output in enumerate(SENSITIVITY_OUTPUTS):
+        values = outputs[:, column]
+        first, total, variance = sobol_indices(values, base_samples, k)
+        first_ci, total_ci = bootstrap_indices(values, base_samples, k, boot_rng, confidence=confidence)
+        results[output] = {
+            'mean': float(values[:2 * base_samples].mean()),
+            'variance': variance,
+            'first_order': dict(zip(names, first.tolist())),
+            'total': dict(zip(names, total.tolist())),
+            'first_order_ci': {name: (float(first_ci[0][i]), float(first_ci[1][i])) for i, name in enumerate(names)},
+            'total_ci': {name: (float(total_ci[0][i]), float(total_ci[1][i])) for i, name in enumerate(names)},
+            'ranking': [names[i] for i in np.argsort(-total)]
+        }
+
+    return {
+        'outputs': results,
+        'parameters': {name: bounds for name, _, bounds in parameters},
+        'ignored_parameters': ignored,
+        'evaluations': len(points),
+        'model_days': len(points) * model_args['inner_iterations']
+    }
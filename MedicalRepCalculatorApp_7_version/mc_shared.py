@@ -0,0 +1,77 @@
+"""
+Сырые итерации Монте-Карло в общей памяти (multiprocessing.shared_memory):
+процессы пула пишут строки своего чанка прямо в общие массивы, сырые данные
+не сериализуются через pickle и не передаются родителю по каналу пула.
+"""
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from mc_stats import compact_raw
+
+
+def raw_schema(batch):
+    """{показатель: dtype} сырых массивов чанка в компактном виде (см. compact_raw)"""
+    return {key: compact_raw(np.asarray(values)[:0]).dtype.str for key, values in batch.items()}
+
+
+class SharedRawBuffers:
+    """
+    Массивы сырых итераций в сегментах общей памяти, по сегменту на показатель.
+    Создатель (owner) удаляет сегменты при close(); процессы пула подключаются
+    по spec() - имена сегментов, типы и длина, без данных.
+    Представления arrays действительны до close(): что нужно дольше - копировать.
+    """
+
+    def __init__(self, schema, size, names=None):
+        self.schema = dict(schema)
+        self.size = int(size)
+        self.owner = names is None
+        self._segments = {}
+        self.arrays = {}
+        try:
+            for key, dtype in self.schema.items():
+                dtype = np.dtype(dtype)
+                if self.owner:
+                    segment = shared_memory.SharedMemory(create=True, size=max(1, self.size * dtype.itemsize))
+                else:
+                    segment = shared_memory.SharedMemory(name=names[key])
+                self._segments[key] = segment
+                self.arrays[key] = np.ndarray((self.size,), dtype=dtype, buffer=segment.buf)
+        except BaseException:
+            self.close()
+            raise
+
+    def spec(self):
+        """Описание для подключения из другого процесса (передаётся вместо данных)"""
+        return self.schema, self.size, {key: segment.name for key, segment in self._segments.items()}
+
+    @classmethod
+    def attach(cls, spec):
+        schema, size, names = spec
+        return cls(schema, size, names)
+
+    def write(self, offset, batch):
+        """Запись чанка в строки offset..offset + n (с приведением к типам схемы)"""
+        for key, values in batch.items():
+            values = np.asarray(values)
+            self.arrays[key][offset:offset + len(values)] = values
+
+    def close(self):
+        """
+        Отключение от сегментов (создатель их ещё и удаляет). Внешние представления
+        arrays к этому моменту должны быть отпущены, иначе сегмент не закрыть
+        """
+        self.arrays = {}
+        for segment in self._segments.values():
+            segment.close()
+            if self.owner:
+                segment.unlink()
+        self._segments = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,503 @@
+"""
+Потоковая статистика Монте-Карло: накопители, которые заполняются
+по чанкам и объединяются (merge) без хранения всех итераций
+"""
+
+import math
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+# Вероятностные показатели статистики и соответствующие булевы флаги
+PROBABILITY_FLAGS = {
+    'overload_probability': 'is_overloaded',
+    'optimal_probability': 'is_optimal'
+}
+
+
+class StreamingMoments:
+    """Среднее, дисперсия (Уэлфорд / Чан), минимум и максимум одного показателя"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, values):
+        """Добавление пакета значений"""
+        values = np.asarray(values, dtype=float)
+        if values.size == 0:
+            return
+
+        batch = StreamingMoments()
+        batch.count = int(values.size)
+        batch.mean = float(values.mean())
+        batch.m2 = float(np.square(values - batch.mean).sum())
+        batch.min = float(values.min())
+        batch.max = float(values.max())
+        self.merge(batch)
+
+    def merge(self, other):
+        """Объединение с другим накопителем (формула Чана)"""
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self):
+        """Дисперсия выборки как в np.std (ddof=0)"""
+        return self.m2 / self.count if self.count > 0 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(max(0.0, self.variance)) if self.count > 1 else 0.0
+
+
+class CoMoments:
+    """Совместные моменты пары (x, y) для регрессионной оценки с контрольной переменной"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.m2_x = 0.0
+        self.m2_y = 0.0
+        self.c_xy = 0.0
+
+    def update(self, x, y):
+        """Добавление пакета пар"""
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        if x.size == 0:
+            return
+
+        batch = CoMoments()
+        batch.count = int(x.size)
+        batch.mean_x = float(x.mean())
+        batch.mean_y = float(y.mean())
+        batch.m2_x = float(np.square(x - batch.mean_x).sum())
+        batch.m2_y = float(np.square(y - batch.mean_y).sum())
+        batch.c_xy = float(((x - batch.mean_x) * (y - batch.mean_y)).sum())
+        self.merge(batch)
+
+    def merge(self, other):
+        """Объединение (формула Чана для ковариации)"""
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.__dict__.update(other.__dict__)
+            return
+
+        count = self.count + other.count
+        delta_x = other.mean_x - self.mean_x
+        delta_y = other.mean_y - self.mean_y
+        weight = self.count * other.count / count
+        self.m2_x += other.m2_x + delta_x * delta_x * weight
+        self.m2_y += other.m2_y + delta_y * delta_y * weight
+        self.c_xy += other.c_xy + delta_x * delta_y * weight
+        self.mean_x += delta_x * other.count / count
+        self.mean_y += delta_y * other.count / count
+        self.count = count
+
+    def estimate(self, control_mean=None):
+        """
+        Оценка среднего y и её дисперсия. Если известно точное среднее x
+        (control_mean), применяется контрольная переменная:
+        y - b (x - E[x]), b = cov(x, y) / var(x); дисперсия падает в 1 / (1 - rho^2) раз.
+        """
+        if self.count < 2:
+            return self.mean_y, 0.0
+        var_y = self.m2_y / (self.count - 1)
+        if control_mean is None or self.m2_x <= 0:
+            return self.mean_y, var_y / self.count
+
+        coefficient = self.c_xy / self.m2_x
+        residual = max(0.0, self.m2_y - coefficient * self.c_xy) / (self.count - 1)
+        return self.mean_y - coefficient * (self.mean_x - control_mean), residual / self.count
+
+
+class TDigest:
+    """
+    Объединяемый квантильный скетч (t-digest, масштаб k1).
+    Сжатие выполняется векторно: точки сортируются и группируются
+    по целой части k(q), поэтому размер скетча ~ compression / 2 центроидов.
+    """
+
+    def __init__(self, compression=400):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+    def update(self, values):
+        """Добавление пакета значений"""
+        values = np.asarray(values, dtype=float).ravel()
+        if values.size == 0:
+            return
+        self._compress(np.concatenate([self.means, values]),
+                       np.concatenate([self.weights, np.ones(values.size)]))
+
+    def merge(self, other):
+        """Объединение с другим скетчем"""
+        if other.weights.size == 0:
+            return
+        self._compress(np.concatenate([self.means, other.means]),
+                       np.concatenate([self.weights, other.weights]))
+
+    def _compress(self, means, weights):
+        order = np.argsort(means, kind='mergesort')
+        means, weights = means[order], weights[order]
+
+        # Пока точек мало - храним их как есть (квантили точные)
+        if means.size <= self.compression:
+            self.means, self.weights = means, weights
+            return
+
+        cumulative = np.cumsum(weights)
+        q_mid = (cumulative - weights / 2) / cumulative[-1]
+        k = self.compression / (2 * math.pi) * np.arcsin(2 * q_mid - 1)
+        bucket = np.floor(k)
+
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        merged_weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / merged_weights
+        self.weights = merged_weights
+
+    def quantile(self, q, min_value=None, max_value=None):
+        """
+        Квантиль q (0..1). При единичных весах совпадает
+        с np.percentile (линейная интерполяция)
+        """
+        if self.weights.size == 0:
+            return 0.0
+        if self.weights.size == 1:
+            return float(self.means[0])
+
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2
+        rank = q * (total - 1) + 0.5
+
+        lo = self.means[0] if min_value is None else min_value
+        hi = self.means[-1] if max_value is None else max_value
+        xs = np.r_[0.0, centers, total]
+        ys = np.r_[lo, self.means, hi]
+        return float(np.interp(rank, xs, ys))
+
+
+def compact_raw(values):
+    """
+    Компактный тип для хранения сырых итераций: float -> float32,
+    целые счётчики -> int16, флаги остаются bool
+    """
+    values = np.asarray(values)
+    if values.dtype == bool:
+        return values
+    if np.issubdtype(values.dtype, np.integer):
+        return values.astype(np.int16)
+    return values.astype(np.float32)
+
+
+def raw_frame(raw_results):
+    """DataFrame поверх словаря сырых массивов без копирования столбцов"""
+    return pd.DataFrame(raw_results, copy=False)
+
+
+def wilson_interval(successes, count, confidence=0.95):
+    """Интервал Уилсона для доли successes / count (в долях, без процентов)"""
+    if count <= 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = successes / count
+    denominator = 1 + z * z / count
+    centre = (p + z * z / (2 * count)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / count + z * z / (4 * count * count)) / denominator
+    return max(0.0, centre - half_width), min(1.0, centre + half_width)
+
+
+def _binary_percentile(true_count, count, q):
+    """Точный np.percentile для булевого массива по числу True"""
+    if count == 0:
+        return 0.0
+    false_count = count - true_count
+    position = q * (count - 1)
+    lower = 0.0 if math.floor(position) < false_count else 1.0
+    upper = 0.0 if math.ceil(position) < false_count else 1.0
+    return lower + (upper - lower) * (position - math.floor(position))
+
+
+class MCAccumulator:
+    """
+    Накопитель результатов Монте-Карло: для числовых показателей - моменты
+    и t-digest, для булевых (is_overloaded, is_optimal) - счётчики.
+    Сырые итерации сохраняются только при keep_raw=True.
+
+    Снижение дисперсии средних:
+    antithetic=True - чанк состоит из базовых точек и их зеркальных пар
+    (пара i - строки i и ceil(n/2) + i), оценки строятся по средним пар;
+    control=(показатель, точное среднее) - контрольная переменная для остальных.
+    """
+
+    def __init__(self, keep_raw=False, compression=400, antithetic=False, control=None):
+        self.keep_raw = keep_raw
+        self.compression = compression
+        self.antithetic = antithetic
+        self.control = tuple(control) if control is not None else None
+        self.count = 0
+        self.moments = {}
+        self.digests = {}
+        self.true_counts = {}
+        self.raw_chunks = {}
+        self.estimators = {}  # Совместные моменты (контроль, показатель) по независимым единицам
+
+    @property
+    def variance_reduction(self):
+        return self.antithetic or self.control is not None
+
+    def _update_estimators(self, batch):
+        """Независимые единицы выборки: итерации или средние антитетических пар"""
+        units = {}
+        for key, values in batch.items():
+            values = np.asarray(values, dtype=float)
+            if self.antithetic:
+                pairs = len(values) // 2
+                start = len(values) - pairs
+                values = (values[:pairs] + values[start:start + pairs]) / 2
+            units[key] = values
+
+        control_key = self.control[0] if self.control is not None else None
+        for key, values in units.items():
+            x = units[control_key] if control_key in units else values
+            self.estimators.setdefault(key, CoMoments()).update(x, values)
+
+    def update(self, batch):
+        """Добавление чанка: словарь {показатель: массив значений}"""
+        if self.variance_reduction:
+            self._update_estimators(batch)
+
+        batch_size = 0
+        for key, values in batch.items():
+            values = np.asarray(values)
+            batch_size = max(batch_size, len(values))
+
+            if values.dtype == bool:
+                self.true_counts[key] = self.true_counts.get(key, 0) + int(values.sum())
+                self.moments.setdefault(key, StreamingMoments()).update(values)
+            else:
+                self.moments.setdefault(key, StreamingMoments()).update(values)
+                self.digests.setdefault(key, TDigest(self.compression)).update(values)
+
+            if self.keep_raw:
+                self.raw_chunks.setdefault(key, []).append(compact_raw(values))
+
+        self.count += batch_size
+
+    def merge(self, other):
+        """Объединение с накопителем другого чанка (порядок объединения фиксирован вызывающим)"""
+        for key, moments in other.moments.items():
+            self.moments.setdefault(key, StreamingMoments()).merge(moments)
+        for key, digest in other.digests.items():
+            self.digests.setdefault(key, TDigest(self.compression)).merge(digest)
+        for key, true_count in other.true_counts.items():
+            self.true_counts[key] = self.true_counts.get(key, 0) + true_count
+        for key, estimator in other.estimators.items():
+            self.estimators.setdefault(key, CoMoments()).merge(estimator)
+        if self.keep_raw:
+            for key, chunks in other.raw_chunks.items():
+                self.raw_chunks.setdefault(key, []).extend(chunks)
+        self.count += other.count
+
+    def half_width(self, target, confidence=0.95):
+        """
+        Полуширина доверительного интервала: для среднего показателя - нормальная,
+        для вероятности (overload_probability, в п.п.) - интервал Уилсона,
+        который не схлопывается в ноль при 0% / 100%.
+        None - показателя нет в накопителе.
+        """
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+
+        flag = PROBABILITY_FLAGS.get(target)
+        if self.variance_reduction:
+            estimate = self.mean_estimate(flag or target)
+            if estimate is None:
+                return None
+            # Вероятность без разброса (0% / 100%) - интервал Уилсона ниже
+            if flag is None or estimate[1] > 0:
+                return z * math.sqrt(estimate[1]) * (100 if flag else 1)
+
+        if flag is not None:
+            if flag not in self.true_counts or self.moments[flag].count == 0:
+                return None
+            n = self.moments[flag].count
+            p = self.true_counts[flag] / n
+            spread = math.sqrt(p * (1 - p) / n + z * z / (4 * n * n))
+            return 100 * z * spread / (1 + z * z / n)
+
+        moments = self.moments.get(target)
+        if moments is None or moments.count == 0:
+            return None
+        return z * moments.std / math.sqrt(moments.count)
+
+    def mean_estimate(self, key):
+        """
+        Оценка среднего показателя с учётом снижения дисперсии: (среднее, дисперсия оценки).
+        Для самого контрольного показателя среднее известно точно.
+        None - показателя нет или снижение дисперсии не включено.
+        """
+        estimator = self.estimators.get(key)
+        if estimator is None or estimator.count == 0:
+            return None
+        if self.control is not None and key == self.control[0]:
+            return float(self.control[1]), 0.0
+        control_mean = self.control[1] if self.control is not None else None
+        return estimator.estimate(control_mean)
+
+    def variance_reduction_report(self):
+        """
+        Оценки средних со снижением дисперсии и достигнутый выигрыш:
+        variance_reduction = дисперсия обычного среднего / дисперсия оценки
+        (во сколько раз меньше итераций нужно для того же интервала)
+        """
+        names = {flag: name for name, flag in PROBABILITY_FLAGS.items()}
+        estimates = {}
+        for key, estimator in self.estimators.items():
+            moments = self.moments.get(key)
+            if moments is None or moments.count < 2 or estimator.count < 2:
+                continue
+            mean, variance = self.mean_estimate(key)
+            plain_variance = moments.m2 / (moments.count - 1) / moments.count
+            scale = 100 if key in names else 1
+
+            estimates[names.get(key, key)] = {
+                'mean': float(mean * scale),
+                'plain_mean': float(moments.mean * scale),
+                'std_error': float(math.sqrt(variance) * scale),
+                'plain_std_error': float(math.sqrt(plain_variance) * scale),
+                'variance_reduction': (float(plain_variance / variance) if variance > 0
+                                       else 1.0 if plain_variance == 0 else math.inf)
+            }
+
+        return {
+            'antithetic': self.antithetic,
+            'control': self.control[0] if self.control is not None else None,
+            'control_mean': float(self.control[1]) if self.control is not None else None,
+            'estimates': estimates
+        }
+
+    def estimates(self):
+        """
+        Лучшая текущая оценка среднего каждого показателя и её стандартная ошибка
+        (со снижением дисперсии, если оно включено); вероятности - в п.п.
+        """
+        names = {flag: name for name, flag in PROBABILITY_FLAGS.items()}
+        estimates = {}
+        for key, moments in self.moments.items():
+            if moments.count == 0:
+                continue
+            estimator = self.estimators.get(key)
+            if estimator is not None and estimator.count >= 2:
+                mean, variance = self.mean_estimate(key)
+            else:
+                mean = moments.mean
+                variance = moments.m2 / (moments.count - 1) / moments.count if moments.count > 1 else math.nan
+            scale = 100 if key in names else 1
+
+            estimates[names.get(key, key)] = {
+                'mean': float(mean * scale),
+                'std_error': float(math.sqrt(variance) * scale)
+            }
+        return estimates
+
+    def convergence(self, tolerances, confidence=0.95):
+        """
+        Достигнутая точность по целевым показателям {показатель: допуск}.
+        Показатели, которых нет в накопителе, пропускаются.
+        """
+        targets = {}
+        for target, tolerance in tolerances.items():
+            half_width = self.half_width(target, confidence)
+            if half_width is None:
+                continue
+            targets[target] = {
+                'half_width': float(half_width),
+                'tolerance': float(tolerance),
+                'converged': bool(half_width <= tolerance)
+            }
+
+        return {
+            'converged': bool(targets) and all(t['converged'] for t in targets.values()),
+            'confidence': confidence,
+            'iterations': self.count,
+            'targets': targets
+        }
+
+    def raw_results(self):
+        """
+        Сырые итерации (только при keep_raw=True): словарь непрерывных
+        типизированных массивов (float32 / int16 / bool), см. raw_frame
+        """
+        return {key: np.concatenate(chunks) for key, chunks in self.raw_chunks.items()}
+
+    def statistics(self):
+        """Статистика в формате _calculate_mc_statistics"""
+        stats = {}
+
+        for key, moments in self.moments.items():
+            if moments.count == 0:
+                continue
+
+            if key in self.true_counts:
+                true_count = self.true_counts[key]
+                quantile = lambda q: _binary_percentile(true_count, moments.count, q)
+            else:
+                digest = self.digests[key]
+                quantile = lambda q: digest.quantile(q, moments.min, moments.max)
+
+            stats[key] = {
+                'mean': float(moments.mean),
+                'median': quantile(0.5),
+                'std': moments.std,
+                'min': float(moments.min),
+                'max': float(moments.max)
+            }
+
+            # Процентили (если достаточно данных)
+            if moments.count >= 5:
+                stats[key]['p5'] = quantile(0.05)
+                stats[key]['p95'] = quantile(0.95)
+
+        # Вероятности по булевым счётчикам
+        if 'is_overloaded' in self.true_counts and self.moments['is_overloaded'].count > 0:
+            overload_prob = self.true_counts['is_overloaded'] / self.moments['is_overloaded'].count * 100
+            stats['overload_probability'] = {
+                'value': float(overload_prob),
+                'description': f"Вероятность переработки (>8 часов): {overload_prob:.1f}%"
+            }
+
+        if 'is_optimal' in self.true_counts and self.moments['is_optimal'].count > 0:
+            optimal_prob = self.true_counts['is_optimal'] / self.moments['is_optimal'].count * 100
+            stats['optimal_probability'] = {
+                'value': float(optimal_prob),
+                'description': f"Вероятность оптимального дня: {optimal_prob:.1f}%"
+            }
+
+        if self.variance_reduction:
+            stats['variance_reduction'] = self.variance_reduction_report()
+
+        return stats
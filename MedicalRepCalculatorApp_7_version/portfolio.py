@@ -0,0 +1,311 @@
+"""
+Пакетный расчёт портфеля проектов (бренд x город x специализация) из CSV / Parquet:
+минимальная и оптимальная численность и напряжённость для каждой строки.
+Упрощённый метод (calculate_city_load) считается векторно по всей таблице,
+метод с плотностью - одной симуляцией дней на группу строк
+(город, специализация, транспорт, визитов на врача), группы - в пуле процессов.
+"""
+
+import hashlib
+import math
+import os
+import time
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+from density_logic import DensityCalculator
+from mc_engine import worker_pool
+from scenario_engine import (SIMPLE_CITY_FACTORS, SIMPLE_EFFICIENCY, SIMPLE_OPTIMAL_LOAD, SIMPLE_VISIT_HOURS,
+                             project_status)
+
+# Обязательные столбцы таблицы проектов
+PORTFOLIO_COLUMNS = (
+    'city',
+    'specialization',
+    'transport_type',
+    'total_visits_needed',
+    'visits_per_doctor',
+    'project_calendar_days'
+)
+
+# Необязательные столбцы и значения по умолчанию
+PORTFOLIO_DEFAULTS = {
+    'work_days_per_week': 5,
+    'max_work_hours_per_day': 8
+}
+
+PORTFOLIO_METHODS = ('simple', 'density')
+
+# Дней симуляции на группу (как в calculate_city_load_with_density)
+DENSITY_PROJECT_DAYS = 30
+
+# Групп density на одну задачу пула
+DENSITY_BLOCK_SIZE = 64
+
+NUMERIC_COLUMNS = PORTFOLIO_COLUMNS[3:] + tuple(PORTFOLIO_DEFAULTS)
+
+
+def read_portfolio(path):
+    """Таблица проектов из .csv или .parquet (для Parquet нужен pyarrow или fastparquet)"""
+    if str(path).lower().endswith('.parquet'):
+        frame = pd.read_parquet(path)
+    else:
+        frame = pd.read_csv(path)
+    return prepare_portfolio(frame)
+
+
+def prepare_portfolio(frame):
+    """Проверка столбцов, значения по умолчанию, числовые типы (нечисловое - NaN)"""
+    if len(frame) == 0:
+        raise ValueError("В таблице проектов нет ни одного проекта")
+    missing = [column for column in PORTFOLIO_COLUMNS if column not in frame.columns]
+    if missing:
+        raise ValueError(f"В таблице проектов нет столбцов: {', '.join(missing)}")
+
+    frame = frame.copy()
+    for column, default in PORTFOLIO_DEFAULTS.items():
+        if column not in frame.columns:
+            frame[column] = default
+    for column in NUMERIC_COLUMNS:
+        frame[column] = pd.to_numeric(frame[column], errors='coerce')
+    return frame
+
+
+def write_portfolio(frame, path):
+    """Запись результатов: .parquet, .xlsx или CSV"""
+    path = str(path)
+    if path.lower().endswith('.parquet'):
+        frame.to_parquet(path, index=False)
+    elif path.lower().endswith('.xlsx'):
+        frame.to_excel(path, index=False)
+    else:
+        frame.to_csv(path, index=False, encoding='utf-8-sig')
+
+
+def simple_load(frame):
+    """
+    Нагрузка проектов по формулам и поправкам _simple_city_load для всех строк сразу
+    (массивы без округления; available_hours - доступные часы одного медпреда за проект)
+    """
+    pharmacy = frame['specialization'].astype(str).str.lower().str.contains('аптек', regex=False).to_numpy()
+    city_factor = frame['city'].map(SIMPLE_CITY_FACTORS).fillna(1.0).to_numpy(dtype=float)
+    time_per_visit = np.where(pharmacy, SIMPLE_VISIT_HOURS['pharmacy'], SIMPLE_VISIT_HOURS['doctor']) * city_factor
+
+    visits_per_doctor = frame['visits_per_doctor'].to_numpy(dtype=float)
+    visits_per_doctor = np.where(visits_per_doctor <= 0, 1, visits_per_doctor)
+    unique_doctors = np.ceil(frame['total_visits_needed'].to_numpy(dtype=float) / visits_per_doctor)
+    total_hours = unique_doctors * time_per_visit
+
+    days = frame['project_calendar_days'].to_numpy(dtype=float)
+    days = np.where(days <= 0, 30, days)
+    total_work_days = days / 7 * frame['work_days_per_week'].to_numpy(dtype=float)
+    total_project_hours = total_work_days * frame['max_work_hours_per_day'].to_numpy(dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        available_hours = np.where(total_project_hours > 0, total_project_hours * SIMPLE_EFFICIENCY, 1)
+        min_reps = np.ceil(total_hours / available_hours)
+        optimal_reps = np.ceil(total_hours / (available_hours * SIMPLE_OPTIMAL_LOAD))
+        optimal_reps = np.where(optimal_reps < min_reps, min_reps + 1, optimal_reps)
+        intensity = np.where(total_project_hours > 0, total_hours / total_project_hours * 100, 0)
+
+    return {
+        'unique_doctors_needed': unique_doctors,
+        'time_per_doctor_hours': time_per_visit,
+        'total_time_all_doctors_hours': total_hours,
+        'total_project_hours': total_project_hours,
+        'available_hours': available_hours,
+        'min_reps_needed': min_reps,
+        'optimal_reps_needed': optimal_reps,
+        'project_intensity': intensity
+    }
+
+
+def simple_portfolio(frame):
+    """
+    Итоги calculate_city_load для всех строк сразу (те же формулы и поправки,
+    что в _simple_city_load, без построения сценариев)
+    """
+    load = simple_load(frame)
+    return _project_summary(frame, {
+        'unique_doctors_needed': load['unique_doctors_needed'],
+        'time_per_doctor_hours': np.round(load['time_per_doctor_hours'], 2),
+        'total_time_all_doctors_hours': np.round(load['total_time_all_doctors_hours'], 1),
+        'total_project_hours': np.round(load['total_project_hours'], 1),
+        'min_reps_needed': load['min_reps_needed'],
+        'optimal_reps_needed': load['optimal_reps_needed'],
+        'project_intensity': load['project_intensity']
+    })
+
+
+def group_seed(random_seed, key):
+    """Поток группы: выводится из random_seed и ключа группы (не зависит от порядка строк)"""
+    text = '|'.join(str(part) for part in key)
+    return [random_seed, int(hashlib.sha256(text.encode('utf-8')).hexdigest()[:8], 16)]
+
+
+def density_group_block(cities_data, groups, random_seed):
+    """
+    Задача для пула процессов: средние часы дня, доля успешных визитов и
+    коэффициент эффективности для групп (город, специализация, транспорт, визитов)
+    """
+    calculator = DensityCalculator(cities_data)
+    results = []
+    for key in groups:
+        city, specialization, transport_type, visits_per_doctor = key
+        try:
+            days = calculator.simulate_density_days(city, specialization, visits_per_doctor, transport_type,
+                                                    DENSITY_PROJECT_DAYS, random_seed=group_seed(random_seed, key))
+        except Exception as e:
+            results.append((math.nan, math.nan, math.nan, str(e)))
+            continue
+        density_factors = calculator.calculate_density_factors(city, specialization)
+        efficiency_factor = 0.90 if density_factors and density_factors['districts'] >= 8 else 0.85
+        results.append((float(np.mean(days['total_hours'])), float(np.mean(days['success_rate'])),
+                        efficiency_factor, None))
+    return results
+
+
+def density_load(frame, cities_data, random_seed=0, workers=1, block_size=DENSITY_BLOCK_SIZE):
+    """
+    Нагрузка проектов по формулам calculate_city_load_with_density (массивы без округления,
+    errors - ошибки симуляции групп по строкам): строка совпадает с одиночным
+    расчётом при random_seed=group_seed(random_seed, ключ группы)
+    """
+    keys = list(zip(frame['city'], frame['specialization'], frame['transport_type'],
+                    frame['visits_per_doctor'].fillna(0).astype(int)))
+    groups = list(dict.fromkeys(keys))
+    blocks = [groups[start:start + block_size] for start in range(0, len(groups), block_size)]
+    with worker_pool(workers, len(blocks)) as pool:
+        mapper = map if pool is None else pool.map
+        parts = list(mapper(density_group_block, repeat(cities_data), blocks, repeat(random_seed)))
+    by_group = dict(zip(groups, (result for part in parts for result in part)))
+
+    rows = [by_group[key] for key in keys]
+    avg_hours = np.array([row[0] for row in rows], dtype=float)
+    success_rate = np.array([row[1] for row in rows], dtype=float)
+    efficiency_factor = np.array([row[2] for row in rows], dtype=float)
+    errors = [row[3] for row in rows]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        effective_visits = frame['total_visits_needed'].to_numpy(dtype=float) / success_rate
+        unique_doctors = np.ceil(effective_visits / frame['visits_per_doctor'].to_numpy(dtype=float))
+        total_hours = unique_doctors * avg_hours
+        total_work_days = frame['project_calendar_days'].to_numpy(dtype=float) / 7 * \
+            frame['work_days_per_week'].to_numpy(dtype=float)
+        total_project_hours = total_work_days * frame['max_work_hours_per_day'].to_numpy(dtype=float)
+        available_hours = total_project_hours * efficiency_factor
+        min_reps = np.ceil(total_hours / available_hours)
+        optimal_reps = np.ceil(total_hours / (available_hours * 0.75))
+        intensity = np.where(total_project_hours > 0, total_hours / total_project_hours * 100, 0)
+
+    return {
+        'avg_hours_per_day': avg_hours,
+        'avg_success_rate': success_rate,
+        'efficiency_factor': efficiency_factor,
+        'unique_doctors_needed': unique_doctors,
+        'total_time_all_doctors_hours': total_hours,
+        'total_project_hours': total_project_hours,
+        'available_hours': available_hours,
+        'min_reps_needed': min_reps,
+        'optimal_reps_needed': optimal_reps,
+        'project_intensity': intensity,
+        'errors': errors
+    }
+
+
+def density_portfolio(frame, cities_data, random_seed=0, workers=1, block_size=DENSITY_BLOCK_SIZE):
+    """
+    Итоги calculate_city_load_with_density для всех строк: строка совпадает с
+    одиночным расчётом при random_seed=group_seed(random_seed, ключ группы)
+    """
+    load = density_load(frame, cities_data, random_seed, workers, block_size)
+    return _project_summary(frame, {
+        'avg_hours_per_day': np.round(load['avg_hours_per_day'], 2),
+        'avg_success_rate': np.round(load['avg_success_rate'] * 100, 1),
+        'efficiency_factor': load['efficiency_factor'],
+        'unique_doctors_needed': load['unique_doctors_needed'],
+        'total_time_all_doctors_hours': np.round(load['total_time_all_doctors_hours'], 1),
+        'total_project_hours': np.round(load['total_project_hours'], 1),
+        'min_reps_needed': load['min_reps_needed'],
+        'optimal_reps_needed': load['optimal_reps_needed'],
+        'project_intensity': load['project_intensity']
+    }, load['errors'])
+
+
+def valid_projects(frame, load):
+    """Строки с корректными параметрами и конечными итогами нагрузки (булев массив)"""
+    valid = np.isfinite(np.column_stack([load['min_reps_needed'], load['optimal_reps_needed'],
+                                         load['project_intensity']])).all(axis=1)
+    return valid & frame[list(NUMERIC_COLUMNS)].notna().all(axis=1).to_numpy()
+
+
+def _project_summary(frame, columns, errors=None):
+    """Таблица результатов: исходные столбцы, итоги и статус; ошибки строк - в столбце error"""
+    result = frame.copy()
+    for column, values in columns.items():
+        result[column] = values
+
+    valid = pd.Series(valid_projects(frame, columns), index=result.index)
+    error = pd.Series(np.where(valid, None, "Некорректные параметры проекта"), index=result.index)
+    if errors is not None:
+        error = pd.Series(errors, index=result.index).fillna(error)
+
+    for column in ('unique_doctors_needed', 'min_reps_needed', 'optimal_reps_needed'):
+        result[column] = result[column].where(valid).astype('Int64')
+    intensity = result['project_intensity'].where(valid)
+    result['project_intensity'] = intensity.round(1)
+    result['project_status'] = pd.Series(project_status(intensity.fillna(0).to_numpy())[0],
+                                         index=result.index).where(valid)
+    result['error'] = error
+    return result
+
+
+def calculate_portfolio(calculator, source, method='simple', output=None, random_seed=0, workers=1):
+    """
+    Расчёт портфеля: source - путь к CSV / Parquet или DataFrame, output - путь для
+    результатов. Возвращает (таблица результатов, отчёт о пропускной способности)
+    """
+    if method not in PORTFOLIO_METHODS:
+        raise ValueError(f"Неизвестный метод расчёта портфеля: {method}")
+
+    started = time.perf_counter()
+    frame = prepare_portfolio(source) if isinstance(source, pd.DataFrame) else read_portfolio(source)
+    loaded = time.perf_counter()
+    if method == 'density':
+        result = density_portfolio(frame, calculator.cities_data, random_seed, workers)
+    else:
+        result = simple_portfolio(frame)
+    calculated = time.perf_counter()
+    if output is not None:
+        write_portfolio(result, output)
+    finished = time.perf_counter()
+
+    rows = len(result)
+    report = {
+        'rows': rows,
+        'errors': int(result['error'].notna().sum()),
+        'method': method,
+        'read_time': loaded - started,
+        'calculation_time': calculated - loaded,
+        'write_time': finished - calculated,
+        'elapsed': finished - started,
+        'rows_per_second': rows / (calculated - loaded) if calculated > loaded else float('inf')
+    }
+    return result, report
+
+
+if __name__ == '__main__':
+    # Пакетный расчёт: python portfolio.py проекты.csv результаты.csv [simple|density] [workers]
+    import sys
+    from calculator_core import MedicalRepCalculatorGUI
+
+    if len(sys.argv) < 3:
+        print("Использование: python portfolio.py проекты.csv результаты.csv [simple|density] [workers]")
+        sys.exit(1)
+    method = sys.argv[3] if len(sys.argv) > 3 else 'simple'
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else os.cpu_count() or 1
+    _, report = calculate_portfolio(MedicalRepCalculatorGUI(), sys.argv[1], method, sys.argv[2], workers=workers)
+    print(f"Рассчитано {report['rows']} проектов за {report['elapsed']:.2f} с "
+          f"({report['rows_per_second']:.0f} строк/с, ошибок: {report['errors']})")
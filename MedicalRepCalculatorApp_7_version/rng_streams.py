@@ -0,0 +1,97 @@
+"""
+Потоки случайных чисел (numpy.random.Generator) для воспроизводимых симуляций.
+Глобальное состояние random / np.random не используется: каждый расчёт
+получает собственный генератор, дочерние потоки порождаются через SeedSequence.
+"""
+
+import warnings
+from statistics import NormalDist
+
+import numpy as np
+
+try:
+    from scipy.special import ndtri
+    from scipy.stats import qmc
+except ImportError:
+    ndtri = None
+    qmc = None
+
+# Способы получения равномерных чисел для ядер Монте-Карло:
+# псевдослучайные, scrambled Sobol, латинский гиперкуб
+SAMPLERS = ('random', 'sobol', 'lhs')
+
+
+def seed_sequence(random_seed=None):
+    """SeedSequence из seed (None - энтропия ОС, SeedSequence - как есть)"""
+    if isinstance(random_seed, np.random.SeedSequence):
+        return random_seed
+    return np.random.SeedSequence(random_seed)
+
+
+def root_sequence(random_seed=None, rng=None):
+    """
+    Корневой SeedSequence расчёта. Если передан готовый генератор rng,
+    корень детерминированно выводится из него (rng продвигается на 4 числа).
+    """
+    if rng is not None:
+        return np.random.SeedSequence(rng.integers(0, 2 ** 32, size=4).tolist())
+    return seed_sequence(random_seed)
+
+
+def make_rng(random_seed=None, rng=None):
+    """Генератор для одного расчёта: переданный rng или новый поток из random_seed"""
+    if rng is not None:
+        return rng
+    return np.random.default_rng(seed_sequence(random_seed))
+
+
+def stream_seed(random_seed, index):
+    """
+    Дочерний поток с номером index (эквивалент SeedSequence.spawn, но с прямым
+    доступом по номеру - не зависит от того, сколько потоков уже порождено)
+    """
+    root = seed_sequence(random_seed)
+    return np.random.SeedSequence(root.entropy,
+                                  spawn_key=tuple(root.spawn_key) + (int(index),),
+                                  pool_size=root.pool_size)
+
+
+def spawn_rngs(random_seed, count):
+    """Список независимых генераторов для параллельных задач"""
+    return [np.random.default_rng(stream_seed(random_seed, i)) for i in range(count)]
+
+
+def seed_entropy(random_seed=None):
+    """Энтропия корневого потока - позволяет воспроизвести расчёт без явного seed"""
+    return seed_sequence(random_seed).entropy
+
+
+def uniform_block(rng, n, dims, sampler='random'):
+    """
+    Матрица равномерных чисел (n, dims) на [0, 1).
+    'sobol' / 'lhs' - квазислучайные точки (scipy.stats.qmc), рандомизированные
+    из rng, поэтому каждый чанк - независимая реплика с равномерным покрытием.
+    """
+    if sampler not in SAMPLERS:
+        raise ValueError(f"Неизвестный способ выборки: {sampler}")
+    if sampler == 'random' or n == 0 or dims == 0:
+        return rng.random((n, dims))
+    if qmc is None:
+        raise ImportError(f"Для выборки '{sampler}' нужен scipy (scipy.stats.qmc)")
+
+    if sampler == 'sobol':
+        engine = qmc.Sobol(dims, scramble=True, seed=rng)
+        with warnings.catch_warnings():
+            # Префикс последовательности длины не 2^m - допустим, теряется лишь часть баланса
+            warnings.simplefilter('ignore', UserWarning)
+            return engine.random(n)
+    return qmc.LatinHypercube(dims, seed=rng).random(n)
+
+
+def normal_ppf(u):
+    """Обратная функция стандартного нормального распределения (векторно)"""
+    if ndtri is not None:
+        return ndtri(u)
+    inv_cdf = NormalDist().inv_cdf
+    u = np.clip(u, 1e-12, 1 - 1e-12)
+    return np.vectorize(inv_cdf, otypes=[float])(u)
@@ -0,0 +1,206 @@
+"""
+Таблицы сценариев проекта: для произвольного диапазона численности медпредов
+сроки, загрузка сроков и загрузка персонала считаются массивами NumPy,
+рекомендации назначаются векторными правилами (np.select).
+Здесь же общие константы упрощённого расчёта проекта, шкала напряжённости
+и таблицы укомплектования для распределения медпредов между проектами.
+"""
+
+import numpy as np
+
+# ★ Упрощённый расчёт проекта (calculate_city_load) ★
+# Часы на визит: аптека / врач; поправка города - выше плотность, меньше времени
+SIMPLE_VISIT_HOURS = {'pharmacy': 1.0, 'doctor': 1.5}
+SIMPLE_CITY_FACTORS = {
+    'Москва': 0.8,
+    'Санкт-Петербург': 0.9,
+    'Екатеринбург': 1.1,
+    'Новосибирск': 1.1,
+    'Казань': 1.0
+}
+SIMPLE_EFFICIENCY = 0.82  # 82% эффективности
+SIMPLE_OPTIMAL_LOAD = 0.75  # 75% загрузка оптимальна
+
+# Напряжённость проекта: (порог в %, статус, цвет, значок) по убыванию порога и уровень ниже всех порогов
+PROJECT_STATUS_LEVELS = (
+    (100, "критическая", "#e74c3c", "🔥"),
+    (85, "высокая", "#e74c3c", "⚠"),
+    (70, "средняя", "#f39c12", "⚠"),
+    (50, "нормальная", "#2ecc71", "✓")
+)
+PROJECT_STATUS_LOW = ("низкая", "#3498db", "ℹ")
+
+
+def project_status(intensity):
+    """(статус, цвет, значок) напряжённости intensity, % - для числа или массива"""
+    intensity = np.asarray(intensity)
+    conditions = [intensity > level[0] for level in PROJECT_STATUS_LEVELS]
+    return tuple(np.select(conditions, [level[i] for level in PROJECT_STATUS_LEVELS], PROJECT_STATUS_LOW[i - 1])
+                 for i in (1, 2, 3))
+
+
+def above(column, bound):
+    return lambda table: table[column] > bound
+
+
+def below(column, bound):
+    return lambda table: table[column] < bound
+
+
+def between(column, low, high):
+    return lambda table: (table[column] >= low) & (table[column] <= high)
+
+
+def flag(column):
+    return lambda table: table[column]
+
+
+def load_rules(minimal_label, faster_label):
+    """Правила по загрузке персонала и сроков (расчёт проекта без плотности)"""
+    return (
+        (flag('is_minimal'), minimal_label),
+        (flag('is_optimal'), "Оптимальное (рекомендуется)"),
+        (above('rep_utilization', 90), "Перегрузка персонала"),
+        (below('rep_utilization', 60), "Недогрузка персонала"),
+        (between('rep_utilization', 70, 85), "Хорошая загрузка"),
+        (below('time_utilization', 70), faster_label),
+        (None, "Приемлемый вариант")
+    )
+
+
+# ★ Наборы правил: (условие, метка), срабатывает первое; (None, метка) - по умолчанию ★
+LEGACY_RULES = load_rules("Минимальное (высокая напряжённость)", "⚡ Быстрее плана")
+LEGACY_SCENARIO_RULES = load_rules("Минимальное (напряжённый режим)", "Быстрее плана")
+PROJECT_RULES = load_rules("Минимальное (высокая напряжённость)", "Быстрее плана")
+
+DENSITY_RULES = (
+    (flag('is_minimal'), "Минимальное (напряжённый режим)"),
+    (flag('is_optimal'), "Оптимальное (рекомендуется)"),
+    (above('rep_utilization', 90), "Перегрузка"),
+    (below('rep_utilization', 60), "Недогрузка"),
+    (None, "Хорошая загрузка")
+)
+
+SIMPLE_RULES = (
+    (flag('is_minimal'), "Минимальное (высокая напряжённость)"),
+    (flag('is_optimal'), "Оптимальное (рекомендуется)"),
+    (above('rep_utilization', 95), "Сильная перегрузка"),
+    (above('rep_utilization', 90), "Перегрузка персонала"),
+    (below('rep_utilization', 50), "Сильная недогрузка"),
+    (below('rep_utilization', 60), "Недогрузка персонала"),
+    (between('rep_utilization', 75, 85), "Идеальная загрузка"),
+    (between('rep_utilization', 70, 90), "Хорошая загрузка"),
+    (below('time_utilization', 60), "Значительно быстрее плана"),
+    (below('time_utilization', 80), "Быстрее плана"),
+    (above('time_utilization', 120), "Значительно медленнее плана"),
+    (above('time_utilization', 100), "Медленнее плана"),
+    (None, "Приемлемый вариант")
+)
+
+# Уточнения, которые дописываются к рекомендации
+SIMPLE_SUFFIXES = (
+    (lambda table: (table['reps_count'] <= 3) & (table['rep_utilization'] > 120), " (очень напряжённо)"),
+    (lambda table: (table['reps_count'] >= 10) & (table['rep_utilization'] < 40), " (избыточно)")
+)
+
+
+def scenario_range(min_reps, optimal_reps, below_min=2, above_min=5, above_optimal=3, max_above_min=None,
+                   reps_range=None):
+    """
+    Численности для таблицы: по умолчанию от min_reps - below_min до
+    max(min_reps + above_min, optimal_reps + above_optimal) (не дальше min_reps + max_above_min);
+    reps_range=(first, last) - явный диапазон, например (1, 500)
+    """
+    if reps_range is not None:
+        first, last = reps_range
+    else:
+        first = min_reps - below_min
+        last = max(min_reps + above_min, optimal_reps + above_optimal)
+        if max_above_min is not None:
+            last = min(last, min_reps + max_above_min)
+    return np.arange(max(1, int(first)), int(last) + 1)
+
+
+def recommendations(table, rules, suffixes=()):
+    """Метки рекомендаций: первое сработавшее правило и уточнения"""
+    *rules, (_, default) = rules
+    labels = np.select([condition(table) for condition, _ in rules], [label for _, label in rules], default)
+    if suffixes:
+        extra = np.select([condition(table) for condition, _ in suffixes], [text for _, text in suffixes], '')
+        labels = np.char.add(labels, extra)
+    return labels
+
+
+def scenario_table(total_hours, weekly_hours_per_rep, project_calendar_days, reps, min_reps=None,
+                   optimal_reps=None, work_days_per_week=5, available_hours_per_rep=None,
+                   rules=LEGACY_RULES, suffixes=(), empty_time_utilization=0.0):
+    """
+    Таблица сценариев (словарь массивов) для массива численностей reps.
+    weekly_hours_per_rep - эффективные часы медпреда в неделю,
+    available_hours_per_rep - его доступные часы за проект (по умолчанию из недельных);
+    empty_time_utilization - загрузка сроков, если срок проекта не задан
+    """
+    reps = np.asarray(reps, dtype=np.int64)
+    reps = reps[reps >= 1]
+    if available_hours_per_rep is None:
+        available_hours_per_rep = weekly_hours_per_rep * project_calendar_days / 7
+
+    weeks = np.zeros(len(reps))
+    if weekly_hours_per_rep > 0:
+        weeks = total_hours / (reps * weekly_hours_per_rep)
+    calendar_days = weeks * 7
+
+    if project_calendar_days > 0:
+        time_utilization = calendar_days / project_calendar_days * 100
+    else:
+        time_utilization = np.full(len(reps), float(empty_time_utilization))
+
+    rep_utilization = np.zeros(len(reps))
+    if available_hours_per_rep > 0:
+        rep_utilization = total_hours / (reps * available_hours_per_rep) * 100
+
+    table = {
+        'reps_count': reps,
+        'weeks': weeks,
+        'work_days': weeks * work_days_per_week,
+        'calendar_days': calendar_days,
+        'time_utilization': time_utilization,
+        'rep_utilization': rep_utilization,
+        'is_minimal': reps == min_reps,
+        'is_optimal': reps == optimal_reps
+    }
+    table['recommendation'] = recommendations(table, rules, suffixes)
+    return table
+
+
+def staffing_table(total_hours, available_hours_per_rep, reps):
+    """
+    Таблица укомплектования (проекты x численности reps): загрузка персонала, перерасход
+    срока (загрузка сверх 100%, при нуле медпредов - inf) и недовыполнение к сроку, ч.
+    total_hours и available_hours_per_rep - массивы по проектам
+    """
+    total_hours = np.asarray(total_hours, dtype=float)[:, None]
+    capacity = np.asarray(available_hours_per_rep, dtype=float)[:, None] * np.asarray(reps)[None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rep_utilization = np.where(total_hours > 0, total_hours / capacity * 100, 0.0)
+    return {
+        'rep_utilization': rep_utilization,
+        'overrun': np.maximum(rep_utilization - 100, 0),
+        'shortfall_hours': np.maximum(total_hours - capacity, 0)
+    }
+
+
+def scenario_rows(table):
+    """Строки сценариев в формате результата расчёта проекта (с округлением для отображения)"""
+    columns = {
+        'reps_count': table['reps_count'].tolist(),
+        'weeks': np.round(table['weeks'], 1).tolist(),
+        'work_days': np.round(table['work_days']).tolist(),
+        'calendar_days': np.round(table['calendar_days']).tolist(),
+        'time_utilization': np.round(table['time_utilization'], 1).tolist(),
+        'rep_utilization': np.round(table['rep_utilization'], 1).tolist(),
+        'recommendation': table['recommendation'].tolist(),
+        'is_minimal': table['is_minimal'].tolist(),
+        'is_optimal': table['is_optimal'].tolist()
+    }
+    return [dict(zip(columns, row)) for row in zip(*columns.values())]
@@ -0,0 +1,28 @@
+"""Общие фикстуры: модули приложения импортируются из родительского каталога"""
+
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calculator_core import MedicalRepCalculatorGUI  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def shared_calculator():
+    return MedicalRepCalculatorGUI()
+
+
+@pytest.fixture
+def calculator(shared_calculator):
+    """Калькулятор с пустым кэшем результатов: каждый тест считает заново"""
+    shared_calculator.result_cache.clear()
+    return shared_calculator
+
+
+@pytest.fixture
+def day_params(shared_calculator):
+    return shared_calculator._daily_kernel_params('Москва', 'Кардиологи', 7, 'Автомобиль')
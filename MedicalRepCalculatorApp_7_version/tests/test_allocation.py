@@ -0,0 +1,71 @@
+"""Распределение медпредов: жадный выбор совпадает с полным перебором по обеим целям"""
+
+from itertools import product
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from allocation import ALLOCATION_OBJECTIVES, greedy_allocation
+from portfolio import prepare_portfolio, simple_load
+from scenario_engine import staffing_table
+
+PROJECTS = [
+    {'city': 'Москва', 'specialization': 'Кардиологи', 'transport_type': 'Автомобиль',
+     'total_visits_needed': 600, 'visits_per_doctor': 2, 'project_calendar_days': 60},
+    {'city': 'Казань', 'specialization': 'Аптеки', 'transport_type': 'Пешком',
+     'total_visits_needed': 400, 'visits_per_doctor': 1, 'project_calendar_days': 30},
+    {'city': 'Тверь', 'specialization': 'Неврологи', 'transport_type': 'Автомобиль',
+     'total_visits_needed': 900, 'visits_per_doctor': 3, 'project_calendar_days': 90},
+    {'city': 'Екатеринбург', 'specialization': 'Терапевты', 'transport_type': 'Автомобиль',
+     'total_visits_needed': 300, 'visits_per_doctor': 1, 'project_calendar_days': 45}
+]
+
+
+def objective_value(values, reps, objective):
+    chosen = values[np.arange(len(values)), reps]
+    return chosen.max() if objective == 'max_overrun' else chosen.sum()
+
+
+def brute_force(values, total_reps, objective):
+    """Наилучшее значение цели среди всех численностей с суммой не больше total_reps"""
+    projects, columns = values.shape
+    return min(objective_value(values, np.array(reps), objective)
+               for reps in product(range(columns), repeat=projects) if sum(reps) <= total_reps)
+
+
+@pytest.mark.parametrize('objective', ALLOCATION_OBJECTIVES)
+def test_greedy_allocation_matches_brute_force(objective):
+    rng = np.random.default_rng(7)
+    for _ in range(20):
+        total_hours = rng.uniform(50, 2000, 4)
+        available_hours = rng.uniform(100, 400, 4)
+        values = staffing_table(total_hours, available_hours, np.arange(7))[
+            'overrun' if objective == 'max_overrun' else 'shortfall_hours']
+        for total_reps in (0, 3, 8, 30):
+            reps = greedy_allocation(values, total_reps, objective, priority=total_hours)
+            assert reps.sum() <= total_reps
+            assert objective_value(values, reps, objective) == pytest.approx(brute_force(values, total_reps,
+                                                                                         objective))
+
+
+@pytest.mark.parametrize('objective', ALLOCATION_OBJECTIVES)
+def test_allocate_reps_matches_brute_force(calculator, objective):
+    load = simple_load(prepare_portfolio(pd.DataFrame(PROJECTS)))
+    for total_reps in (4, 6, 9):
+        result, summary = calculator.allocate_reps(PROJECTS, total_reps, objective)
+        needed = int(min(total_reps, load['min_reps_needed'].max()))
+        table = staffing_table(load['total_time_all_doctors_hours'], load['available_hours'], np.arange(needed + 1))
+        values = table['overrun'] if objective == 'max_overrun' else table['shortfall_hours']
+        best = brute_force(values, total_reps, objective)
+        reached = summary['max_overrun'] if objective == 'max_overrun' else summary['shortfall_hours']
+        assert reached == pytest.approx(best)
+        assert result['allocated_reps'].sum() == summary['allocated_reps'] <= total_reps
+
+
+@pytest.mark.parametrize('source', [[], pd.DataFrame()])
+def test_empty_portfolio_is_rejected(calculator, source):
+    with pytest.raises(ValueError, match='нет ни одного проекта'):
+        calculator.allocate_reps(source, 5)
+    with pytest.raises(ValueError, match='нет ни одного проекта'):
+        calculator.calculate_portfolio(pd.DataFrame(source))
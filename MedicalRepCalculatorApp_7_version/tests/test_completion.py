@@ -0,0 +1,56 @@
+"""Срок завершения проекта и подбор численности команды"""
+
+import pytest
+
+from mc_engine import COMPLETION_PERCENTILES, DEADLINE_CHUNK_SIZE, gallop_search
+
+# Вероятность успеть у команды из 16 медпредов - около 60%: граница не тривиальна
+PROJECT = ('Москва', 'Кардиологи', 'Автомобиль', 1975, 7, 30)
+
+
+@pytest.mark.parametrize('start', [1, 2, 7, 16, 40, 200])
+def test_gallop_search_finds_threshold(start):
+    for threshold in range(1, 50):
+        calls = []
+
+        def predicate(k):
+            calls.append(k)
+            return k >= threshold
+
+        assert gallop_search(predicate, start) == threshold
+        assert min(calls) >= 1
+        assert gallop_search(predicate, start, upper=threshold) == threshold
+        assert gallop_search(predicate, start, upper=threshold + 3) == threshold
+        if threshold > 1:
+            assert gallop_search(predicate, start, upper=threshold - 1) is None
+
+
+def test_gallop_search_boundaries():
+    assert gallop_search(lambda k: True, 10) == 1
+    assert gallop_search(lambda k: False, 1, upper=64) is None
+    assert gallop_search(lambda k: k >= 5, 0) == 5
+    assert gallop_search(lambda k: k >= 1000, 3) == 1000
+
+
+@pytest.mark.parametrize('target', [50, 60, 90])
+def test_solver_matches_linear_scan(calculator, target):
+    for seed in (1, 2):
+        solved = calculator.min_reps_for_deadline(*PROJECT, target_probability=target, random_seed=seed,
+                                                  max_replications=1000)
+        # Те же реплики: тот же seed, размер чанка и число реплик
+        table = calculator.simulate_project_completion(*PROJECT, replications=solved['replications'],
+                                                       random_seed=seed, chunk_size=DEADLINE_CHUNK_SIZE)['reps']
+        assert solved['min_reps'] == next(k for k, row in table.items() if row['on_time_probability'] >= target)
+        for reps, candidate in solved['candidates'].items():
+            assert candidate['on_time_probability'] == table[reps]['on_time_probability']
+
+
+def test_completion_is_monotone_in_team_size(calculator):
+    table = calculator.simulate_project_completion(*PROJECT, reps=range(1, 25), replications=400,
+                                                   random_seed=3)['reps']
+    rows = [table[reps] for reps in sorted(table)]
+    for smaller, larger in zip(rows, rows[1:]):
+        assert larger['on_time_probability'] >= smaller['on_time_probability']
+        for q in COMPLETION_PERCENTILES:
+            assert larger['calendar_days'][q] <= smaller['calendar_days'][q]
+        assert list(smaller['calendar_days'].values()) == sorted(smaller['calendar_days'].values())
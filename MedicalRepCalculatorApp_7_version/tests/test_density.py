@@ -0,0 +1,74 @@
+"""Модель плотности: пакетное ядро дней даёт то же распределение, что прежний построчный цикл"""
+
+import numpy as np
+import pytest
+
+FIELDS = ('total_hours', 'successful_visits', 'total_travel_distance_km', 'clinics_visited')
+
+
+def legacy_density_day(density, city, factors, target_visits, transport_type, rng):
+    """Эталон: прежний цикл simulate_density_day (итоги дня по FIELDS)"""
+    layout = density._day_layout(city, factors)
+    districts = [int(d) for d in rng.choice(np.arange(1, factors['districts'] + 1), size=layout['districts_per_day'],
+                                            replace=False)]
+    clinics = {d: set() for d in districts}
+    current = districts[rng.integers(len(districts))]
+    transport_speed = {'Автомобиль': 40, 'Общественный транспорт': 25, 'Пешком': 5}.get(transport_type, 40)
+    transport_waiting = {'Автомобиль': 5, 'Общественный транспорт': 10}.get(transport_type, 5)
+
+    done = successful = 0
+    distance = visit_time = waiting_total = 0.0
+    while done < target_visits:
+        current_clinics = clinics[current]
+        if current_clinics and rng.random() < factors['same_clinic_probability'] * 0.7:
+            travel = 0
+        else:
+            current_clinics.add(len(current_clinics) + 1)
+            if len(current_clinics) == 1:
+                travel = 0
+            elif rng.random() < 0.8 or len(districts) == 1:
+                travel = layout['within_km'] * rng.uniform(0.5, 1.5)
+            else:
+                current = [d for d in districts if d != current][rng.integers(len(districts) - 1)]
+                travel = layout['between_km'] * rng.uniform(0.8, 1.2)
+        distance += travel
+
+        time_of_day = 0 if done < target_visits * 0.4 else 1 if done < target_visits * 0.7 else 2
+        share_low = (0.3, 0.4, 0.2)[time_of_day]
+        available = max(1, int(factors['doctors_per_clinic'] * rng.uniform(share_low, share_low + 0.2)))
+        visits_now = min(target_visits - done, int(rng.integers(1, min(3, available) + 1)))
+        for visit_num in range(visits_now):
+            waiting = rng.uniform(*((10, 25), (5, 15), (15, 30))[time_of_day])
+            waiting_total += waiting
+            if rng.random() >= factors['doctor_absence_probability']:
+                successful += 1
+                if visit_num == 0:
+                    visit_time += rng.uniform(20, 35) + waiting
+                else:
+                    visit_time += rng.uniform(15, 25) + waiting * 0.5
+        done += visits_now
+
+    travel_time = distance / transport_speed * 60 * layout['travel_efficiency'] + \
+        sum(1 for visited in clinics.values() if visited) * transport_waiting
+    total_hours = (visit_time + waiting_total + travel_time) / 60
+    return total_hours, successful, distance, sum(len(visited) for visited in clinics.values())
+
+
+@pytest.mark.parametrize('city, transport_type', [
+    ('Москва', 'Автомобиль'),
+    ('Новосибирск', 'Общественный транспорт'),
+    ('Казань', 'Пешком')
+])
+def test_density_batch_matches_legacy_loop(shared_calculator, city, transport_type):
+    density = shared_calculator.density_calculator
+    factors = density.calculate_density_factors(city, 'Кардиологи')
+    days = 3000
+    batch = density.simulate_density_days(city, 'Кардиологи', 8, transport_type, days, random_seed=1)
+    rng = np.random.default_rng(2)
+    legacy = np.array([legacy_density_day(density, city, factors, 8, transport_type, rng) for _ in range(days)])
+    for column, field in enumerate(FIELDS):
+        values, reference = np.asarray(batch[field], dtype=float), legacy[:, column]
+        # Средние совпадают с точностью до 4 стандартных ошибок разности, разброс - до 10%
+        error = np.sqrt((values.var(ddof=1) + reference.var(ddof=1)) / days)
+        assert abs(values.mean() - reference.mean()) <= 4 * error + 1e-9, field
+        assert values.std() == pytest.approx(reference.std(), rel=0.1, abs=1e-9), field
@@ -0,0 +1,416 @@
+"""
+Инварианты движка Монте-Карло и векторных расчётов: результат с данным seed
+не зависит от числа процессов, способа разбиения прогона и реализации
+"""
+
+import math
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mc_checkpoint import MCCheckpoint
+import mc_engine
+from mc_engine import MCRunState, TimeBudget, daily_chunk, extend_run, run_adaptive, run_batches, run_chunked
+from portfolio import prepare_portfolio, simple_load
+from scenario_engine import SIMPLE_CITY_FACTORS, SIMPLE_EFFICIENCY, SIMPLE_OPTIMAL_LOAD, SIMPLE_VISIT_HOURS
+
+
+def assert_same(first, second):
+    """Полное совпадение вложенных словарей и массивов (NaN равен NaN)"""
+    np.testing.assert_equal(first, second)
+
+
+# Чанки и пул процессов
+
+def test_chunked_run_does_not_depend_on_workers(day_params):
+    single = run_chunked(daily_chunk, day_params, 2300, random_seed=7, workers=1, chunk_size=500, keep_raw=True)
+    pooled = run_chunked(daily_chunk, day_params, 2300, random_seed=7, workers=2, chunk_size=500, keep_raw=True)
+    assert_same(single.statistics(), pooled.statistics())
+    assert_same(single.raw_results(), pooled.raw_results())
+
+
+def test_seeded_simulation_does_not_depend_on_workers(calculator):
+    single = calculator.monte_carlo_daily_simulation('Москва', 'Кардиологи', 7, 'Автомобиль', 3000,
+                                                     random_seed=5, workers=1)
+    calculator.result_cache.clear()
+    pooled = calculator.monte_carlo_daily_simulation('Москва', 'Кардиологи', 7, 'Автомобиль', 3000,
+                                                     random_seed=5, workers=3)
+    assert_same(single['statistics'], pooled['statistics'])
+    assert single['input_params']['random_seed'] == 5
+
+
+# Адаптивный режим
+
+def test_adaptive_stop_does_not_depend_on_workers(day_params):
+    tolerances = {'total_hours': 0.004}
+    stops = []
+    for workers in (1, 2, 3):
+        state, report = run_adaptive(daily_chunk, day_params, 20000, random_seed=11, workers=workers,
+                                     chunk_size=250, tolerances=tolerances)
+        assert report['converged']
+        stops.append((state.iterations, state.accumulator().statistics()))
+    for iterations, statistics in stops[1:]:
+        assert iterations == stops[0][0]
+        assert_same(statistics, stops[0][1])
+
+
+def test_adaptive_result_equals_fixed_run(day_params):
+    state, _ = run_adaptive(daily_chunk, day_params, 20000, random_seed=11, workers=2, chunk_size=250,
+                            tolerances={'total_hours': 0.004})
+    fixed = run_chunked(daily_chunk, day_params, state.iterations, random_seed=11, chunk_size=250)
+    assert_same(state.accumulator().statistics(), fixed.statistics())
+
+
+# Продолжение прогона
+
+@pytest.mark.parametrize('first, second', [(1234, 2000), (1000, 1500), (250, 250)])
+def test_extended_run_equals_single_run(day_params, first, second):
+    state = MCRunState(daily_chunk, day_params, random_seed=3, chunk_size=500, keep_raw=True)
+    extend_run(state, daily_chunk, day_params, first)
+    extend_run(state, daily_chunk, day_params, second)
+    single = run_chunked(daily_chunk, day_params, first + second, random_seed=3, chunk_size=500, keep_raw=True)
+    assert state.iterations == first + second
+    assert_same(state.accumulator().statistics(), single.statistics())
+    assert_same(state.accumulator().raw_results(), single.raw_results())
+
+
+def test_extended_simulation_equals_single_run(calculator):
+    arguments = ('Москва', 'Кардиологи', 7, 'Автомобиль')
+    first = calculator.monte_carlo_daily_simulation(*arguments, 1700, random_seed=9, chunk_size=500)
+    extended = calculator.monte_carlo_daily_simulation(*arguments, 1300, random_seed=9, chunk_size=500,
+                                                       previous=first)
+    single = calculator.monte_carlo_daily_simulation(*arguments, 3000, random_seed=9, chunk_size=500)
+    assert_same(extended['statistics'], single['statistics'])
+
+
+# Бюджет времени
+
+def test_time_budget_stops_before_overrun(day_params, monkeypatch):
+    # Часы идут на 3 с за каждую порцию: после порции на 9 с следующая уже не влезает в 10 с
+    clock = iter(range(0, 100, 3))
+    monkeypatch.setattr(mc_engine, 'time', SimpleNamespace(monotonic=lambda: next(clock)))
+    budget = TimeBudget(10)
+    state = MCRunState(daily_chunk, day_params, random_seed=5, chunk_size=200)
+    run_batches(state, daily_chunk, day_params, 5000, on_batch=budget)
+    assert budget.batches == 3 and state.iterations == 600
+
+    # Бюджет меньше одной порции - считается одна порция
+    clock = iter(range(0, 100, 3))
+    state = MCRunState(daily_chunk, day_params, random_seed=5, chunk_size=200)
+    run_batches(state, daily_chunk, day_params, 5000, on_batch=TimeBudget(0))
+    assert state.iterations == 200
+
+
+def test_budgeted_simulation_equals_fixed_run(calculator):
+    arguments = ('Москва', 'Кардиологи', 7, 'Автомобиль')
+    budgeted = calculator.monte_carlo_daily_simulation(*arguments, None, random_seed=6, chunk_size=500,
+                                                       time_budget=0.1)
+    iterations = budgeted['input_params']['iterations']
+    assert iterations % 500 == 0 and budgeted['time_budget']['batches'] == iterations // 500
+    fixed = calculator.monte_carlo_daily_simulation(*arguments, iterations, random_seed=6, chunk_size=500)
+    assert_same(budgeted['statistics'], fixed['statistics'])
+
+
+# Контрольные точки
+
+class Crash(Exception):
+    """Имитация сбоя процесса посреди расчёта"""
+
+
+def test_resumed_run_equals_continuous_run(calculator, tmp_path, monkeypatch):
+    arguments = ('Москва', 'Кардиологи', 7, 'Автомобиль')
+    path = str(tmp_path / 'daily.ckpt')
+    batches = []
+
+    def save_then_crash(checkpoint, state):
+        checkpoint.save(state)
+        batches.append(state.iterations)
+        if len(batches) == 3:
+            raise Crash()
+        return False
+
+    monkeypatch.setattr(MCCheckpoint, '__call__', save_then_crash)
+    with pytest.raises(Crash):
+        calculator.monte_carlo_daily_simulation(*arguments, 3000, random_seed=4, chunk_size=500, checkpoint=path)
+    monkeypatch.undo()
+    assert batches[-1] == 1500
+
+    resumed = calculator.resume_mc_job(path)
+    continuous = calculator.monte_carlo_daily_simulation(*arguments, 3000, random_seed=4, chunk_size=500)
+    assert resumed['run_state'].iterations == 3000
+    assert_same(resumed['statistics'], continuous['statistics'])
+
+
+# Выборка по значимости
+
+def test_importance_sampling_matches_plain_monte_carlo(calculator, day_params):
+    plain = run_chunked(daily_chunk, day_params, 40000, random_seed=21, keep_raw=True)
+    threshold = float(np.percentile(plain.raw_results()['total_hours'], 95))
+    hits = plain.raw_results()['total_hours'] > threshold
+    plain_probability = hits.mean() * 100
+    plain_error = hits.std(ddof=1) / np.sqrt(hits.size) * 100
+
+    tilted = calculator.overload_probability_is('Москва', 'Кардиологи', 7, 'Автомобиль', 20000, random_seed=22,
+                                                threshold=threshold)
+    assert tilted['std_error'] < plain_error
+    assert abs(tilted['overload_probability'] - plain_probability) < 4 * np.hypot(tilted['std_error'], plain_error)
+    assert abs(tilted['mean_weight'] - 1) < 0.05
+
+
+# Векторная таблица сценариев
+
+def legacy_project_scenarios(unique_doctors_needed, time_per_doctor_hours, hours_per_rep_per_week,
+                             efficiency_factor, min_reps_needed_int, optimal_reps_needed_int, project_calendar_days):
+    """Эталон: прежний построчный цикл _generate_project_scenarios"""
+    scenarios = []
+    for num_reps in range(max(1, min_reps_needed_int - 2),
+                          max(min_reps_needed_int + 6, optimal_reps_needed_int + 4) + 1):
+        available_hours = num_reps * hours_per_rep_per_week * efficiency_factor * (project_calendar_days / 7)
+        required_hours = unique_doctors_needed * time_per_doctor_hours
+        actual_weeks = required_hours / (num_reps * hours_per_rep_per_week * efficiency_factor)
+        actual_calendar_days = actual_weeks * 7
+        time_utilization = (actual_calendar_days / project_calendar_days) * 100
+        rep_load_percentage = (required_hours / available_hours) * 100 if available_hours > 0 else 100
+
+        if num_reps == min_reps_needed_int:
+            recommendation = "Минимальное (высокая напряжённость)"
+        elif num_reps == optimal_reps_needed_int:
+            recommendation = "Оптимальное (рекомендуется)"
+        elif rep_load_percentage < 60:
+            recommendation = "Недогрузка персонала"
+        elif rep_load_percentage > 90:
+            recommendation = "Перегрузка персонала"
+        elif 70 <= rep_load_percentage <= 85:
+            recommendation = "Хорошая загрузка"
+        elif time_utilization < 70:
+            recommendation = "Быстрее плана"
+        else:
+            recommendation = "Приемлемый вариант"
+
+        scenarios.append({
+            'reps_count': num_reps,
+            'weeks': round(actual_weeks, 1),
+            'work_days': round(actual_weeks * 5, 0),
+            'calendar_days': round(actual_calendar_days, 0),
+            'time_utilization': round(time_utilization, 1),
+            'rep_utilization': round(rep_load_percentage, 1),
+            'recommendation': recommendation,
+            'is_minimal': num_reps == min_reps_needed_int,
+            'is_optimal': num_reps == optimal_reps_needed_int
+        })
+    return scenarios
+
+
+def legacy_simple_scenarios(city, specialization, total_visits_needed, visits_per_doctor, project_calendar_days,
+                            work_days_per_week, max_work_hours_per_day):
+    """Эталон: прежний построчный цикл сценариев _simple_city_load"""
+    time_per_visit = SIMPLE_VISIT_HOURS['pharmacy' if 'аптек' in specialization.lower() else 'doctor']
+    time_per_visit *= SIMPLE_CITY_FACTORS.get(city, 1.0)
+    total_hours = math.ceil(total_visits_needed / visits_per_doctor) * time_per_visit
+    total_project_hours = project_calendar_days / 7 * work_days_per_week * max_work_hours_per_day
+    available_hours = total_project_hours * SIMPLE_EFFICIENCY
+    min_reps = math.ceil(total_hours / available_hours)
+    optimal_reps = math.ceil(total_hours / (available_hours * SIMPLE_OPTIMAL_LOAD))
+    if optimal_reps < min_reps:
+        optimal_reps = min_reps + 1
+
+    scenarios = []
+    for reps in range(max(1, min_reps - 2), min(max(min_reps + 7, optimal_reps + 5), min_reps + 15) + 1):
+        weeks_needed = total_hours / (reps * available_hours) * (project_calendar_days / 7)
+        calendar_days = weeks_needed * 7
+        time_util = (calendar_days / project_calendar_days) * 100
+        rep_load = (total_hours / (reps * available_hours)) * 100
+
+        if reps == min_reps:
+            recommendation = "Минимальное (высокая напряжённость)"
+        elif reps == optimal_reps:
+            recommendation = "Оптимальное (рекомендуется)"
+        elif rep_load > 95:
+            recommendation = "Сильная перегрузка"
+        elif rep_load > 90:
+            recommendation = "Перегрузка персонала"
+        elif rep_load < 50:
+            recommendation = "Сильная недогрузка"
+        elif rep_load < 60:
+            recommendation = "Недогрузка персонала"
+        elif 75 <= rep_load <= 85:
+            recommendation = "Идеальная загрузка"
+        elif 70 <= rep_load <= 90:
+            recommendation = "Хорошая загрузка"
+        elif time_util < 60:
+            recommendation = "Значительно быстрее плана"
+        elif time_util < 80:
+            recommendation = "Быстрее плана"
+        elif time_util > 120:
+            recommendation = "Значительно медленнее плана"
+        elif time_util > 100:
+            recommendation = "Медленнее плана"
+        else:
+            recommendation = "Приемлемый вариант"
+        if reps <= 3 and rep_load > 120:
+            recommendation += " (очень напряжённо)"
+        elif reps >= 10 and rep_load < 40:
+            recommendation += " (избыточно)"
+
+        scenarios.append({
+            'reps_count': reps,
+            'weeks': round(weeks_needed, 1),
+            'work_days': round(weeks_needed * work_days_per_week, 0),
+            'calendar_days': round(calendar_days, 0),
+            'time_utilization': round(time_util, 1),
+            'rep_utilization': round(rep_load, 1),
+            'recommendation': recommendation,
+            'is_minimal': reps == min_reps,
+            'is_optimal': reps == optimal_reps and reps != min_reps
+        })
+    return scenarios
+
+
+def legacy_generated_scenarios(total_hours_needed, available_hours_per_rep, hours_per_rep_per_week,
+                               work_days_per_week, project_calendar_days, min_reps, optimal_reps, labels):
+    """
+    Эталон: прежние циклы _generate_legacy_scenarios и DensityCalculator._generate_scenarios
+    (labels - подписи минимального сценария, перегрузки и недогрузки; правила по времени
+    есть только в первом, у второго их заменяет "Хорошая загрузка")
+    """
+    minimal, overload, underload = labels
+    density = overload == "Перегрузка"
+    scenarios = []
+    for reps in range(max(1, min_reps - 2), max(min_reps + 5, optimal_reps + 3) + 1):
+        actual_weeks = total_hours_needed / (reps * hours_per_rep_per_week)
+        actual_calendar_days = actual_weeks * 7
+        time_util = (actual_calendar_days / project_calendar_days) * 100
+        rep_load = (total_hours_needed / (reps * available_hours_per_rep)) * 100
+
+        if reps == min_reps:
+            rec = minimal
+        elif reps == optimal_reps:
+            rec = "Оптимальное (рекомендуется)"
+        elif rep_load > 90:
+            rec = overload
+        elif rep_load < 60:
+            rec = underload
+        elif density or 70 <= rep_load <= 85:
+            rec = "Хорошая загрузка"
+        elif time_util < 70:
+            rec = "Быстрее плана"
+        else:
+            rec = "Приемлемый вариант"
+
+        scenarios.append({
+            'reps_count': reps,
+            'weeks': round(actual_weeks, 1),
+            'work_days': round(actual_weeks * work_days_per_week, 0),
+            'calendar_days': round(actual_calendar_days, 0),
+            'time_utilization': round(time_util, 1),
+            'rep_utilization': round(rep_load, 1),
+            'recommendation': rec,
+            'is_minimal': reps == min_reps,
+            'is_optimal': reps == optimal_reps
+        })
+    return scenarios
+
+
+# Шаг округления столбца: на границе .5 допускается расхождение в один шаг
+SCENARIO_STEPS = {'weeks': 0.1, 'work_days': 1, 'calendar_days': 1, 'time_utilization': 0.1,
+                  'rep_utilization': 0.1}
+
+
+def assert_same_scenarios(scenarios, reference):
+    assert [row['reps_count'] for row in scenarios] == [row['reps_count'] for row in reference]
+    for row, expected in zip(scenarios, reference):
+        for key in ('recommendation', 'is_minimal', 'is_optimal'):
+            assert row[key] == expected[key]
+        for key, step in SCENARIO_STEPS.items():
+            assert abs(row[key] - expected[key]) <= step + 1e-9
+
+
+@pytest.mark.parametrize('unique, time_per_doctor, hours_per_week, efficiency, min_reps, optimal, days', [
+    (120, 1.7, 40, 0.8, 3, 4, 60),
+    (450, 2.35, 38.5, 0.75, 9, 11, 90),
+    (15, 0.9, 40, 0.85, 1, 1, 30),
+    (900, 3.1, 36, 0.7, 25, 30, 120)
+])
+def test_scenario_table_matches_legacy_loop(shared_calculator, unique, time_per_doctor, hours_per_week, efficiency,
+                                            min_reps, optimal, days):
+    scenarios = shared_calculator._generate_project_scenarios(
+        'Москва', 'Кардиологи', 'Автомобиль', unique * 2, 2, unique, time_per_doctor, hours_per_week, efficiency,
+        min_reps, min_reps, optimal, days)
+    reference = legacy_project_scenarios(unique, time_per_doctor, hours_per_week, efficiency, min_reps, optimal, days)
+    assert_same_scenarios(scenarios, reference)
+
+
+@pytest.mark.parametrize('city, specialization, visits, per_doctor, days, work_days, max_hours', [
+    ('Москва', 'Кардиологи', 1200, 3, 60, 5, 8),
+    ('Санкт-Петербург', 'Аптеки', 800, 2, 45, 5, 8),
+    ('Казань', 'Терапевты', 90, 1, 30, 6, 7),
+    ('Тверь', 'Неврологи', 20000, 4, 120, 5, 10),
+    ('Екатеринбург', 'Аптечные сети', 15, 1, 90, 4, 8)
+])
+def test_simple_scenarios_match_legacy_loop(shared_calculator, city, specialization, visits, per_doctor, days,
+                                            work_days, max_hours):
+    scenarios = shared_calculator._simple_city_load(city, specialization, 'Автомобиль', visits, per_doctor, days,
+                                                    work_days, max_hours)['scenarios']
+    reference = legacy_simple_scenarios(city, specialization, visits, per_doctor, days, work_days, max_hours)
+    assert_same_scenarios(scenarios, reference)
+
+
+@pytest.mark.parametrize('total_hours, hours_per_week, efficiency, work_days, days', [
+    (180, 40, 0.85, 5, 60),
+    (2450, 38.5, 0.75, 6, 90),
+    (30, 40, 0.8, 5, 30),
+    (9100, 36, 0.7, 4, 120)
+])
+def test_legacy_scenarios_match_legacy_loop(shared_calculator, total_hours, hours_per_week, efficiency, work_days,
+                                            days):
+    available_hours_per_rep = days / 7 * hours_per_week * efficiency
+    min_reps = math.ceil(total_hours / available_hours_per_rep)
+    optimal = math.ceil(total_hours / (available_hours_per_rep * 0.75))
+    scenarios = shared_calculator._generate_legacy_scenarios(total_hours, available_hours_per_rep, hours_per_week,
+                                                             efficiency, work_days, days, min_reps, optimal)
+    reference = legacy_generated_scenarios(total_hours, available_hours_per_rep, hours_per_week * efficiency,
+                                           work_days, days, min_reps, optimal,
+                                           ("Минимальное (напряжённый режим)", "Перегрузка персонала",
+                                            "Недогрузка персонала"))
+    assert_same_scenarios(scenarios, reference)
+
+
+@pytest.mark.parametrize('total_hours, work_days, days', [(180, 5, 60), (2450, 6, 90), (30, 5, 30), (9100, 4, 120)])
+def test_density_scenarios_match_legacy_loop(shared_calculator, total_hours, work_days, days):
+    available_hours_per_rep = days / 7 * work_days * 8 * 0.85
+    min_reps = math.ceil(total_hours / available_hours_per_rep)
+    optimal = math.ceil(total_hours / (available_hours_per_rep * 0.75))
+    scenarios = shared_calculator.density_calculator._generate_scenarios(total_hours, available_hours_per_rep,
+                                                                         work_days, days, min_reps, optimal)
+    reference = legacy_generated_scenarios(total_hours, available_hours_per_rep, work_days * 8 * 0.85, work_days,
+                                           days, min_reps, optimal,
+                                           ("Минимальное (напряжённый режим)", "Перегрузка", "Недогрузка"))
+    assert_same_scenarios(scenarios, reference)
+
+
+# Пакетный расчёт портфеля
+
+PORTFOLIO_PROJECTS = [
+    ('Москва', 'Кардиологи', 'Автомобиль', 1200, 3, 60, 5, 8),
+    ('Санкт-Петербург', 'Аптеки', 'Общественный транспорт', 800, 2, 45, 5, 8),
+    ('Екатеринбург', 'Терапевты', 'Автомобиль', 333, 0, 30, 6, 7),
+    ('Казань', 'Аптечные сети', 'Пешком', 50, 4, 0, 5, 8),
+    ('Тверь', 'Неврологи', 'Автомобиль', 5000, 5, 120, 4, 10)
+]
+
+
+def test_portfolio_load_matches_city_load(shared_calculator):
+    columns = ('city', 'specialization', 'transport_type', 'total_visits_needed', 'visits_per_doctor',
+               'project_calendar_days', 'work_days_per_week', 'max_work_hours_per_day')
+    frame = prepare_portfolio(pd.DataFrame(PORTFOLIO_PROJECTS, columns=columns))
+    load = simple_load(frame)
+    for row, project in enumerate(PORTFOLIO_PROJECTS):
+        calculations = shared_calculator.calculate_city_load(*project)['calculations']
+        assert load['unique_doctors_needed'][row] == calculations['unique_doctors_needed']
+        assert load['min_reps_needed'][row] == calculations['min_reps_needed']
+        assert load['optimal_reps_needed'][row] == calculations['optimal_reps_needed']
+        for key, digits in (('time_per_doctor_hours', 2), ('total_time_all_doctors_hours', 1),
+                            ('total_project_hours', 1), ('project_intensity', 1)):
+            assert round(float(load[key][row]), digits) == calculations[key]
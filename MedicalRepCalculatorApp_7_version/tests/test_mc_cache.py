@@ -0,0 +1,59 @@
+"""Кэш результатов: LRU по числу и памяти, повтор расчёта с теми же входными данными из кэша"""
+
+import numpy as np
+
+from mc_cache import LRUCache, value_nbytes
+
+ARGUMENTS = ('Москва', 'Кардиологи', 7, 'Автомобиль')
+PROJECT = ('Москва', 'Кардиологи', 'Автомобиль', 1200, 3, 60)
+
+
+def test_repeat_of_unseeded_run_is_cache_hit(calculator):
+    first = calculator.monte_carlo_daily_simulation(*ARGUMENTS, 1000, keep_raw=True, use_grid=False)
+    hits = calculator.result_cache.hits
+    repeat = calculator.monte_carlo_daily_simulation(*ARGUMENTS, 1000, random_seed=first['input_params']['random_seed'],
+                                                     keep_raw=True, use_grid=False)
+    assert calculator.result_cache.hits == hits + 1
+    np.testing.assert_equal(repeat['raw_results'], first['raw_results'])
+
+
+def test_cached_project_becomes_current(calculator):
+    first = calculator.calculate_city_load(*PROJECT)
+    calculator.calculate_city_load('Казань', 'Аптеки', 'Автомобиль', 300, 1, 30)
+    hits = calculator.result_cache.hits
+    repeat = calculator.calculate_city_load(*PROJECT)
+    assert calculator.result_cache.hits == hits + 1
+    assert calculator.current_project_result == first == repeat
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats() == dict(cache.stats(), hits=3, misses=1, evictions=1, size=2)
+
+
+def test_lru_is_bounded_by_memory():
+    block = np.zeros(1000)
+    cache = LRUCache(maxsize=100, max_bytes=int(value_nbytes({'raw': block}) * 2.5))
+    for key in range(4):
+        cache.put(key, {'raw': block})
+    assert len(cache) == 2 and cache.get(0) is None and cache.get(3) is not None
+    assert cache.bytes <= cache.max_bytes
+    assert cache.stats()['evictions'] == 2
+
+    cache.put('huge', {'raw': np.zeros(10000)})
+    assert cache.get('huge') is None and len(cache) == 2
+
+
+def test_lru_returns_copies():
+    cache = LRUCache()
+    value = {'raw': np.arange(3)}
+    cache.put('key', value)
+    value['raw'][0] = 10
+    cache.get('key')['raw'][1] = 10
+    np.testing.assert_equal(cache.get('key')['raw'], [0, 1, 2])
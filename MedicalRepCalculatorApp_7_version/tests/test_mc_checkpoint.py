@@ -0,0 +1,63 @@
+"""Контрольные точки: запись через временный файл и загрузка"""
+
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+import mc_checkpoint
+from mc_checkpoint import MCCheckpoint
+from mc_engine import MCRunState, daily_chunk, extend_run
+
+JOB = {'method': 'monte_carlo_daily_simulation', 'kwargs': {'city': 'Москва'}, 'target': 3000,
+       'fingerprint': 'отпечаток'}
+
+
+@pytest.fixture
+def run_state(day_params):
+    state = MCRunState(daily_chunk, day_params, random_seed=2, chunk_size=500)
+    return extend_run(state, daily_chunk, day_params, 1200)
+
+
+def test_checkpoint_round_trip(run_state, tmp_path):
+    path = str(tmp_path / 'run.ckpt')
+    MCCheckpoint(path, JOB).save(run_state)
+    assert os.listdir(tmp_path) == ['run.ckpt']
+
+    job, state = MCCheckpoint.load(path)
+    assert job == JOB
+    assert state.iterations == run_state.iterations == 1200
+    np.testing.assert_equal(state.accumulator().statistics(), run_state.accumulator().statistics())
+
+
+def test_interrupted_write_keeps_previous_checkpoint(run_state, day_params, tmp_path, monkeypatch):
+    path = str(tmp_path / 'run.ckpt')
+    checkpoint = MCCheckpoint(path, JOB)
+    checkpoint.save(run_state)
+
+    def broken_dump(data, f, protocol=None):
+        f.write(b'\x80\x05')
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(mc_checkpoint.pickle, 'dump', broken_dump)
+    with pytest.raises(KeyboardInterrupt):
+        checkpoint.save(extend_run(run_state, daily_chunk, day_params, 500))
+    monkeypatch.undo()
+    assert MCCheckpoint.load(path)[1].iterations == 1200
+
+
+def test_unreadable_checkpoint_is_ignored(tmp_path):
+    path = tmp_path / 'run.ckpt'
+    assert MCCheckpoint.load(str(path)) is None
+    path.write_bytes(b'\x80\x05\x95')
+    assert MCCheckpoint.load(str(path)) is None
+    path.write_bytes(pickle.dumps({'version': -1, 'job': JOB, 'state': None}))
+    assert MCCheckpoint.load(str(path)) is None
+
+
+def test_finished_run_removes_checkpoint(calculator, tmp_path):
+    path = str(tmp_path / 'run.ckpt')
+    calculator.monte_carlo_daily_simulation('Москва', 'Кардиологи', 7, 'Автомобиль', 1000, random_seed=1,
+                                            checkpoint=path)
+    assert not os.path.exists(path)
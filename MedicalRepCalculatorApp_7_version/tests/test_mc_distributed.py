@@ -0,0 +1,77 @@
+"""Распределённый Монте-Карло: исполнители на localhost дают тот же результат, что одна машина"""
+
+import os
+
+import numpy as np
+import pytest
+
+from mc_distributed import MCCoordinator, start_workers
+
+AUTHKEY = b'test-key'
+ARGUMENTS = ('Москва', 'Кардиологи', 7, 'Автомобиль')
+
+
+def double(value):
+    return 2 * value
+
+
+def exit_once(flag_path, value):
+    """Первый вызов завершает процесс исполнителя посреди задачи (разрыв подключения)"""
+    if not os.path.exists(flag_path):
+        open(flag_path, 'w').close()
+        os._exit(1)
+    return 2 * value
+
+
+@pytest.fixture
+def coordinator():
+    with MCCoordinator(('127.0.0.1', 0), authkey=AUTHKEY, worker_timeout=2.0) as coordinator:
+        yield coordinator
+
+
+@pytest.fixture
+def workers(coordinator):
+    processes = start_workers(coordinator.address, 3, AUTHKEY)
+    assert coordinator.wait_for_workers(3, timeout=20)
+    yield processes
+    coordinator.close()
+    for process in processes:
+        process.join(timeout=10)
+
+
+def test_distributed_simulation_equals_single_process(calculator, coordinator, workers):
+    distributed = calculator.monte_carlo_daily_simulation(*ARGUMENTS, 2300, random_seed=12, workers=coordinator,
+                                                          chunk_size=500, keep_raw=True)
+    calculator.result_cache.clear()
+    single = calculator.monte_carlo_daily_simulation(*ARGUMENTS, 2300, random_seed=12, workers=1, chunk_size=500,
+                                                     keep_raw=True)
+    np.testing.assert_equal(distributed['statistics'], single['statistics'])
+    np.testing.assert_equal(distributed['raw_results'], single['raw_results'])
+
+
+def test_distributed_sweep_equals_single_process(calculator, coordinator, workers):
+    distributed = calculator.visit_count_sweep('Москва', 'Кардиологи', 'Автомобиль', 8, 1500, random_seed=13,
+                                               workers=coordinator, chunk_size=400)
+    calculator.result_cache.clear()
+    single = calculator.visit_count_sweep('Москва', 'Кардиологи', 'Автомобиль', 8, 1500, random_seed=13, workers=1,
+                                          chunk_size=400)
+    distributed.pop('run_state', None)
+    single.pop('run_state', None)
+    np.testing.assert_equal(distributed, single)
+
+
+def test_job_of_disconnected_worker_is_requeued(coordinator, workers, tmp_path):
+    flag_path = str(tmp_path / 'exited')
+    assert coordinator.map(exit_once, [flag_path] * 6, range(6)) == [0, 2, 4, 6, 8, 10]
+    assert os.path.exists(flag_path)
+    assert coordinator.worker_count() == 2
+
+
+def test_map_without_workers_raises(coordinator):
+    with pytest.raises(RuntimeError):
+        coordinator.map(double, range(3))
+
+
+def test_map_timeout(coordinator):
+    with pytest.raises(TimeoutError):
+        coordinator.map(double, range(3), timeout=0.5)
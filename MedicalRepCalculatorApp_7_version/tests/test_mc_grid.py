@@ -0,0 +1,56 @@
+"""Предрассчитанная сетка Монте-Карло: совпадение с живым прогоном и устаревание"""
+
+import numpy as np
+import pytest
+
+from mc_grid import MCGridCache, precompute_grid
+
+ARGUMENTS = ('Москва', 'Кардиологи', 1, 'Автомобиль')
+
+
+@pytest.fixture(scope='module')
+def daily_grid(shared_calculator):
+    return precompute_grid(shared_calculator, max_visits=1, iterations=1000, methods=('daily',))
+
+
+@pytest.fixture
+def grid_calculator(calculator, daily_grid, monkeypatch):
+    monkeypatch.setattr(calculator, 'mc_grid', daily_grid)
+    return calculator
+
+
+def test_grid_hit_equals_seeded_run(grid_calculator):
+    cached = grid_calculator.monte_carlo_daily_simulation(*ARGUMENTS, 1000, keep_raw=True)
+    assert cached['input_params']['cached']
+    seed = cached['input_params']['random_seed']
+    live = grid_calculator.monte_carlo_daily_simulation(*ARGUMENTS, 1000, random_seed=seed, keep_raw=True,
+                                                        use_grid=False)
+    np.testing.assert_equal(cached['statistics'], live['statistics'])
+    np.testing.assert_equal(cached['raw_results'], live['raw_results'])
+
+
+def test_grid_does_not_substitute_other_runs(grid_calculator):
+    assert 'cached' not in grid_calculator.monte_carlo_daily_simulation(*ARGUMENTS, 500)['input_params']
+    assert 'cached' not in grid_calculator.monte_carlo_daily_simulation(*ARGUMENTS, 1000, random_seed=1)['input_params']
+    assert 'cached' not in grid_calculator.monte_carlo_daily_simulation(*ARGUMENTS, 1000, sampler='lhs')['input_params']
+
+
+def test_refined_grid_result_continues_cell_stream(grid_calculator):
+    cached = grid_calculator.monte_carlo_daily_simulation(*ARGUMENTS, 1000)
+    refined = grid_calculator.monte_carlo_daily_simulation(*ARGUMENTS, 500, previous=cached)
+    seed = cached['input_params']['random_seed']
+    single = grid_calculator.monte_carlo_daily_simulation(*ARGUMENTS, 1500, random_seed=seed, use_grid=False)
+    np.testing.assert_equal(refined['statistics'], single['statistics'])
+
+
+def test_changed_parameters_invalidate_grid(grid_calculator, daily_grid, tmp_path, monkeypatch):
+    path = str(tmp_path / 'grid.json.gz')
+    daily_grid.save(path)
+    assert MCGridCache.load(path, daily_grid.fingerprint).entries.keys() == daily_grid.entries.keys()
+    assert MCGridCache.load(path, 'другой отпечаток') is None
+
+    monkeypatch.setattr(grid_calculator, 'MC_PARAMS', dict(grid_calculator.MC_PARAMS, mc_iterations=1))
+    assert not grid_calculator.load_mc_grid(path)
+    grid_calculator.mc_grid = daily_grid
+    assert grid_calculator.lookup_mc_grid('daily', *ARGUMENTS) is None
+    assert 'cached' not in grid_calculator.monte_carlo_daily_simulation(*ARGUMENTS, 1000)['input_params']
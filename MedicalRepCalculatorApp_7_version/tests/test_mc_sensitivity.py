@@ -0,0 +1,43 @@
+"""Анализ чувствительности: индексы Соболя на аналитической функции, воспроизводимость, параметры ядра"""
+
+import numpy as np
+import pytest
+
+from mc_sensitivity import saltelli_points, sobol_indices
+
+ARGUMENTS = ('Москва', 'Кардиологи', 7, 'Автомобиль')
+SMALL_RUN = dict(base_samples=64, inner_iterations=100)
+
+
+def test_additive_function_indices():
+    # y = 4 x1 + 2 x2 + 0 x3, x ~ U(0, 1): S_i = ST_i = a_i^2 / sum(a^2) = (0.8, 0.2, 0)
+    coefficients = np.array([4.0, 2.0, 0.0])
+    points = saltelli_points([(0, 1)] * 3, 4096, np.random.default_rng(5))
+    first, total, variance = sobol_indices(points @ coefficients, 4096, 3)
+    np.testing.assert_allclose(first, [0.8, 0.2, 0.0], atol=0.03)
+    np.testing.assert_allclose(total, [0.8, 0.2, 0.0], atol=0.03)
+    assert variance == pytest.approx(20 / 12, rel=0.05)
+
+
+def test_indices_are_reproducible_for_fixed_seed(calculator):
+    first = calculator.sensitivity_analysis(*ARGUMENTS, random_seed=4, **SMALL_RUN)
+    repeat = calculator.sensitivity_analysis(*ARGUMENTS, random_seed=4, **SMALL_RUN)
+    other = calculator.sensitivity_analysis(*ARGUMENTS, random_seed=5, **SMALL_RUN)
+    assert first['outputs'] == repeat['outputs']
+    assert first['outputs'] != other['outputs']
+
+
+@pytest.mark.parametrize('model', ['daily', 'density'])
+def test_default_parameters_are_read_by_model(calculator, model):
+    result = calculator.sensitivity_analysis(*ARGUMENTS, model=model, random_seed=4, **SMALL_RUN)
+    assert result['ignored_parameters'] == []
+    assert all(value > 0 for value in result['outputs']['total_hours']['total'].values())
+
+
+def test_unused_parameter_is_dropped(calculator):
+    unused = 'cities_data.Москва.waiting_time_range.1'
+    with pytest.warns(UserWarning, match='waiting_time_range'):
+        result = calculator.sensitivity_analysis(*ARGUMENTS, parameters=['UNIFIED_PARAMS.doctor_visit_avg', unused],
+                                                 random_seed=4, **SMALL_RUN)
+    assert result['ignored_parameters'] == [unused]
+    assert list(result['parameters']) == ['UNIFIED_PARAMS.doctor_visit_avg']
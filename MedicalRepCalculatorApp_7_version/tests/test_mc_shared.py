@@ -0,0 +1,51 @@
+"""Сырые итерации в общей памяти: те же данные, что в обычном прогоне, и освобождение сегментов"""
+
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from mc_engine import daily_chunk, run_chunked, run_shared
+
+ARGUMENTS = ('Москва', 'Кардиологи', 7, 'Автомобиль')
+
+
+def assert_released(names):
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+
+def test_shared_run_equals_chunked_run(day_params):
+    accumulator, buffers = run_shared(daily_chunk, day_params, 2300, random_seed=6, workers=3, chunk_size=500)
+    chunked = run_chunked(daily_chunk, day_params, 2300, random_seed=6, chunk_size=500, keep_raw=True)
+    names = list(buffers.spec()[2].values())
+    with buffers:
+        np.testing.assert_equal(buffers.arrays, chunked.raw_results())
+        np.testing.assert_equal(accumulator.statistics(), chunked.statistics())
+    assert buffers.arrays == {}
+    assert_released(names)
+
+
+def test_pooled_simulation_keeps_raw_results_in_shared_memory(calculator):
+    pooled = calculator.monte_carlo_daily_simulation(*ARGUMENTS, 2300, random_seed=8, workers=2, chunk_size=500,
+                                                     keep_raw=True)
+    calculator.result_cache.clear()
+    single = calculator.monte_carlo_daily_simulation(*ARGUMENTS, 2300, random_seed=8, workers=1, chunk_size=500,
+                                                     keep_raw=True)
+    names = list(pooled['shared_memory'].spec()[2].values())
+    np.testing.assert_equal(pooled['raw_results'], single['raw_results'])
+    np.testing.assert_equal(pooled['statistics'], single['statistics'])
+
+    refined = calculator.monte_carlo_daily_simulation(*ARGUMENTS, 700, previous=pooled)
+    continuous = calculator.monte_carlo_daily_simulation(*ARGUMENTS, 3000, random_seed=8, chunk_size=500,
+                                                         keep_raw=True)
+    np.testing.assert_equal(refined['raw_results'], continuous['raw_results'])
+
+    calculator.release_mc_result(pooled)
+    assert 'raw_results' not in pooled and 'shared_memory' not in pooled
+    assert_released(names)
+    cached = calculator.monte_carlo_daily_simulation(*ARGUMENTS, 2300, random_seed=8, workers=2, chunk_size=500,
+                                                     keep_raw=True)
+    assert 'shared_memory' not in cached
+    np.testing.assert_equal(cached['raw_results'], single['raw_results'])
@@ -0,0 +1,100 @@
+"""Сырые итерации, оценки и сравнения Монте-Карло"""
+
+import numpy as np
+import pytest
+
+from mc_engine import DAILY_MC_FIELDS, SWEEP_FIELDS, expected_daily_hours, simulate_daily_configs, simulate_visit_sweep
+from mc_stats import raw_frame
+
+ARGUMENTS = ('Москва', 'Кардиологи', 7, 'Автомобиль')
+
+# Тип хранения: флаги - bool, счётчики - int16, измерения - float32
+RAW_DTYPES = {'is_overloaded': np.bool_, 'is_optimal': np.bool_, 'successful_visits': np.int16,
+              'districts_visited': np.int16}
+
+
+@pytest.mark.parametrize('method', ['monte_carlo_daily_simulation', 'monte_carlo_with_density'])
+def test_raw_results_are_typed_arrays(calculator, method):
+    result = getattr(calculator, method)(*ARGUMENTS, 1234, random_seed=1, keep_raw=True, chunk_size=500)
+    raw = result['raw_results']
+    if method == 'monte_carlo_daily_simulation':
+        assert tuple(raw) == DAILY_MC_FIELDS
+    for key, values in raw.items():
+        assert isinstance(values, np.ndarray) and values.flags.c_contiguous
+        assert values.dtype == RAW_DTYPES.get(key, np.float32), key
+        assert len(values) == 1234
+    frame = raw_frame(raw)
+    assert all(np.shares_memory(frame[key].to_numpy(), values) for key, values in raw.items())
+
+
+def test_variance_reduction_is_unbiased_and_narrower(calculator):
+    arguments = ('Казань', 'Терапевты', 10, 'Автомобиль')
+    fields = ('efficiency', 'travel_hours', 'total_hours')
+    reference = calculator.monte_carlo_daily_simulation(*arguments, 100000, random_seed=99)['statistics']
+    # Точное ожидание контрольной величины совпадает с длинным прогоном
+    exact = expected_daily_hours(calculator._daily_kernel_params(*arguments))
+    assert abs(exact - reference['total_hours']['mean']) <= 4 * reference['total_hours']['std'] / np.sqrt(100000)
+
+    reduced, plain, std_errors = [], [], []
+    for seed in range(30):
+        estimates = calculator.monte_carlo_daily_simulation(
+            *arguments, 1000, random_seed=seed, antithetic=True,
+            control_variate=True)['statistics']['variance_reduction']['estimates']
+        statistics = calculator.monte_carlo_daily_simulation(*arguments, 1000, random_seed=100 + seed)['statistics']
+        reduced.append([estimates[field]['mean'] for field in fields])
+        std_errors.append([estimates[field]['std_error'] for field in fields[:2]])
+        plain.append([statistics[field]['mean'] for field in fields[:2]])
+    reduced, plain = np.array(reduced), np.array(plain)
+
+    for column, field in enumerate(fields[:2]):
+        spread = reduced[:, column].std(ddof=1)
+        reference_error = reference[field]['std'] / np.sqrt(100000)
+        assert abs(reduced[:, column].mean() - reference[field]['mean']) <= \
+            4 * np.sqrt(spread ** 2 / 30 + reference_error ** 2), field
+        assert spread < plain[:, column].std(ddof=1) / 3, field
+        # Заявленная стандартная ошибка согласуется с разбросом повторов
+        assert 0.5 < np.mean(std_errors, axis=0)[column] / spread < 2, field
+    np.testing.assert_allclose(reduced[:, 2], exact)
+
+
+def test_common_random_numbers_comparison(calculator):
+    baseline = {'city': 'Москва', 'specialization': 'Кардиологи', 'num_visits': 7, 'transport_type': 'Автомобиль'}
+    public = dict(baseline, transport_type='Общественный транспорт')
+    fewer = dict(baseline, num_visits=5)
+    comparison = calculator.compare_configurations([baseline, public, fewer, baseline], 3000, random_seed=5,
+                                                   chunk_size=1000)
+    means = [result['statistics']['total_hours']['mean'] for result in comparison['results']]
+    for difference in comparison['differences']:
+        metric = difference['metrics']['total_hours']
+        # Среднее парных разностей - разность средних; общие числа сужают интервал
+        assert metric['mean_difference'] == pytest.approx(means[difference['configuration']] - means[0], abs=1e-9)
+        assert metric['ci'][0] <= metric['mean_difference'] <= metric['ci'][1]
+    public_metric, fewer_metric, same_metric = (difference['metrics']['total_hours']
+                                                for difference in comparison['differences'])
+    for metric in (public_metric, fewer_metric):
+        assert metric['significant'] and metric['variance_reduction'] > 2
+        assert metric['half_width'] < metric['independent_half_width']
+    assert public_metric['mean_difference'] > 0 > fewer_metric['mean_difference']
+    # Та же конфигурация на тех же числах - нулевая разность без разброса
+    assert same_metric['mean_difference'] == 0 and same_metric['half_width'] == 0
+    assert means[3] == means[0]
+
+
+def test_visit_sweep_equals_per_visit_runs(calculator, day_params):
+    sweep = simulate_visit_sweep(day_params, 9, 500, np.random.default_rng(3))
+    # Отдельные прогоны на тех же числах: каждое k берёт свой срез одной выборки
+    single = simulate_daily_configs([dict(day_params, num_visits=k) for k in range(1, 10)], 500,
+                                    np.random.default_rng(3))
+    for k, batch in enumerate(single, start=1):
+        for field in SWEEP_FIELDS:
+            np.testing.assert_allclose(sweep[field][:, k - 1], batch[field], rtol=1e-12, atol=1e-12)
+
+    curve = calculator.visit_count_sweep('Москва', 'Кардиологи', 'Автомобиль', 9, 2000, random_seed=4,
+                                         chunk_size=700)['curve']
+    configurations = [{'city': 'Москва', 'specialization': 'Кардиологи', 'num_visits': k,
+                       'transport_type': 'Автомобиль'} for k in range(1, 10)]
+    results = calculator.compare_configurations(configurations, 2000, random_seed=4, chunk_size=700)['results']
+    for point, result in zip(curve, results):
+        for field in ('total_hours', 'efficiency', 'successful_visits'):
+            assert point[field]['mean'] == pytest.approx(result['statistics'][field]['mean'], rel=1e-12)
+        assert point['overload_probability'] == pytest.approx(result['statistics']['overload_probability']['value'])
@@ -0,0 +1,30 @@
+"""Равномерные числа ядер: квазислучайные выборки и работа без scipy"""
+
+import numpy as np
+import pytest
+
+import rng_streams
+from rng_streams import uniform_block
+
+
+@pytest.mark.parametrize('sampler', ['sobol', 'lhs'])
+def test_quasi_random_block_is_stratified(sampler):
+    block = uniform_block(np.random.default_rng(3), 256, 5, sampler)
+    assert block.shape == (256, 5)
+    assert ((block >= 0) & (block < 1)).all()
+    # Каждая координата - ровно одна точка в каждом из 256 интервалов
+    for column in block.T:
+        np.testing.assert_equal(np.sort((column * 256).astype(int)), np.arange(256))
+    np.testing.assert_equal(block, uniform_block(np.random.default_rng(3), 256, 5, sampler))
+    assert not np.array_equal(block, uniform_block(np.random.default_rng(4), 256, 5, sampler))
+
+
+@pytest.mark.parametrize('sampler', ['sobol', 'lhs'])
+def test_quasi_random_sampler_needs_scipy(monkeypatch, calculator, sampler):
+    monkeypatch.setattr(rng_streams, 'qmc', None)
+    with pytest.raises(ImportError, match='scipy'):
+        uniform_block(np.random.default_rng(0), 16, 2, sampler)
+    with pytest.raises(ImportError):
+        calculator.monte_carlo_daily_simulation('Москва', 'Кардиологи', 7, 'Автомобиль', 100, random_seed=1,
+                                                sampler=sampler)
+    assert uniform_block(np.random.default_rng(0), 16, 2).shape == (16, 2)